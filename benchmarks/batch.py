@@ -0,0 +1,64 @@
+# Compares batched NumPy check and legal move counts against looping over Board objects, starting
+# from the same FEN positions taken from random games, and cross-checks batch results against Board.
+# Run from root of repository: python3 benchmarks/batch.py [--positions N] [--repeat R]
+
+import argparse
+import random
+import sys
+import time
+
+sys.path.insert(0, 'src')
+from chess import Board
+from notation import board_from_fen, board_to_fen
+import batch
+
+
+def random_positions(rng, count):
+    boards = []
+    while len(boards) < count:
+        board = Board()
+        for _ in range(rng.randrange(1, 120)):
+            if board.winner is not None:
+                break
+            move = rng.choice(board.legal_moves())
+            board.move_piece(*move[0], *move[1])
+        boards.append(board)
+    return boards
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--positions', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=50, help="Batch size is positions * repeat")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    boards = random_positions(random.Random(args.seed), args.positions)
+    mismatches = batch.cross_check(boards)
+    print(f"cross-check of {len(boards)} positions against Board: {len(mismatches)} mismatches")
+    for index, description in mismatches[:10]:
+        print(f"  {board_to_fen(boards[index])}: {description}")
+
+    fens = [board_to_fen(board) for board in boards]
+    start = time.perf_counter()
+    for fen in fens:
+        board = board_from_fen(fen)
+        len(board.legal_moves())
+        board.is_in_check(board.whose_turn())
+    loop_time = (time.perf_counter() - start) / len(fens)
+    print(f"Board loop   {loop_time * 1e6:8.2f} us per position")
+
+    fens = fens * args.repeat
+    start = time.perf_counter()
+    bitboards, turns = batch.pack_fens(fens)
+    pack_time = (time.perf_counter() - start) / len(fens)
+    start = time.perf_counter()
+    batch.mobility(bitboards, turns)
+    batch.in_check(bitboards, turns)
+    batch_time = (time.perf_counter() - start) / len(fens)
+    print(f"batch        {(pack_time + batch_time) * 1e6:8.2f} us per position ({pack_time * 1e6:.2f} us packing FEN), "
+          f"{len(fens)} positions, {loop_time / (pack_time + batch_time):.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+# Measures opening book lookups, for positions in the book and positions not in it, against a short
+# search of the same positions. Builds a book from an archive if given, otherwise from random games.
+# Run from root of repository: python3 benchmarks/book.py [--archive games.pgn] [--games N]
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, 'src')
+from chess import Board
+from book import OpeningBook, count_moves, write_book
+from notation import read_games, move_to_uci
+from search import Search
+
+
+def random_games(rng, count, plies):
+    games = []
+    for _ in range(count):
+        board = Board()
+        moves = []
+        while board.winner is None and len(moves) < plies:
+            move = rng.choice(board.legal_moves())
+            board.move_piece(*move[0], *move[1])
+            moves.append(move_to_uci(move))
+        games.append(moves)
+    return games
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--archive')
+    parser.add_argument('--games', type=int, default=2000)
+    parser.add_argument('--plies', type=int, default=16)
+    parser.add_argument('--lookups', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    if args.archive is not None:
+        with open(args.archive) as file:
+            games = list(read_games(file))
+    else:
+        games = random_games(rng, args.games, args.plies)
+
+    path = os.path.join(tempfile.mkdtemp(), 'book.bin')
+    start = time.perf_counter()
+    records = write_book(count_moves(games, args.plies), path)
+    print(f"built book of {records} moves from {len(games)} games in {time.perf_counter() - start:.2f} s")
+
+    book = OpeningBook(path)
+    keys = [book.words[index * 2] for index in range(book.records)]
+    hits = [rng.choice(keys) for _ in range(args.lookups)]
+    misses = [rng.getrandbits(64) for _ in range(args.lookups)]
+    for name, lookups in [('in book', hits), ('not in book', misses)]:
+        start = time.perf_counter()
+        for key in lookups:
+            book.find(key)
+        elapsed = time.perf_counter() - start
+        print(f"lookup {name:12} {elapsed / len(lookups) * 1e6:6.2f} us")
+
+    board = Board()
+    start = time.perf_counter()
+    book.get_move(board)
+    print(f"get_move (with legality check) {(time.perf_counter() - start) * 1e6:8.2f} us")
+    start = time.perf_counter()
+    Search(board).search(depth=3)
+    print(f"search to depth 3             {(time.perf_counter() - start) * 1e6:8.0f} us")
+
+    book.close()
+    os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+# Compares reading the incrementally updated evaluation against evaluating from scratch, both on its
+# own and per search node (make move, evaluate, undo move).
+# Run from root of repository: python3 benchmarks/evaluation.py [--games N] [--seed S]
+
+import argparse
+import random
+import sys
+import time
+
+sys.path.insert(0, 'src')
+from chess import Board, WHITE, BLACK
+from evaluation import evaluate
+
+
+def legal_moves(board):
+    player = board.whose_turn()
+    opponent = BLACK if player == WHITE else WHITE
+    return [(piece.get_pos(), end_pos) for piece in board.get_pieces(player)
+            for end_pos in piece.available_moves(board) if board.get_piece(*end_pos) is not board.king[opponent]]
+
+
+def play_random_game(rng, max_turns):
+    """ Plays random moves, returning the board and list of moves so positions can be revisited. """
+    board = Board()
+    moves = []
+    while board.winner is None and board.turn < max_turns:
+        move = rng.choice(legal_moves(board))
+        board.move_piece(*move[0], *move[1])
+        moves.append(move)
+    return board, moves
+
+
+def time_reads(boards, evaluator, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for board in boards:
+            evaluator(board)
+    return (time.perf_counter() - start) / (repeats * len(boards))
+
+
+def time_nodes(board, moves, evaluator):
+    """ Steps back through game, at every position making, evaluating and undoing each legal move. """
+    nodes = 0
+    elapsed = 0
+    for _ in moves:
+        board.undo_move()
+        children = legal_moves(board)
+        start = time.perf_counter()
+        for start_pos, end_pos in children:
+            board.move_piece(*start_pos, *end_pos)
+            evaluator(board)
+            board.undo_move()
+        elapsed += time.perf_counter() - start
+        nodes += len(children)
+
+    # Replay game so board can be reused
+    for start_pos, end_pos in moves:
+        board.move_piece(*start_pos, *end_pos)
+    return elapsed, nodes
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--games', type=int, default=5)
+    parser.add_argument('--turns', type=int, default=60)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    games = [play_random_game(rng, args.turns) for _ in range(args.games)]
+
+    # Check both give same result before timing
+    for board, moves in games:
+        for _ in moves:
+            board.undo_move()
+            assert board.evaluate() == evaluate(board)
+        for start_pos, end_pos in moves:
+            board.move_piece(*start_pos, *end_pos)
+
+    boards = [board for board, _ in games]
+    incremental = time_reads(boards, Board.evaluate, 20000)
+    scratch = time_reads(boards, evaluate, 2000)
+    print(f"evaluation only:  incremental {incremental * 1e6:.2f} us, from scratch {scratch * 1e6:.2f} us "
+          f"({scratch / incremental:.1f}x)")
+
+    for name, evaluator in [('incremental', Board.evaluate), ('from scratch', evaluate)]:
+        elapsed = nodes = 0
+        for board, moves in games:
+            game_elapsed, game_nodes = time_nodes(board, moves, evaluator)
+            elapsed += game_elapsed
+            nodes += game_nodes
+        print(f"per node ({name}): {elapsed / nodes * 1e6:.1f} us over {nodes} nodes")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,372 @@
+# Load generator for the Flask server (app.py, or src/server.py for the sharded server). Simulates
+# many games at once, each between two headless clients that keep their own board like the GUI's
+# client does, play random legal moves (a random piece, then one of its moves) after a think time
+# and wait for their opponent's moves by polling /move or by following the game's spectator stream.
+# Prints throughput, error rate and latency percentiles of each kind of request as JSON.
+# Start the server (e.g CHESS_STORAGE=none python3 -m flask --app src/app.py run), then
+# Run from root of repository: python3 benchmarks/loadgen.py [--url http://127.0.0.1:5000] [--games N]
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import random
+import sys
+import time
+from urllib.parse import urlsplit
+
+sys.path.insert(0, 'src')
+from chess import WHITE, BLACK, Board
+
+POLL_STRATEGIES = ['fixed', 'backoff', 'stream']
+PERCENTILES = [50, 90, 99, 99.9]
+
+
+class Connection:
+    """
+    HTTP/1.1 connection to server, kept open between requests where the server allows it.
+    """
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def open(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader, self.writer = None, None
+
+    async def send(self, method, path, body=None):
+        if self.writer is None:
+            await self.open()
+        data = b'' if body is None else json.dumps(body).encode()
+        head = f"{method} {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\nContent-Length: {len(data)}\r\n"
+        if body is not None:
+            head += "Content-Type: application/json\r\n"
+        self.writer.write(head.encode() + b'\r\n' + data)
+        await self.writer.drain()
+
+    async def read_head(self):
+        head = await self.reader.readuntil(b'\r\n\r\n')
+        lines = head[:-4].decode('latin1').split('\r\n')
+        version, status = lines[0].split(' ', 2)[:2]
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        # Server closes connection after response, e.g HTTP/1.0 servers such as flask run
+        keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+        return int(status), headers, keep_alive
+
+    async def body_pieces(self, headers):
+        """
+        Yields body of response as it arrives.
+        """
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            while True:
+                size = int((await self.reader.readuntil(b'\r\n')).split(b';')[0], 16)
+                if size == 0:
+                    while await self.reader.readuntil(b'\r\n') != b'\r\n':
+                        pass
+                    return
+                yield (await self.reader.readexactly(size + 2))[:-2]
+        elif 'content-length' in headers:
+            yield await self.reader.readexactly(int(headers['content-length']))
+        else:
+            while True:
+                data = await self.reader.read(1 << 16)
+                if len(data) == 0:
+                    return
+                yield data
+
+    async def request(self, method, path, body=None):
+        """
+        Sends a request, reconnecting once if a kept connection was closed by the server.
+
+        Returns:
+            Tuple: Status code, and body decoded from JSON (None if it isn't JSON).
+        """
+        for attempt in range(2):
+            try:
+                await self.send(method, path, body)
+                status, headers, keep_alive = await self.read_head()
+                break
+            except (ConnectionError, asyncio.IncompleteReadError):
+                self.close()
+                if attempt == 1:
+                    raise
+        data = b''.join([piece async for piece in self.body_pieces(headers)])
+        if not keep_alive:
+            self.close()
+        try:
+            return status, json.loads(data)
+        except ValueError:
+            return status, None
+
+
+class Stats:
+    """
+    Latencies and errors of requests, by kind of request.
+    """
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.moves = 0
+        self.games = 0
+
+    def record(self, kind, latency, error=False):
+        self.latencies.setdefault(kind, []).append(latency)
+        if error:
+            self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    def merge(self, other):
+        for kind, latencies in other.latencies.items():
+            self.latencies.setdefault(kind, []).extend(latencies)
+        for kind, errors in other.errors.items():
+            self.errors[kind] = self.errors.get(kind, 0) + errors
+        self.moves += other.moves
+        self.games += other.games
+
+
+def percentile(ordered, percent):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+class Player:
+    """
+    Headless client of one player of a game.
+    """
+
+    def __init__(self, url, game, stats):
+        address = urlsplit(url)
+        self.connection = Connection(address.hostname, address.port or 80)
+        self.game = game
+        self.stats = stats
+        self.board = Board()
+        self.player = None
+
+    async def request(self, method, route, body=None, expected=(200,)):
+        start = time.perf_counter()
+        try:
+            status, data = await self.connection.request(method, f"{route}?game={self.game}", body)
+            error = status not in expected
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            self.connection.close()
+            status, data, error = None, None, True
+        self.stats.record(f"{method} {route}", time.perf_counter() - start, error)
+        return status, data
+
+    async def join(self):
+        status, self.player = await self.request('PUT', '/player/new')
+        return status == 200
+
+    async def play_move(self, rng, think_time):
+        if think_time > 0:
+            await asyncio.sleep(rng.expovariate(1 / think_time))
+        # Piece is chosen first and then one of its moves, as a player of the GUI would
+        board = self.board
+        pieces = [piece for piece in board.get_pieces(board.whose_turn()) if len(piece.available_moves(board)) > 0]
+        piece = rng.choice(pieces)
+        start_pos, end_pos = piece.get_pos(), rng.choice(piece.available_moves(board))
+        status, _ = await self.request('POST', '/move', {'player': self.player, 'move': [start_pos, end_pos]})
+        self.board.move_piece(*start_pos, *end_pos)
+        if status == 200:
+            self.stats.moves += 1
+        return status == 200
+
+    async def wait_for_move(self, poll, poll_interval, max_poll_interval):
+        """
+        Polls /move until opponent has moved, then plays their move on board.
+
+        Returns:
+            bool: True if opponent's move arrived.
+        """
+        interval = poll_interval
+        while True:
+            status, most_recent_move = await self.request('GET', '/move')
+            if status == 200 and most_recent_move['player'] != self.player and len(most_recent_move['move']) == 2:
+                start_pos, end_pos = most_recent_move['move']
+                self.board.move_piece(*start_pos, *end_pos)
+                return True
+            if status != 200:
+                return False
+            await asyncio.sleep(interval)
+            if poll == 'backoff':
+                interval = min(interval * 2, max_poll_interval)
+
+    def close(self):
+        self.connection.close()
+
+
+async def follow_stream(url, game, boards, stats, ready, moved):
+    """
+    Follows game's spectator stream, playing each move on the boards of players waiting for it.
+    One stream serves both players of a game, as a move is only ever awaited by one of them.
+    """
+    address = urlsplit(url)
+    connection = Connection(address.hostname, address.port or 80)
+    start = time.perf_counter()
+    try:
+        await connection.send('GET', f"/game/spectate?game={game}")
+        status, headers, _ = await connection.read_head()
+        stats.record('GET /game/spectate', time.perf_counter() - start, status != 200)
+        buffer = b''
+        async for piece in connection.body_pieces(headers):
+            buffer += piece
+            while b'\n\n' in buffer:
+                event, buffer = buffer.split(b'\n\n', 1)
+                fields = dict(line.split(': ', 1) for line in event.decode().split('\n') if ': ' in line)
+                if fields.get('event') == 'snapshot':
+                    ready.set()
+                elif fields.get('event') == 'move':
+                    move = json.loads(fields['data'])
+                    for colour, board in boards.items():
+                        if colour != move['player'] and board.turn == move['ply']:
+                            board.move_piece(*move['move'][0], *move['move'][1])
+                    moved.set()
+                elif fields.get('event') == 'end':
+                    return
+    except (OSError, asyncio.IncompleteReadError, ValueError):
+        stats.record('GET /game/spectate', time.perf_counter() - start, True)
+    finally:
+        connection.close()
+
+
+async def play_game(url, game, rng, stats, args):
+    """
+    Plays a game of random moves between two clients.
+    """
+    white, black = Player(url, game, stats), Player(url, game, stats)
+    players = {}
+    stream = None
+    try:
+        if not await white.join() or not await black.join():
+            return
+        players = {white.player: white, black.player: black}
+        if args.poll == 'stream':
+            ready, moved = asyncio.Event(), asyncio.Event()
+            stream = asyncio.create_task(follow_stream(
+                url, game, {player.player: player.board for player in players.values()}, stats, ready, moved))
+            await asyncio.wait_for(ready.wait(), args.timeout)
+
+        board = white.board
+        while board.winner is None and board.turn < args.plies:
+            mover = players[WHITE if board.turn % 2 == 0 else BLACK]
+            waiter = black if mover is white else white
+            if args.poll == 'stream':
+                moved.clear()
+                if not await mover.play_move(rng, args.think):
+                    return
+                await asyncio.wait_for(moved.wait(), args.timeout)
+            else:
+                if not await mover.play_move(rng, args.think):
+                    return
+                wait = waiter.wait_for_move(args.poll, args.poll_interval, args.max_poll_interval)
+                if not await asyncio.wait_for(wait, args.timeout):
+                    return
+            board = mover.board
+        stats.games += 1
+    except asyncio.TimeoutError:
+        stats.record('move arrival', args.timeout, True)
+    finally:
+        await white.request('DELETE', '/game/reset')
+        if stream is not None:
+            try:
+                await asyncio.wait_for(stream, 5)
+            except asyncio.TimeoutError:
+                pass
+        white.close()
+        black.close()
+
+
+async def run_games(url, slots, seed, stats, args, deadline):
+    async def slot_loop(slot):
+        rng = random.Random(f"{seed}-{slot}")
+        game_number = 0
+        while time.perf_counter() < deadline:
+            await play_game(url, f"load-{seed}-{slot}-{game_number}", rng, stats, args)
+            game_number += 1
+
+    await asyncio.gather(*(slot_loop(slot) for slot in slots))
+
+
+def run_process(index, args):
+    """
+    Plays process' share of games, returning their stats.
+    """
+    stats = Stats()
+    slots = range(index, args.games, args.processes)
+    deadline = time.perf_counter() + args.duration
+    asyncio.run(run_games(args.url, slots, args.seed, stats, args, deadline))
+    return stats
+
+
+def report(stats, elapsed, args):
+    requests = sum(len(latencies) for latencies in stats.latencies.values())
+    errors = sum(stats.errors.values())
+    latency = {}
+    for kind, latencies in sorted(stats.latencies.items()):
+        ordered = sorted(latencies)
+        latency[kind] = {'count': len(ordered), 'errors': stats.errors.get(kind, 0),
+                         'mean_ms': round(1000 * sum(ordered) / len(ordered), 3),
+                         'max_ms': round(1000 * ordered[-1], 3)}
+        for percent in PERCENTILES:
+            latency[kind][f"p{percent}_ms"] = round(1000 * percentile(ordered, percent), 3)
+    return {
+        'config': {name: getattr(args, name) for name in ['url', 'games', 'processes', 'duration', 'think', 'poll',
+                                                          'poll_interval', 'max_poll_interval', 'plies', 'timeout', 'seed']},
+        'elapsed': round(elapsed, 3),
+        'requests': requests,
+        'requests_per_second': round(requests / elapsed, 1),
+        'moves': stats.moves,
+        'moves_per_second': round(stats.moves / elapsed, 1),
+        'games_completed': stats.games,
+        'errors': errors,
+        'error_rate': round(errors / requests, 6) if requests > 0 else 0.0,
+        'latency': latency
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulates many clients of the flask server playing at once")
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--games', type=int, default=100, help="Games played at once")
+    parser.add_argument('--processes', type=int, default=1, help="Processes clients are spread over")
+    parser.add_argument('--duration', type=float, default=30, help="Seconds to run for, games in progress finish")
+    parser.add_argument('--think', type=float, default=0.0, help="Mean think time before each move, in seconds")
+    parser.add_argument('--poll', choices=POLL_STRATEGIES, default='fixed',
+                        help="How players wait for moves: polling /move at a fixed interval, polling with "
+                             "exponential backoff, or following the game's spectator stream")
+    parser.add_argument('--poll-interval', type=float, default=0.05, help="Seconds between polls")
+    parser.add_argument('--max-poll-interval', type=float, default=1.0, help="Longest backoff between polls")
+    parser.add_argument('--plies', type=int, default=100, help="Moves after which a game is stopped")
+    parser.add_argument('--timeout', type=float, default=10, help="Seconds to wait for a move before giving up on a game")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="File JSON report is also written to")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    stats = Stats()
+    if args.processes == 1:
+        stats = run_process(0, args)
+    else:
+        with multiprocessing.Pool(args.processes) as pool:
+            for process_stats in pool.starmap(run_process, [(index, args) for index in range(args.processes)]):
+                stats.merge(process_stats)
+    result = report(stats, time.perf_counter() - start, args)
+
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(text + '\n')
+
+
+if __name__ == '__main__':
+    main()
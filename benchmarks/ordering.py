@@ -0,0 +1,40 @@
+# Compares nodes searched and cutoff-on-first-move rate with and without move ordering.
+# Run from root of repository: python3 benchmarks/ordering.py [--depth D]
+
+import argparse
+import sys
+import time
+
+sys.path.insert(0, 'src')
+from ordering import MoveOrderer
+from search import Search
+from positions import board_at
+
+OPENINGS = ['start', 'open game', 'queen pawn']
+
+
+class UnorderedMoves(MoveOrderer):
+    """ Searches moves in the order they are generated. """
+
+    def order(self, board, moves, hash_move=None, ply=0):
+        return moves
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--depth', type=int, default=4)
+    args = parser.parse_args()
+
+    for name in OPENINGS:
+        for orderer in [UnorderedMoves(), MoveOrderer()]:
+            board = board_at(name)
+            start = time.perf_counter()
+            result = Search(board, orderer=orderer).search(depth=args.depth)
+            elapsed = time.perf_counter() - start
+            label = 'ordered' if type(orderer) is MoveOrderer else 'unordered'
+            print(f"{name:12} {label:10} nodes {result['nodes']:8}  time {elapsed:6.2f} s  "
+                  f"first move cutoffs {result['first_move_cutoff_rate']:.1%}")
+
+
+if __name__ == '__main__':
+    main()
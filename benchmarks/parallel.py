@@ -0,0 +1,53 @@
+# Compares parallel search (Lazy SMP) against a single worker, both by depth and nodes reached in
+# the same time and by time taken to reach the same depth. Speedup is limited by the number of cores.
+# Worker processes are started before timing, as they are kept between searches.
+# Run from root of repository: python3 benchmarks/parallel.py [--workers N] [--movetime T] [--depth D]
+
+import argparse
+import multiprocessing
+import sys
+
+sys.path.insert(0, 'src')
+from parallel import ParallelSearch
+from positions import board_at
+
+POSITIONS = ['open game', 'queen pawn']
+
+
+def run(search, board, **limits):
+    # Table is cleared so each search starts from nothing, as a new search would
+    search.table.clear()
+    search.board = board
+    return search.search(**limits)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--movetime', type=float, default=5.0)
+    parser.add_argument('--depth', type=int, default=4)
+    args = parser.parse_args()
+
+    searches = {workers: ParallelSearch(board_at('start'), workers=workers) for workers in sorted({1, args.workers})}
+    try:
+        for search in searches.values():
+            search.search(depth=1)
+
+        for name in POSITIONS:
+            board = board_at(name)
+            for workers in searches:
+                result = run(searches[workers], board, movetime=args.movetime)
+                print(f"{name:12} workers {workers:2}  movetime {args.movetime:.1f} s  depth {result['depth']:2}  "
+                      f"nodes {result['nodes']:8}  nodes/s {result['nodes'] / result['time']:8.0f}")
+
+            single = run(searches[1], board, depth=args.depth)
+            parallel = run(searches[args.workers], board, depth=args.depth)
+            print(f"{name:12} depth {args.depth}  1 worker {single['time']:6.2f} s  {args.workers} workers "
+                  f"{parallel['time']:6.2f} s  speedup {single['time'] / parallel['time']:.2f}x")
+    finally:
+        for search in searches.values():
+            search.close()
+
+
+if __name__ == '__main__':
+    main()
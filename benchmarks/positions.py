@@ -0,0 +1,27 @@
+# Positions shared by the search benchmarks, each reached from the starting position by a list of
+# moves (start_pos, end_pos). Not a benchmark itself.
+
+from chess import Board
+
+POSITIONS = {
+    'start': [],
+    'open game': [((1, 4), (3, 4)), ((6, 4), (4, 4)), ((0, 6), (2, 5)), ((7, 1), (5, 2)), ((0, 5), (3, 2)),
+                  ((7, 5), (4, 2))],
+    'queen pawn': [((1, 3), (3, 3)), ((6, 3), (4, 3)), ((1, 2), (3, 2)), ((6, 4), (5, 4)), ((0, 1), (2, 2)),
+                   ((7, 6), (5, 5))],
+    'centre tension': [((1, 4), (3, 4)), ((6, 3), (4, 3)), ((0, 3), (2, 5)), ((7, 2), (3, 6))],
+    'scandinavian': [((1, 4), (3, 4)), ((6, 3), (4, 3)), ((3, 4), (4, 3)), ((7, 3), (4, 3)), ((0, 1), (2, 2))],
+}
+
+
+def board_at(name):
+    """
+    Plays the moves of position name from the starting position.
+
+    Returns:
+        Board: Board in position.
+    """
+    board = Board()
+    for start_pos, end_pos in POSITIONS[name]:
+        board.move_piece(*start_pos, *end_pos)
+    return board
@@ -0,0 +1,34 @@
+# Compares best move, score and nodes searched at each depth with and without quiescence search.
+# Scores without quiescence swing between odd and even depths, as the last capture searched is
+# never answered. Run from root of repository: python3 benchmarks/quiescence.py [--depth D]
+
+import argparse
+import sys
+import time
+
+sys.path.insert(0, 'src')
+from search import Search
+from positions import board_at
+
+POSITIONS = ['open game', 'centre tension', 'scandinavian']
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--depth', type=int, default=3)
+    args = parser.parse_args()
+
+    for name in POSITIONS:
+        for quiescence in [False, True]:
+            label = 'quiescence' if quiescence else 'static'
+            for depth in range(1, args.depth + 1):
+                board = board_at(name)
+                start = time.perf_counter()
+                result = Search(board, quiescence=quiescence).search(depth=depth)
+                elapsed = time.perf_counter() - start
+                print(f"{name:15} {label:10} depth {depth}  move {result['move']}  score {result['score']:6}  "
+                      f"nodes {result['nodes']:7}  time {elapsed:6.2f} s")
+
+
+if __name__ == '__main__':
+    main()
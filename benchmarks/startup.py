@@ -0,0 +1,57 @@
+# Measures cold start of the GUI, from launching the interpreter to the first frame being drawn.
+# Run from root of repository: python3 benchmarks/startup.py [--runs N] [--headless]
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+FIRST_FRAME = "first frame"
+
+# Run in a fresh interpreter so imports are not already cached
+CHILD = f"""
+import sys
+sys.path.insert(0, 'src')
+import game
+g = game.Game()
+g.displayMove([])
+print({FIRST_FRAME!r}, flush=True)
+g.analysis.stop()
+"""
+
+
+def time_to_first_frame(env):
+    start = time.perf_counter()
+    child = subprocess.Popen([sys.executable, '-c', CHILD], stdout=subprocess.PIPE, text=True, env=env)
+    for line in child.stdout:
+        if line.strip() == FIRST_FRAME:
+            elapsed = time.perf_counter() - start
+            break
+    else:
+        raise RuntimeError("Game exited before drawing first frame")
+    child.wait()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--headless', action='store_true', help="Use SDL's dummy video driver")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    if args.headless:
+        env['SDL_VIDEODRIVER'] = 'dummy'
+
+    # First run warms the OS file cache, so is reported separately
+    cold = time_to_first_frame(env)
+    times = [time_to_first_frame(env) for _ in range(args.runs)]
+    print(f"first run:  {cold * 1000:.0f} ms")
+    print(f"median:     {statistics.median(times) * 1000:.0f} ms over {args.runs} runs")
+    print(f"min / max:  {min(times) * 1000:.0f} / {max(times) * 1000:.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
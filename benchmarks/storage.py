@@ -0,0 +1,88 @@
+# Measures moves per second handled as the server's /move handler does (move_piece, then journaling
+# the move) with storage off, committing every move on its own, and group committing moves, with
+# several games played at once on separate threads as under a threaded server.
+# Run from root of repository: python3 benchmarks/storage.py [--games N] [--threads T]
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, 'src')
+from chess import Board
+from storage import NullStore, SqliteStore
+
+
+def random_game(rng, plies):
+    board = Board()
+    moves = []
+    while board.winner is None and len(moves) < plies:
+        move = rng.choice(board.legal_moves())
+        board.move_piece(*move[0], *move[1])
+        moves.append(move)
+    return moves
+
+
+def play(store, games, threads):
+    """
+    Replays games on threads, journaling each move to store.
+
+    Returns:
+        float: Moves per second.
+    """
+    def run(thread_games):
+        for index, moves in thread_games:
+            record = f"game-{index}"
+            store.save_game(record, record, True, True, True)
+            board = Board()
+            for ply, move in enumerate(moves):
+                player = board.whose_turn()
+                board.move_piece(*move[0], *move[1])
+                store.append_move(record, ply, player, move)
+
+    workers = [threading.Thread(target=run, args=(list(enumerate(games))[start::threads],))
+               for start in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return sum(len(moves) for moves in games) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--games', type=int, default=64)
+    parser.add_argument('--plies', type=int, default=80)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    games = [random_game(rng, args.plies) for _ in range(args.games)]
+    directory = tempfile.mkdtemp()
+
+    configurations = [
+        ('storage off', lambda path: NullStore()),
+        ('commit per move', lambda path: SqliteStore(path, batch_size=1)),
+        ('commit per move (sync FULL)', lambda path: SqliteStore(path, batch_size=1, synchronous='FULL')),
+        ('group commit', lambda path: SqliteStore(path)),
+        ('group commit (sync FULL)', lambda path: SqliteStore(path, synchronous='FULL')),
+        ('group commit, no wait', lambda path: SqliteStore(path, wait=False)),
+    ]
+    for index, (name, create) in enumerate(configurations):
+        path = os.path.join(directory, f"games-{index}.db")
+        store = create(path)
+        moves_per_second = play(store, games, args.threads)
+        store.close()
+        print(f"{name:30} {moves_per_second:10.0f} moves/s")
+        for suffix in ['', '-wal', '-shm']:
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,19 @@
 # Compiles program at dist/chess, run script bash compile_gui.sh
-pyinstaller --add-data 'src/img/sprites.png:src/img' -F src/game.py -n chess
-rm -r build
\ No newline at end of file
+# Run bash compile_gui.sh --onedir to instead build a folder dist/chess/ containing dist/chess/chess,
+# which starts faster as it does not unpack itself to a temporary folder on every launch
+# Opening book book.bin and tablebases are included if they have been built (python3 src/book.py
+# games.pgn, python3 src/tablebase.py)
+BUNDLE=-F
+if [ "$1" = "--onedir" ]; then
+    BUNDLE=-D
+fi
+BOOK=
+if [ -f book.bin ]; then
+    BOOK="--add-data book.bin:."
+fi
+TABLEBASES=
+if [ -d tablebases ]; then
+    TABLEBASES="--add-data tablebases:tablebases"
+fi
+pyinstaller --add-data 'src/img/sprites.png:src/img' $BOOK $TABLEBASES $BUNDLE src/game.py -n chess
+rm -r build
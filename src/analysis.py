@@ -0,0 +1,203 @@
+# Background analysis of positions for the GUI. Analysis runs on a worker thread using a snapshot
+# of the board, and results are delivered through the pygame event queue so the GUI never blocks.
+
+import threading
+import pygame
+from chess import WHITE, BLACK, Board
+from ordering import MoveOrderer
+from search import Search
+from transposition import TranspositionTable, SharedTranspositionTable
+
+# Event posted to pygame event queue when analysis of a position has finished
+ANALYSIS_EVENT = pygame.USEREVENT + 1
+
+# Limits of search for best move
+ANALYSIS_DEPTH = 6
+ANALYSIS_TIME = 2.0
+
+
+class AnalysisCancelled(Exception):
+    pass
+
+
+def snapshot(board):
+    """
+    Copies position on board for analysis, without its move history so the cost of copying doesn't
+    grow with the length of the game. Only hashes of positions that can still repeat are kept.
+
+    Args:
+        board (Board): Instance of Board class to copy.
+
+    Returns:
+        Board: Copy of position.
+    """
+    pieces = [type(piece)(piece.get_pos(), piece.get_colour())
+              for colour in [WHITE, BLACK] for piece in board.get_pieces(colour)]
+    copy = Board(pieces, turn=board.turn, halfmove_clock=board.halfmove_clock)
+    copy.hash_history = board.hash_history[max(len(board.hash_history) - board.halfmove_clock, 0):]
+    copy.winner = board.winner
+    return copy
+
+
+class AnalysisService(threading.Thread):
+    """
+    Worker thread that analyses snapshots of a Board. Only the most recently submitted position is
+    analysed, submitting a new position cancels any analysis of an older one.
+    """
+    event_type = ANALYSIS_EVENT
+
+    def __init__(self, workers=1, book=None, tablebase=None):
+        """
+        Args:
+            workers (int, optional): Number of processes searching for the best move, defaults to 1
+                                        which searches on the worker thread itself.
+            book (OpeningBook, optional): Book whose moves are suggested instead of searching.
+            tablebase (Tablebase, optional): Endgame tablebase used by search.
+        """
+        super().__init__(daemon=True)
+        self.condition = threading.Condition()
+        self.generation = 0
+        self.pending = None
+        self.running = True
+
+        # Search of position currently being analysed, table and orderer are kept between positions,
+        # as is the parallel search and its worker processes if there is more than one worker
+        self.search = None
+        self.parallel = None
+        self.workers = workers
+        self.book = book
+        self.tablebase = tablebase
+        self.table = TranspositionTable() if workers == 1 else SharedTranspositionTable()
+        self.orderer = MoveOrderer()
+
+    def submit(self, board):
+        """
+        Queues a snapshot of board for analysis, cancelling any stale request. Must be called from
+        the thread that owns board.
+
+        Args:
+            board (Board): Instance of Board class to analyse.
+
+        Returns:
+            int: Generation of request, which is attached to the ANALYSIS_EVENT for its result.
+        """
+        position = snapshot(board)
+        with self.condition:
+            self.generation += 1
+            self.pending = (self.generation, position)
+            self.stop_search()
+            self.condition.notify()
+            return self.generation
+
+    def cancel(self):
+        """
+        Cancels pending and in progress analysis.
+        """
+        with self.condition:
+            self.generation += 1
+            self.pending = None
+            self.stop_search()
+
+    def stop(self):
+        """
+        Cancels all analysis and stops worker thread.
+        """
+        with self.condition:
+            self.running = False
+            self.generation += 1
+            self.pending = None
+            self.stop_search()
+            self.condition.notify()
+
+    def stop_search(self):
+        if self.search is not None:
+            self.search.stop()
+
+    def is_current(self, generation):
+        """
+        Determines if generation belongs to the most recently submitted position.
+        """
+        return generation == self.generation
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.running and self.pending is None:
+                    self.condition.wait()
+                if not self.running:
+                    # Shared memory is not freed when the process exits, so must be freed here
+                    if self.parallel is not None:
+                        self.parallel.close()
+                    if self.workers > 1:
+                        self.table.unlink()
+                    return
+                generation, board = self.pending
+                self.pending = None
+
+            try:
+                result = self.analyse(board, generation)
+            except AnalysisCancelled:
+                continue
+
+            if self.is_current(generation):
+                pygame.event.post(pygame.event.Event(ANALYSIS_EVENT, generation=generation, result=result))
+
+    def check_cancelled(self, generation):
+        if not self.is_current(generation):
+            raise AnalysisCancelled
+
+    def analyse(self, board, generation):
+        """
+        Analyses position for player whose turn it is.
+
+        Args:
+            board (Board): Snapshot of board owned by worker thread.
+            generation (int): Generation of request, analysis is abandoned once it is stale.
+
+        Returns:
+            Dict: 'hash' of position analysed, legal 'moves' of each piece keyed by position,
+                    'threats' (positions of player's pieces that are attacked), 'evaluation'
+                    (in pawns from White's perspective), 'best_move' (start_pos, end_pos) or None and
+                    'book' (whether best_move is from opening book).
+        """
+        player = board.whose_turn()
+        opponent = BLACK if player == WHITE else WHITE
+
+        moves = {}
+        for piece in board.get_pieces(player):
+            moves[piece.get_pos()] = piece.available_moves(board)
+            self.check_cancelled(generation)
+
+        # Player's pieces that are attacked, King is first piece and is shown as check instead
+        threats = [piece.get_pos() for piece in board.get_pieces(player)[1:]
+                   if len(board.attackers_of(piece.get_pos(), opponent)) > 0]
+
+        # Search is stopped by stop_search() if position becomes stale
+        if self.workers == 1:
+            search = Search(board, table=self.table, orderer=self.orderer, book=self.book, tablebase=self.tablebase)
+        else:
+            if self.parallel is None:
+                # Imported here so multiprocessing is only loaded when analysis uses more than one process
+                from parallel import ParallelSearch
+                self.parallel = ParallelSearch(board, workers=self.workers, table=self.table, book=self.book,
+                                               tablebase=self.tablebase)
+            self.parallel.board = board
+            search = self.parallel
+        with self.condition:
+            self.check_cancelled(generation)
+            self.search = search
+        result = search.search(depth=ANALYSIS_DEPTH, movetime=ANALYSIS_TIME)
+        with self.condition:
+            self.search = None
+        self.check_cancelled(generation)
+
+        score = result['score'] if player == WHITE else -result['score']
+
+        return {
+            'hash': board.hash,
+            'moves': moves,
+            'threats': threats,
+            'evaluation': score / 100,
+            'best_move': result['move'],
+            'book': result['book']
+        }
@@ -1,28 +1,44 @@
 # Server app used for Flask mode of game multiplayer
-# To use, run python3 -m flask run --host=0.0.0.0 to start flask server, and then run 
+# To use, run python3 -m flask run --host=0.0.0.0 to start flask server, and then run
 # python3 src/gui.py --flask <flask ip address>
+# Several games can be played at once, each request names its game with the game query parameter
+# (e.g /move?game=abc), requests without one are for the game "default". Games are stored in the
+# database given by the CHESS_STORAGE environment variable (games.db by default, "none" to turn
+# storage off), and games in progress are recovered when the server starts. Games can be watched by
+# any number of spectators through /game/spectate, which streams moves as server-sent events.
+# The server's board of each game is authoritative: posted moves are checked against it, and
+# rejected moves are answered with the game's state so the client can resync. Metrics of the
+# server are served in Prometheus' text format from /metrics.
 
+import atexit
+import os
+import threading
+import time
+import uuid
 from werkzeug.exceptions import HTTPException
 from json import dumps
-from flask import Flask, request
-from chess import WHITE, BLACK
+from flask import Flask, Response, g, request
+from chess import WHITE, BLACK, Board, in_bounds
+from metrics import Counter, Gauge, Histogram, Registry
+from notation import board_to_fen
+from spectate import Channel
+from storage import DEFAULT_DATABASE, StorageError, open_store
+from validation import LegalMoveCache
 
-game_data = {
-    'most_recent_move': {'player': BLACK, 'move': []},
-    'assigned_white': False,
-    'assigned_black': False,
-    'game_active': False
-}
+DEFAULT_GAME = 'default'
 
 
 def defaultHandler(err):
     response = err.get_response()
     print('response', err, err.get_response())
-    response.data = dumps({
+    body = {
         "code": err.code,
         "name": "System Error",
         "message": err.get_description(),
-    })
+    }
+    if getattr(err, 'state', None) is not None:
+        body['state'] = err.state
+    response.data = dumps(body)
     response.content_type = 'application/json'
     return response
 
@@ -34,60 +50,280 @@ class AccessError(HTTPException):
     code = 403
     message = 'No message specified'
 
+class GameNotFound(HTTPException):
+    code = 404
+    message = 'No message specified'
+
+class StorageUnavailable(HTTPException):
+    code = 503
+    message = 'No message specified'
+
+class MoveRejected(HTTPException):
+    code = 409
+    message = 'No message specified'
+
+    def __init__(self, description, state):
+        super().__init__(description)
+        self.state = state
+
 
 APP = Flask(__name__)
 APP.config['TRAP_HTTP_EXCEPTIONS'] = True
 APP.register_error_handler(Exception, defaultHandler)
 
 
+def new_game_data(record=None):
+    # Id game is stored under, a new one for each game played under the same name
+    record = record if record is not None else uuid.uuid4().hex
+    board = Board()
+    return {
+        'record': record,
+        'most_recent_move': {'player': BLACK, 'move': []},
+        'assigned_white': False,
+        'assigned_black': False,
+        'game_active': False,
+        'board': board,
+        'channel': Channel(record, board),
+        # Requests for the same game are handled one at a time, requests for different games don't wait
+        'lock': threading.Lock()
+    }
+
+
+def recover_games(store):
+    """
+    Rebuilds games that were in progress when the server stopped, replaying their moves.
+
+    Returns:
+        Dict: Data of each game, keyed by game id.
+    """
+    games = {}
+    for game_id, saved in store.load_games().items():
+        data = new_game_data(saved['record'])
+        data['assigned_white'] = saved['assigned_white']
+        data['assigned_black'] = saved['assigned_black']
+        data['game_active'] = saved['active']
+        for player, (start_pos, end_pos) in saved['moves']:
+            data['board'].move_piece(*start_pos, *end_pos)
+            data['most_recent_move'] = {'player': player, 'move': [list(start_pos), list(end_pos)]}
+            data['channel'].publish(player, data['most_recent_move']['move'], data['board'])
+        games[game_id] = data
+    return games
+
+
+store = open_store(os.environ.get('CHESS_STORAGE', DEFAULT_DATABASE))
+atexit.register(store.close)
+games = recover_games(store)
+games_lock = threading.Lock()
+legal_moves = LegalMoveCache()
+
+
+def count_games(condition):
+    with games_lock:
+        return sum(1 for data in list(games.values()) if condition(data))
+
+
+def poll_to_move_ratio():
+    moves = moves_played.total()
+    return move_polls.total() / moves if moves > 0 else 0.0
+
+
+metrics = Registry()
+request_count = metrics.register(Counter(
+    'chess_requests_total', "Requests handled, by route and status", ('method', 'route', 'status')))
+request_latency = metrics.register(Histogram(
+    'chess_request_duration_seconds', "Time taken to handle requests, by route", ('method', 'route')))
+move_validation = metrics.register(Histogram(
+    'chess_move_validation_seconds', "Time taken to check and play posted moves",
+    buckets=(0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05)))
+moves_played = metrics.register(Counter('chess_moves_total', "Moves played"))
+moves_rejected = metrics.register(Counter('chess_moves_rejected_total', "Moves rejected, by reason", ('reason',)))
+move_polls = metrics.register(Counter('chess_move_polls_total', "Requests for most recent move (GET /move)"))
+metrics.register(Gauge('chess_poll_to_move_ratio', "Requests for most recent move per move played", poll_to_move_ratio))
+metrics.register(Gauge('chess_games', "Games held by server", lambda: count_games(lambda data: True)))
+metrics.register(Gauge('chess_games_active', "Games with both players",
+                       lambda: count_games(lambda data: data['game_active'])))
+metrics.register(Gauge('chess_players_waiting', "Players waiting for an opponent to join",
+                       lambda: count_games(lambda data: data['assigned_white'] != data['assigned_black'])))
+metrics.register(Gauge('chess_spectators', "Spectators connected",
+                       lambda: sum(data['channel'].spectators for data in list(games.values()))))
+metrics.register(Gauge('chess_legal_move_cache_hits_total', "Posted moves checked against cached legal moves",
+                       lambda: legal_moves.hits, kind='counter'))
+metrics.register(Gauge('chess_legal_move_cache_misses_total', "Positions whose legal moves were generated",
+                       lambda: legal_moves.misses, kind='counter'))
+
+
+@APP.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+
+@APP.after_request
+def record_request(response):
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    request_latency.observe(time.perf_counter() - g.request_start, request.method, route)
+    request_count.inc(request.method, route, str(response.status_code))
+    return response
+
+
+def get_game(create=False, must_exist=False):
+    """
+    Finds data of game named by request's game query parameter.
+
+    Args:
+        create (bool, optional): Creates game if it doesn't exist, otherwise returns data of a new
+                                    game without keeping it.
+        must_exist (bool, optional): Raises GameNotFound if game doesn't exist, rather than
+                                        returning data of a new game.
+    """
+    game_id = request.args.get('game', DEFAULT_GAME)
+    with games_lock:
+        if game_id in games:
+            return game_id, games[game_id]
+        if must_exist:
+            raise GameNotFound(f"No game {game_id}")
+        data = new_game_data()
+        if create:
+            games[game_id] = data
+        return game_id, data
+
+
+def game_state(game_data, moves=False):
+    """
+    Describes state of game, sent to clients after their moves so they can check they are in sync.
+
+    Args:
+        moves (bool, optional): Includes every move played, so a client can rebuild the game.
+    """
+    board = game_data['board']
+    state = {
+        'ply': board.turn,
+        'turn': board.whose_turn(),
+        'fen': board_to_fen(board),
+        'winner': board.winner,
+        # Rule game was drawn by, when winner is Draw
+        'draw': board.draw_claim(),
+        'most_recent_move': game_data['most_recent_move']
+    }
+    if moves:
+        state['moves'] = [[list(record['start_pos']), list(record['end_pos'])] for record in board.history]
+    return state
+
+
 def validPost(data):
-    if list(data.keys()) != ['player', 'move']:
+    if not isinstance(data, dict) or set(data.keys()) != {'player', 'move'}:
         raise InputError("Invalid post: Wrong paramters")
 
     if data['player'] not in [WHITE, BLACK]:
         raise InputError("Invalid post: Invalid player")
-    
-    if len(data['move']) != 2 or len(data['move'][0]) != 2 or len(data['move'][1]) != 2:
+
+    move = data['move']
+    if not isinstance(move, list) or len(move) != 2 or not all(
+            isinstance(pos, list) and len(pos) == 2 and all(type(coord) is int for coord in pos) for pos in move):
         raise InputError("Invalid post: Move in wrong format")
 
+    if not all(in_bounds(tuple(pos)) for pos in move):
+        raise InputError("Invalid post: Coordinates not between 0 and 7")
+
 @APP.route('/move', methods=['GET'])
 def get_most_recent():
+    _, game_data = get_game()
+    move_polls.inc()
     return dumps(game_data['most_recent_move'])
 
 @APP.route('/move', methods=['POST'])
 def post_new_move():
     data = request.get_json()
-    global game_data
     validPost(data)
-    game_data['most_recent_move'] = data
-    return {}
+    # Moves are only played in games that players have joined, so they are never played on (and
+    # stored for) a game that isn't kept
+    try:
+        _, game_data = get_game(must_exist=True)
+    except GameNotFound:
+        moves_rejected.inc('no game')
+        raise
+    with game_data['lock']:
+        board = game_data['board']
+        start = time.perf_counter()
+        if not game_data['game_active']:
+            moves_rejected.inc('inactive')
+            raise MoveRejected("Move rejected: Game has not started", game_state(game_data, moves=True))
+        if board.winner is not None:
+            moves_rejected.inc('over')
+            raise MoveRejected("Move rejected: Game is over", game_state(game_data, moves=True))
+        if data['player'] != board.whose_turn():
+            moves_rejected.inc('turn')
+            raise MoveRejected(f"Move rejected: Not {data['player']}'s turn", game_state(game_data, moves=True))
+        start_pos, end_pos = tuple(data['move'][0]), tuple(data['move'][1])
+        if not legal_moves.is_legal(board, (start_pos, end_pos)):
+            moves_rejected.inc('illegal')
+            raise MoveRejected("Move rejected: Move not legal", game_state(game_data, moves=True))
+        board.move_piece(*start_pos, *end_pos, validate=False)
+        move_validation.observe(time.perf_counter() - start)
+
+        try:
+            store.append_move(game_data['record'], board.turn - 1, data['player'], (start_pos, end_pos))
+        except StorageError as error:
+            board.undo_move()
+            raise StorageUnavailable(f"Move not saved: {error}")
+        game_data['most_recent_move'] = data
+        game_data['channel'].publish(data['player'], data['move'], board)
+        moves_played.inc()
+        return game_state(game_data)
 
 @APP.route('/player/new', methods=['PUT'])
 def new_player():
-    global game_data
-    if not game_data['assigned_white']:
-        game_data['assigned_white'] = True
-        return dumps(WHITE)
-    elif not game_data['assigned_black']:
-        game_data['game_active'] = True
-        game_data['assigned_black'] = True
-        return dumps(BLACK)
-    else:
-        raise AccessError("Already two players playing")
+    game_id, game_data = get_game(create=True)
+    with game_data['lock']:
+        if not game_data['assigned_white']:
+            game_data['assigned_white'] = True
+            player = WHITE
+        elif not game_data['assigned_black']:
+            game_data['game_active'] = True
+            game_data['assigned_black'] = True
+            player = BLACK
+        else:
+            raise AccessError("Already two players playing")
+        try:
+            store.save_game(game_data['record'], game_id, game_data['assigned_white'], game_data['assigned_black'],
+                            game_data['game_active'])
+        except StorageError as error:
+            raise StorageUnavailable(f"Player not saved: {error}")
+    return dumps(player)
 
 @APP.route('/game/active', methods=['GET'])
 def is_game_active():
+    _, game_data = get_game()
     return dumps(game_data['game_active'])
 
+@APP.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.expose(), mimetype='text/plain; version=0.0.4')
+
+@APP.route('/game/state', methods=['GET'])
+def get_game_state():
+    _, game_data = get_game()
+    with game_data['lock']:
+        return game_state(game_data, moves=True)
+
+@APP.route('/game/spectate', methods=['GET'])
+def spectate_game():
+    # Created if it doesn't exist, so spectators can wait for a game before its players join
+    _, game_data = get_game(create=True)
+    events = game_data['channel'].subscribe(request.headers.get('Last-Event-ID'))
+    return Response(events, mimetype='text/event-stream', headers={'Cache-Control': 'no-cache',
+                                                                   'X-Accel-Buffering': 'no'})
+
 @APP.route('/game/reset', methods=['DELETE'])
 def clear_game():
-    global game_data
-    game_data = {
-        'most_recent_move': {'player': BLACK, 'move': []},
-        'assigned_white': False,
-        'assigned_black': False,
-        'game_active': False
-    }
+    game_id = request.args.get('game', DEFAULT_GAME)
+    with games_lock:
+        game_data = games.pop(game_id, None)
+    if game_data is not None:
+        game_data['channel'].close()
+        try:
+            store.finish_game(game_data['record'])
+        except StorageError as error:
+            raise StorageUnavailable(f"Game not saved: {error}")
     return {}
 
 if __name__ == '__main__':
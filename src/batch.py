@@ -0,0 +1,403 @@
+# Batched positions as NumPy bitboards, for computing attack maps, check and legal moves of many
+# positions at once (e.g datasets of millions of positions) with vectorised shifts and masks rather
+# than a Python loop over Board objects. Follows this library's rules, so results match Board: no
+# castling, en passant or promotion.
+# Requires NumPy: pip3 install numpy
+#
+# A batch of N positions is an (N, 12) uint64 array of bitboards, one per piece type and colour in
+# PLANES order, and an (N,) uint8 array of whose turn it is (0 for White, 1 for Black). Bit
+# row * 8 + col of a bitboard is set if the piece is at (row, col).
+
+import numpy as np
+from chess import WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING
+
+PIECE_TYPES = [PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING]
+PLANES = [(WHITE, piece_type) for piece_type in PIECE_TYPES] + [(BLACK, piece_type) for piece_type in PIECE_TYPES]
+PLANE_INDEX = {plane: index for index, plane in enumerate(PLANES)}
+P, N, B, R, Q, K = range(6)
+
+# FEN letter of each plane, upper case for White and lower case for Black
+FEN_PLANES = {(piece_type if colour == WHITE else piece_type.lower()): index
+              for index, (colour, piece_type) in enumerate(PLANES)}
+
+ALL = np.uint64(0xFFFFFFFFFFFFFFFF)
+EMPTY = np.uint64(0)
+NOT_COL_0 = np.uint64(0xFEFEFEFEFEFEFEFE)
+NOT_COL_7 = np.uint64(0x7F7F7F7F7F7F7F7F)
+NOT_COLS_0_1 = np.uint64(0xFCFCFCFCFCFCFCFC)
+NOT_COLS_6_7 = np.uint64(0x3F3F3F3F3F3F3F3F)
+ROW_2 = np.uint64(0xFF << 16)
+ROW_5 = np.uint64(0xFF << 40)
+SQUARES = np.array([1 << square for square in range(64)], dtype=np.uint64)
+
+# Directions (row step, col step) of Rooks and Bishops
+ORTHOGONALS = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+DIAGONALS = [(1, 1), (1, -1), (-1, 1), (-1, -1)]
+
+# Bits of each count of set bits in a byte, for counting set bits without np.bitwise_count (NumPy 2)
+BYTE_COUNTS = np.array([bin(byte).count('1') for byte in range(256)], dtype=np.uint8)
+
+
+def shift(bitboards, row_step, col_step):
+    """
+    Moves every set bit by (row_step, col_step), dropping bits moved off the board.
+    """
+    amount = row_step * 8 + col_step
+    shifted = bitboards << np.uint64(amount) if amount > 0 else bitboards >> np.uint64(-amount)
+    if col_step == 1:
+        shifted &= NOT_COL_0
+    elif col_step == 2:
+        shifted &= NOT_COLS_0_1
+    elif col_step == -1:
+        shifted &= NOT_COL_7
+    elif col_step == -2:
+        shifted &= NOT_COLS_6_7
+    return shifted
+
+
+def ray_attacks(sliders, occupied, direction):
+    """
+    Squares attacked by sliders in one direction, up to and including the first occupied square,
+    using a Kogge-Stone fill (three doubling steps rather than up to seven single steps).
+    """
+    row_step, col_step = direction
+    amount = np.uint64(abs(row_step * 8 + col_step))
+    forward = row_step * 8 + col_step > 0
+
+    # Empty squares the fill can spread into, excluding the column a step would wrap around into,
+    # so the shifts by 2 and 4 steps below need no masks of their own
+    empty = ~occupied
+    if col_step == 1:
+        empty &= NOT_COL_0
+    elif col_step == -1:
+        empty &= NOT_COL_7
+
+    filled = sliders
+    for distance in [np.uint64(1), np.uint64(2), np.uint64(4)]:
+        if forward:
+            filled = filled | (empty & (filled << amount * distance))
+            empty = empty & (empty << amount * distance)
+        else:
+            filled = filled | (empty & (filled >> amount * distance))
+            empty = empty & (empty >> amount * distance)
+    return shift(filled, row_step, col_step)
+
+
+def knight_attacks(knights):
+    attacks = np.zeros_like(knights)
+    for row_step, col_step in [(1, 2), (1, -2), (2, 1), (2, -1), (-1, 2), (-1, -2), (-2, 1), (-2, -1)]:
+        attacks |= shift(knights, row_step, col_step)
+    return attacks
+
+
+def king_attacks(kings):
+    attacks = np.zeros_like(kings)
+    for direction in ORTHOGONALS + DIAGONALS:
+        attacks |= shift(kings, *direction)
+    return attacks
+
+
+def pawn_attacks(pawns, white):
+    """
+    Args:
+        pawns (np.ndarray): (N,) bitboards of Pawns.
+        white (np.ndarray): (N,) bool, True where Pawns are White's (moving up rows).
+    """
+    forward = np.where(white, shift(pawns, 1, 0), shift(pawns, -1, 0))
+    return shift(forward, 0, 1) | shift(forward, 0, -1)
+
+
+def slider_attacks(diagonal_sliders, orthogonal_sliders, occupied):
+    attacks = np.zeros_like(occupied)
+    for direction in DIAGONALS:
+        attacks |= ray_attacks(diagonal_sliders, occupied, direction)
+    for direction in ORTHOGONALS:
+        attacks |= ray_attacks(orthogonal_sliders, occupied, direction)
+    return attacks
+
+
+def attacks_by(pieces, white, occupied):
+    """
+    Squares attacked by one side in each position.
+
+    Args:
+        pieces (np.ndarray): (N, 6) bitboards of side's pieces in PIECE_TYPES order.
+        white (np.ndarray): (N,) bool, True where side is White.
+        occupied (np.ndarray): (N,) bitboards of occupied squares.
+
+    Returns:
+        np.ndarray: (N,) bitboards of attacked squares.
+    """
+    return (pawn_attacks(pieces[:, P], white) | knight_attacks(pieces[:, N]) | king_attacks(pieces[:, K]) |
+            slider_attacks(pieces[:, B] | pieces[:, Q], pieces[:, R] | pieces[:, Q], occupied))
+
+
+def popcount(bitboards):
+    """
+    Number of set bits of each bitboard, as an array of the same shape.
+    """
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(bitboards).astype(np.int64)
+    as_bytes = np.ascontiguousarray(bitboards).view(np.uint8).reshape(bitboards.shape + (8,))
+    return BYTE_COUNTS[as_bytes].sum(axis=-1, dtype=np.int64)
+
+
+def pack(boards):
+    """
+    Packs boards into a batch.
+
+    Args:
+        boards (Iterable): Instances of Board class.
+
+    Returns:
+        Tuple: (N, 12) uint64 bitboards and (N,) uint8 turns.
+    """
+    boards = list(boards)
+    bitboards = np.zeros((len(boards), len(PLANES)), dtype=np.uint64)
+    turns = np.zeros(len(boards), dtype=np.uint8)
+    for index, board in enumerate(boards):
+        bitboards[index] = board_bitboards(board)
+        turns[index] = 0 if board.whose_turn() == WHITE else 1
+    return bitboards, turns
+
+
+def board_bitboards(board):
+    """
+    Returns:
+        List: Bitboard of each plane of board in PLANES order, as Python ints.
+    """
+    words = [0] * len(PLANES)
+    for colour in [WHITE, BLACK]:
+        for piece in board.pieces[colour]:
+            row, col = piece.get_pos()
+            words[PLANE_INDEX[(colour, piece.get_type())]] |= 1 << (row * 8 + col)
+    return words
+
+
+def pack_fens(fens):
+    """
+    Packs FEN positions into a batch without creating Board objects. Positions are not validated,
+    see notation.board_from_fen for that.
+
+    Args:
+        fens (Iterable): FEN strings, only piece placement and active colour fields are used.
+
+    Returns:
+        Tuple: (N, 12) uint64 bitboards and (N,) uint8 turns.
+
+    Raises:
+        ValueError: Piece placement of a FEN string is invalid.
+    """
+    fens = list(fens)
+    bitboards = np.zeros((len(fens), len(PLANES)), dtype=np.uint64)
+    turns = np.zeros(len(fens), dtype=np.uint8)
+    for index, fen in enumerate(fens):
+        fields = fen.split()
+        ranks = fields[0].split('/')
+        if len(ranks) != 8:
+            raise ValueError(f"Invalid FEN {fen}")
+        words = [0] * len(PLANES)
+        for rank_index, rank in enumerate(ranks):
+            row = 7 - rank_index
+            col = 0
+            for char in rank:
+                if char.isdigit():
+                    col += int(char)
+                elif char in FEN_PLANES and col < 8:
+                    words[FEN_PLANES[char]] |= 1 << (row * 8 + col)
+                    col += 1
+                else:
+                    raise ValueError(f"Invalid FEN {fen}")
+            if col != 8:
+                raise ValueError(f"Invalid FEN {fen}")
+        bitboards[index] = words
+        turns[index] = 1 if len(fields) > 1 and fields[1] == 'b' else 0
+    return bitboards, turns
+
+
+def to_planes(bitboards):
+    """
+    Expands bitboards into one 8 x 8 plane of 0s and 1s per piece type and colour, e.g as input to
+    a neural network.
+
+    Args:
+        bitboards (np.ndarray): (N, 12) bitboards.
+
+    Returns:
+        np.ndarray: (N, 12, 8, 8) uint8 array indexed [position, plane, row, col].
+    """
+    as_bytes = bitboards.astype('<u8').view(np.uint8)
+    return np.unpackbits(as_bytes, axis=-1, bitorder='little').reshape(bitboards.shape[0], len(PLANES), 8, 8)
+
+
+def sides(bitboards, turns):
+    """
+    Splits bitboards into the pieces of the player whose turn it is and of their opponent.
+
+    Returns:
+        Tuple: (N, 6) bitboards of player's and opponent's pieces, and (N,) bool, True where
+                player is White.
+    """
+    white = turns == 0
+    player = np.where(white[:, None], bitboards[:, :6], bitboards[:, 6:])
+    opponent = np.where(white[:, None], bitboards[:, 6:], bitboards[:, :6])
+    return player, opponent, white
+
+
+def attack_maps(bitboards):
+    """
+    Squares attacked by each player.
+
+    Returns:
+        np.ndarray: (N, 2) bitboards of squares attacked by White and by Black.
+    """
+    occupied = np.bitwise_or.reduce(bitboards, axis=1)
+    white = np.ones(bitboards.shape[0], dtype=bool)
+    return np.stack([attacks_by(bitboards[:, :6], white, occupied),
+                     attacks_by(bitboards[:, 6:], ~white, occupied)], axis=1)
+
+
+def in_check(bitboards, turns):
+    """
+    Returns:
+        np.ndarray: (N,) bool, True where the player whose turn it is is in check.
+    """
+    player, opponent, white = sides(bitboards, turns)
+    occupied = np.bitwise_or.reduce(bitboards, axis=1)
+    return (attacks_by(opponent, ~white, occupied) & player[:, K]) != 0
+
+
+def legal_move_masks(bitboards, turns):
+    """
+    Finds the legal moves of the player whose turn it is, as Board.legal_moves does.
+
+    Returns:
+        np.ndarray: (N, 64) bitboards, element [n, square] has a bit set for each square the
+                    piece at square (row * 8 + col) can move to in position n.
+    """
+    player, opponent, white = sides(bitboards, turns)
+    player_occupied = np.bitwise_or.reduce(player, axis=1)
+    opponent_occupied = np.bitwise_or.reduce(opponent, axis=1)
+    occupied = player_occupied | opponent_occupied
+    empty = ~occupied
+    king = player[:, K]
+    opponent_diagonal = opponent[:, B] | opponent[:, Q]
+    opponent_orthogonal = opponent[:, R] | opponent[:, Q]
+
+    # Pieces giving check, the squares between a checking slider and King (where it can be blocked),
+    # and pinned pieces with the line they are pinned along (from King to the pinning piece)
+    checkers = (pawn_attacks(king, white) & opponent[:, P]) | (knight_attacks(king) & opponent[:, N])
+    block_squares = np.zeros_like(king)
+    pins = []
+    for directions, sliders in [(DIAGONALS, opponent_diagonal), (ORTHOGONALS, opponent_orthogonal)]:
+        for direction in directions:
+            ray = ray_attacks(king, occupied, direction)
+            checker = ray & sliders
+            checkers |= checker
+            block_squares |= np.where(checker != 0, ray, EMPTY)
+
+            blocker = ray & player_occupied
+            pin_ray = ray_attacks(king, occupied & ~blocker, direction)
+            pinned = np.where((pin_ray & sliders) != 0, blocker, EMPTY)
+            pins.append((pinned, pin_ray))
+
+    checker_count = popcount(checkers)
+    check_mask = np.where(checker_count == 0, ALL, np.where(checker_count == 1, checkers | block_squares, EMPTY))
+
+    # King can't move to squares attacked once it has moved, including along the line it moves away on
+    king_danger = attacks_by(opponent, ~white, occupied & ~king)
+
+    targets = ~player_occupied & ~opponent[:, K]
+
+    # Moves of every piece of each type in the batch at once, pieces are found as (position, square)
+    # pairs so no work is done for empty squares
+    count = bitboards.shape[0]
+    piece_bits = np.unpackbits(player.astype('<u8').view(np.uint8).reshape(count, 6, 8), axis=-1,
+                               bitorder='little').reshape(count, 6, 64)
+    masks = np.zeros((count, 64), dtype=np.uint64)
+    for piece_type in [P, N, B, R, Q, K]:
+        positions, squares = np.nonzero(piece_bits[:, piece_type])
+        start = SQUARES[squares]
+        if piece_type == P:
+            is_white = white[positions]
+            # Pawns can move 2 squares from their starting row, i.e if 1 square takes them to ROW_2/ROW_5
+            single_push = np.where(is_white, shift(start, 1, 0), shift(start, -1, 0)) & empty[positions]
+            double_push = np.where(is_white, shift(single_push & ROW_2, 1, 0),
+                                   shift(single_push & ROW_5, -1, 0)) & empty[positions]
+            moves = single_push | double_push | (pawn_attacks(start, is_white) & opponent_occupied[positions])
+        elif piece_type == N:
+            moves = knight_attacks(start)
+        elif piece_type == K:
+            moves = king_attacks(start) & ~king_danger[positions]
+        else:
+            no_sliders = np.zeros_like(start)
+            moves = slider_attacks(start if piece_type != R else no_sliders, start if piece_type != B else no_sliders,
+                                   occupied[positions])
+
+        if piece_type != K:
+            moves &= check_mask[positions]
+            for pinned, pin_ray in pins:
+                moves &= np.where((pinned[positions] & start) != 0, pin_ray[positions], ALL)
+        masks[positions, squares] = moves & targets[positions]
+    return masks
+
+
+def mobility(bitboards, turns):
+    """
+    Returns:
+        np.ndarray: (N,) number of legal moves of the player whose turn it is.
+    """
+    return popcount(legal_move_masks(bitboards, turns)).sum(axis=1)
+
+
+def mask_moves(masks):
+    """
+    Converts one position's row of legal_move_masks into moves.
+
+    Returns:
+        List: Moves (start_pos, end_pos), where each pos is of form (row, col).
+    """
+    moves = []
+    for start in np.flatnonzero(masks):
+        bits = int(masks[start])
+        while bits:
+            end = (bits & -bits).bit_length() - 1
+            moves.append((divmod(int(start), 8), divmod(end, 8)))
+            bits &= bits - 1
+    return moves
+
+
+def cross_check(boards):
+    """
+    Compares batch results against Board for each board: check against Board.is_in_check, legal
+    moves against Board.legal_moves (built from each piece's available_moves), and attack maps
+    against Board.attackers_of.
+
+    Returns:
+        List: (index of board, description) of each mismatch, empty if all results agree.
+    """
+    boards = list(boards)
+    bitboards, turns = pack(boards)
+    checks = in_check(bitboards, turns)
+    masks = legal_move_masks(bitboards, turns)
+    maps = attack_maps(bitboards)
+
+    mismatches = []
+    for index, board in enumerate(boards):
+        player = board.whose_turn()
+        if bool(checks[index]) != board.is_in_check(player):
+            mismatches.append((index, f"in_check {bool(checks[index])}, Board {board.is_in_check(player)}"))
+
+        moves = set(mask_moves(masks[index]))
+        board_moves = set(board.legal_moves())
+        if moves != board_moves:
+            mismatches.append((index, f"moves missing {sorted(board_moves - moves)}, extra {sorted(moves - board_moves)}"))
+
+        for colour_index, colour in enumerate([WHITE, BLACK]):
+            attacked = {(row, col) for row in range(8) for col in range(8)
+                        if len(board.attackers_of((row, col), colour)) > 0}
+            batch_attacked = {divmod(square, 8) for square in range(64)
+                              if int(maps[index, colour_index]) >> square & 1}
+            if attacked != batch_attacked:
+                mismatches.append((index, f"{colour} attacks differ at {sorted(attacked ^ batch_attacked)}"))
+    return mismatches
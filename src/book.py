@@ -0,0 +1,208 @@
+# Opening book, a file of moves played from positions at the start of games, keyed by the Zobrist hash
+# of the position (Board.hash). The file is a sorted array of fixed size records, and is memory
+# mapped by readers so lookups are a binary search with no reading or parsing, and processes using
+# the same book share the same pages of memory.
+# Build a book from archives: python3 src/book.py games.pgn [more.pgn ...] -o book.bin
+
+import argparse
+import mmap
+import os
+from array import array
+from chess import Board, MOVE_BITS, SQUARE_MASKS, pack_move, unpack_move
+from notation import read_games, parse_move
+
+# Each record is two 64 bit words (in native byte order): the position's hash, then the move and
+# its weight (number of times it was played) packed as weight << MOVE_BITS | move (see chess.pack_move)
+RECORD_WORDS = 2
+MAX_WEIGHT = (1 << (64 - MOVE_BITS)) - 1
+
+# Default number of plies from start of each game that are added to book
+BOOK_PLIES = 20
+
+
+def count_moves(games, plies=BOOK_PLIES):
+    """
+    Replays games from the start, counting how often each move was played from each position.
+    A game is only followed up to the first move Board can't play (e.g castling).
+
+    Args:
+        games (Iterable): Games, each a List of move texts in UCI notation or SAN.
+        plies (int, optional): Number of moves from start of each game to count.
+
+    Returns:
+        Dict: Count of each (hash, packed move).
+    """
+    counts = {}
+    for moves in games:
+        board = Board()
+        for text in moves[:plies]:
+            # Game can't be followed any further if move is unsupported (UnsupportedMove) or illegal
+            try:
+                move = parse_move(board, text)
+            except ValueError:
+                break
+            key = (board.hash, pack_move(move))
+            counts[key] = counts.get(key, 0) + 1
+            board.move_piece(*move[0], *move[1])
+            if board.winner is not None:
+                break
+    return counts
+
+
+def write_book(counts, path, min_count=1):
+    """
+    Writes book file of moves played at least min_count times, sorted by hash and then by weight
+    with the most played move first.
+
+    Args:
+        counts (Dict): Count of each (hash, packed move), as returned by count_moves.
+        path (string): Path of book file.
+        min_count (int, optional): Moves played fewer times are left out.
+
+    Returns:
+        int: Number of records written.
+    """
+    records = sorted((key, -count, move) for (key, move), count in counts.items() if count >= min_count)
+    words = array('Q')
+    for key, negative_count, move in records:
+        words.append(key)
+        words.append(min(-negative_count, MAX_WEIGHT) << MOVE_BITS | move)
+
+    # Written to temporary file first, so readers never map a partially written book
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'wb') as file:
+        words.tofile(file)
+    os.replace(temporary_path, path)
+    return len(records)
+
+
+class OpeningBook:
+    """
+    Read only view of a book file. Lookups read the mapped file directly, nothing is loaded into
+    memory up front.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        if size % (8 * RECORD_WORDS) != 0:
+            self.file.close()
+            raise ValueError(f"{path} is not a book file")
+
+        # Empty files can't be mapped
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size > 0 else None
+        self.words = memoryview(self.map).cast('Q') if size > 0 else []
+        self.records = size // (8 * RECORD_WORDS)
+
+    def close(self):
+        if self.map is not None:
+            self.words.release()
+            self.map.close()
+        self.file.close()
+
+    def find(self, key):
+        """
+        Binary search for first record of position with hash key.
+
+        Args:
+            key (int): Zobrist hash of position.
+
+        Returns:
+            int: Index of record, or -1 if position is not in book.
+        """
+        words = self.words
+        low, high = 0, self.records
+        while low < high:
+            middle = (low + high) >> 1
+            if words[middle * RECORD_WORDS] < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.records and words[low * RECORD_WORDS] == key:
+            return low
+        return -1
+
+    def moves(self, key):
+        """
+        Finds all book moves for position with hash key.
+
+        Args:
+            key (int): Zobrist hash of position.
+
+        Returns:
+            List: (move, weight) pairs, most played move first.
+        """
+        index = self.find(key)
+        if index == -1:
+            return []
+
+        words = self.words
+        moves = []
+        while index < self.records and words[index * RECORD_WORDS] == key:
+            data = words[index * RECORD_WORDS + 1]
+            moves.append((unpack_move(data), data >> MOVE_BITS))
+            index += 1
+        return moves
+
+    def is_legal(self, board, move):
+        """
+        Checks book move is legal on board, in case another position has the same hash. Only the
+        moving piece's moves are generated, rather than every legal move.
+        """
+        (start_row, start_col), end_pos = move
+        piece = board.get_piece(start_row, start_col)
+        return (piece is not None and piece.get_colour() == board.whose_turn()
+                and piece.available_moves_mask(board) & SQUARE_MASKS[end_pos] != 0)
+
+    def get_move(self, board, rng=None):
+        """
+        Finds a book move for the player whose turn it is on board.
+
+        Args:
+            board (Board): Instance of Board class to find move for.
+            rng (random.Random, optional): If given, a move is chosen at random in proportion to how
+                                            often it was played, otherwise the most played move.
+
+        Returns:
+            Tuple: Move (start_pos, end_pos), or None if position is not in book.
+        """
+        index = self.find(board.hash)
+        if index == -1:
+            return None
+
+        # Most played move is first, so records are read one at a time until a legal one is found
+        words = self.words
+        if rng is None:
+            while index < self.records and words[index * RECORD_WORDS] == board.hash:
+                move = unpack_move(words[index * RECORD_WORDS + 1])
+                if self.is_legal(board, move):
+                    return move
+                index += 1
+            return None
+
+        moves = [(move, weight) for move, weight in self.moves(board.hash) if self.is_legal(board, move)]
+        if len(moves) == 0:
+            return None
+        return rng.choices([move for move, _ in moves], weights=[weight for _, weight in moves])[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Builds opening book from PGN or move-list archives")
+    parser.add_argument('archives', nargs='+')
+    parser.add_argument('-o', '--output', default='book.bin')
+    parser.add_argument('--plies', type=int, default=BOOK_PLIES)
+    parser.add_argument('--min-count', type=int, default=1)
+    args = parser.parse_args()
+
+    def games():
+        for archive in args.archives:
+            with open(archive) as file:
+                yield from read_games(file)
+
+    counts = count_moves(games(), args.plies)
+    records = write_book(counts, args.output, args.min_count)
+    print(f"Wrote {records} moves to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
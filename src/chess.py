@@ -1,27 +1,25 @@
 # Contains game logic for chess
 
+import random
+from array import array
+
+from constants import ROW, COL, BLACK, WHITE, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, VALUES
+from evaluation import Evaluation
+
 UP = -1
 DOWN = 1
 LEFT = -1
 RIGHT = 1
 
-ROW = 0
-COL = 1
-
 BOARD_SIZE = 8
 
-BLACK = "Black"
-WHITE = "White"
 STALEMATE = "Stalemate"
+DRAW = "Draw"
 
-PAWN = "P"
-KNIGHT = "N"
-BISHOP = "B"
-ROOK = "R"
-QUEEN = "Q"
-KING = "K"
-
-VALUES = {PAWN: 1, KNIGHT: 3, BISHOP: 3, ROOK: 5, QUEEN: 9, KING: 1000}
+# Draws by rule, reported by Board.draw_claim. The game is drawn as soon as either can be claimed
+THREEFOLD_REPETITION = "Threefold repetition"
+FIFTY_MOVE_RULE = "Fifty-move rule"
+FIFTY_MOVE_PLIES = 100
 
 HORIZONTALS = [(0, LEFT), (0, RIGHT)]
 VERTICALS = [(UP, 0), (DOWN, 0)]
@@ -32,18 +30,21 @@ ALL_DIRECTIONS = HORIZONTALS + VERTICALS + DIAGONALS
 def cache_moves(method):
     """
     Decorator to handle caching of available moves. When self.available_moves is called by a piece,
-    decorator checks if has already calculated available moves for this turn. If it has, returns 
-    stored values, else calculates and stores new values.
+    decorator checks if has already calculated available moves for this position. If it has, returns 
+    stored values, else calculates and stores new values. Positions are identified by 
+    board.position_id rather than the turn, so that cached moves stay valid when a move is undone.
     """
     def wrapper(self, board, *args, **kwargs):
         has_modifiers = len(kwargs) > 0
-        if self.available_moves_cache['turn'] == board.turn and not has_modifiers:
+        if self.available_moves_cache['position'] == board.position_id and not has_modifiers:
             return self.available_moves_cache['moves']
         else:
             moves = method(self, board, *args, **kwargs)
             if not has_modifiers:
-                self.available_moves_cache['turn'] = board.turn
+                self.available_moves_cache['position'] = board.position_id
                 self.available_moves_cache['moves'] = moves
+                # Mask of moves is built from them when first needed
+                self.available_moves_cache['mask'] = None
             return moves
 
     return wrapper
@@ -112,82 +113,156 @@ def get_direction_vector(pos1, pos2):
     return increment
 
 
-def in_line(pos1, pos2, pos3):
+def build_rays():
+    """
+    Precomputes, for every position in grid and every direction, the positions that are passed
+    through when following that direction from the position to the edge of the grid.
+
+    Returns:
+        Dict: Dict keyed by position (row, col) of dicts keyed by direction, e.g (UP, RIGHT), of
+                Tuples of positions, ordered by distance from starting position.
+    """
+    rays = {}
+    for row in range(BOARD_SIZE):
+        for col in range(BOARD_SIZE):
+            rays[(row, col)] = {}
+            for row_iter, col_iter in ALL_DIRECTIONS:
+                ray = []
+                pos = (row + row_iter, col + col_iter)
+                while in_bounds(pos):
+                    ray.append(pos)
+                    pos = (pos[ROW] + row_iter, pos[COL] + col_iter)
+                rays[(row, col)][(row_iter, col_iter)] = tuple(ray)
+    return rays
+
+
+def build_targets(offsets):
     """
-    Determines if pos3 is a point along a vertical/horizontal/diagonal line between pos1 and pos2. 
-    Note, does not check if there is anything else in between pos1 and pos2, only that pos3 is
-    inbetween. 
+    Precomputes, for every position in grid, the positions reached by adding each of offsets.
 
     Args:
-        pos1 (Tuple): position in array (row, col).
-        pos2 (Tuple): position in array (row, col).
-        pos3 (Tuple): position in array (row, col).
+        offsets (List): List of Tuples (row_offset, col_offset).
 
     Returns:
-        Bool: True/False of whether pos3 is between pos1 and pos2.
+        Dict: Dict keyed by position (row, col) of Tuples of the in bounds positions.
     """
-    if ((pos1[ROW] <= pos3[ROW] <= pos2[ROW] or pos2[ROW] <= pos3[ROW] <= pos1[ROW])
-            and (pos1[COL] <= pos3[COL] <= pos2[COL] or pos2[COL] <= pos3[COL] <= pos1[COL])):
-        direction_pos1_pos2 = difference_in_pos(pos1, pos2)
-        direction_pos1_pos3 = difference_in_pos(pos1, pos3)
+    targets = {}
+    for row in range(BOARD_SIZE):
+        for col in range(BOARD_SIZE):
+            targets[(row, col)] = tuple((row + row_offset, col + col_offset) for row_offset, col_offset in offsets
+                                        if in_bounds((row + row_offset, col + col_offset)))
+    return targets
 
-        # In horizontal/vertical line
-        if direction_pos1_pos3[ROW] == direction_pos1_pos2[ROW] == 0 or direction_pos1_pos3[
-                COL] == direction_pos1_pos2[COL] == 0:
-            return True
 
-        # In diagonal line
-        if abs(direction_pos1_pos3[ROW]) == abs(direction_pos1_pos3[COL]) and abs(direction_pos1_pos2[
-                ROW]) == abs(direction_pos1_pos2[COL]):
-            return True
+KNIGHT_OFFSETS = [(1, 2), (1, -2), (2, 1), (2, -1), (-1, 2), (-1, -2), (-2, 1), (-2, -1)]
 
-    return False
+# Precomputed attack information used by Board.attackers_of
+RAYS = build_rays()
+KNIGHT_TARGETS = build_targets(KNIGHT_OFFSETS)
+KING_TARGETS = build_targets(ALL_DIRECTIONS)
 
+# Positions that a Pawn of each colour attacks a position from, White Pawns move DOWN so attack from above
+PAWN_ATTACKERS = {
+    WHITE: build_targets([(UP, LEFT), (UP, RIGHT)]),
+    BLACK: build_targets([(DOWN, LEFT), (DOWN, RIGHT)])
+}
 
-def list_intersection(l1, l2):
+# Pieces that can attack along each direction
+SLIDERS = {direction: ((ROOK, QUEEN) if direction in HORIZONTALS + VERTICALS else (BISHOP, QUEEN))
+           for direction in ALL_DIRECTIONS}
+
+# Sets of positions are held as 64 bit masks, with bit row * 8 + col set for each position in set,
+# so testing if a position is in a set is a bit test
+SQUARE_MASKS = {(row, col): 1 << (row * BOARD_SIZE + col) for row in range(BOARD_SIZE) for col in range(BOARD_SIZE)}
+
+# Moves are packed into 16 bits: start square * 64 + end square in the low 12 bits (square of
+# position is row * 8 + col), with flags describing the move above them
+MOVE_BITS = 12
+MOVE_MASK = (1 << MOVE_BITS) - 1
+CAPTURE_FLAG = 1 << 12
+PAWN_FLAG = 1 << 13
+
+
+def square_index(pos):
+    return pos[ROW] * BOARD_SIZE + pos[COL]
+
+
+def pack_move(move, flags=0):
     """
-    Returns a list containing the intersection of 2 lists l1 and l2, i.e list with all items that
-    are in both lists. Order of l1 is retained in returned list. 
+    Packs move (start_pos, end_pos) into 16 bits, e.g so lists of moves can be held in array('H').
 
     Args:
-        l1 (List): Arbitrary list.
-        l2 (List): Arbitrary list.
+        move (Tuple): Move (start_pos, end_pos).
+        flags (int, optional): CAPTURE_FLAG and/or PAWN_FLAG, defaults to no flags.
 
     Returns:
-        List: List containing intersection of l1 and l2.
+        int: Packed move.
+    """
+    (start_row, start_col), (end_row, end_col) = move
+    return flags | (start_row * BOARD_SIZE + start_col) << 6 | end_row * BOARD_SIZE + end_col
+
+
+def unpack_move(packed):
     """
-    temp = set(l2)
-    return [value for value in l1 if value in temp]
+    Unpacks move packed by pack_move into (start_pos, end_pos), ignoring flags.
+    """
+    start, end = divmod(packed & MOVE_MASK, 64)
+    return divmod(start, BOARD_SIZE), divmod(end, BOARD_SIZE)
+
+
+def positions_mask(positions):
+    """
+    Converts list of positions (row, col) into mask of positions (see SQUARE_MASKS).
+    """
+    mask = 0
+    for pos in positions:
+        mask |= SQUARE_MASKS[pos]
+    return mask
 
 
-def in_sight(board, start_pos, direction):
+def build_between():
     """
-    Finds the first Piece on the board that is found by following a direction from a starting point
-    in grid. If no Piece is found, returns None. 
+    Precomputes, for every pair of positions in line with each other, the mask of the positions
+    strictly between them.
+
+    Returns:
+        Dict: Dict keyed by (pos1, pos2) of masks, pairs of positions not in line are left out.
+    """
+    between = {}
+    for pos, rays in RAYS.items():
+        for ray in rays.values():
+            mask = 0
+            for target in ray:
+                between[(pos, target)] = mask
+                mask |= SQUARE_MASKS[target]
+    return between
+
+
+BETWEEN = build_between()
 
 
+def build_zobrist_keys(seed):
+    """
+    Generates the random 64 bit keys used to hash positions. Keys are generated from a fixed seed,
+    so hashes are the same in every process and can be stored in files.
+
     Args:
-        board (Board): Instance of Board class that contains all information of current state of game
-        start_pos (Tuple): Starting position in grid.
-        direction (Tuple): Tuple containing of form (row_iter, col_iter), which is the direction that
-                            should be followed from starting position.
+        seed (int): Seed for random number generator.
 
     Returns:
-        Piece: Returns the first Piece that is found by following direction from starting position
-                or None if there is no Piece found. 
+        Tuple: Dict indexed by [colour][piece type][(row, col)] of keys, and key for Black to move.
     """
-    row_iter = direction[ROW]
-    col_iter = direction[COL]
-    row = start_pos[ROW] + row_iter
-    col = start_pos[COL] + col_iter
+    rng = random.Random(seed)
+    keys = {}
+    for colour in [WHITE, BLACK]:
+        keys[colour] = {}
+        for piece_type in [PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING]:
+            keys[colour][piece_type] = {(row, col): rng.getrandbits(64)
+                                        for row in range(BOARD_SIZE) for col in range(BOARD_SIZE)}
+    return keys, rng.getrandbits(64)
 
-    piece = None
-    while in_bounds((row, col)) and piece is None:
-        piece = board.get_piece(row, col)
-        row += row_iter
-        col += col_iter
 
-    return piece
+ZOBRIST_KEYS, ZOBRIST_BLACK_TO_MOVE = build_zobrist_keys(20230101)
 
 
 class Piece:
@@ -195,11 +270,29 @@ class Piece:
         self.pos = pos
         self.type = type
         self.colour = colour
-        self.available_moves_cache = {'turn': -1, 'moves': []}
+        self.available_moves_cache = {'position': -1, 'moves': [], 'mask': None}
 
     def __str__(self):
         return self.type
 
+    def available_moves_mask(self, board):
+        """
+        Finds the positions that Piece can move to as a mask (see SQUARE_MASKS), built once per
+        position from available_moves.
+
+        Args:
+            board (Board): Instance of Board class that contains all information about the
+                            current state of game.
+
+        Returns:
+            int: Mask of available moves.
+        """
+        moves = self.available_moves(board)
+        cache = self.available_moves_cache
+        if cache['mask'] is None or cache['moves'] is not moves:
+            cache['mask'] = positions_mask(moves)
+        return cache['mask']
+
     def set_pos(self, pos):
         """
         Set position of Piece.
@@ -287,10 +380,10 @@ class Piece:
 
     def protecting_king(self, board):
         """
-        Checks if Piece is protecting King from being in check due to an enemy's Queen/Rook/Bishop. 
-        Determines if your team's King is within line of sight (i.e unobstructed along a
-        vertical, horizontal, diagonal line in grid), and if so checks if this piece is standing
-        between King and an opponents piece who could place King in check along this line.
+        Checks if Piece is protecting King from being in check due to an enemy's Queen/Rook/Bishop 
+        (i.e Piece is pinned). Follows the line from your team's King through this piece, which 
+        must be the first piece on that line, and checks if the next piece along the line is an
+        opponent's piece who could place King in check along this line.
 
         Args:
             board (Board): Instance of Board class that contains all information about the 
@@ -300,93 +393,31 @@ class Piece:
             Tuple: Returns the position of the opponent's piece that this piece is protecting the
                     King from, defaults to (None, None) if there is no such piece. 
         """
+        king_pos = board.king[self.colour].get_pos()
+        direction = get_direction_vector(king_pos, self.pos)
+        if direction == (None, None):
+            return (None, None)
 
-        # Checks Horizontal, Vertical, Diagonal to see if your teams King is in sight
-        found_row_iter = found_col_iter = None
-        for row_iter, col_iter in VERTICALS + HORIZONTALS + DIAGONALS:
-            row = self.pos[ROW] + row_iter
-            col = self.pos[COL] + col_iter
-            while in_bounds((row, col)):
-                target_piece = board.get_piece(row, col)
-                if target_piece is not None:
-                    if target_piece == board.king[self.get_colour()]:
-                        found_col_iter = -1 * col_iter
-                        found_row_iter = -1 * row_iter
-                    break
-                row += row_iter
-                col += col_iter
+        found_self = False
+        for row, col in RAYS[king_pos][direction]:
+            target_piece = board.grid[row][col]
+            if target_piece is None:
+                continue
 
-            if found_row_iter is not None:
-                break
+            # Another piece is between King and this piece, so cannot be protecting King
+            if not found_self and target_piece is not self:
+                return (None, None)
 
-        # If King not in sight, cannot be protecting King
-        if found_row_iter is None:
-            return (None, None)
-
-        # If King is in line of sight, checks if there is a Bishop, Rook or Queen in opposite direction
-        row = self.pos[ROW] + found_row_iter
-        col = self.pos[COL] + found_col_iter
-        opponent = WHITE if self.get_colour() == BLACK else BLACK
-        direction = (found_col_iter, found_row_iter)
-        while in_bounds((row, col)):
-            target_piece = board.get_piece(row, col)
-            if target_piece is not None:
-                if target_piece.get_colour() == opponent and (
-                    (target_piece.get_type() in [BISHOP, QUEEN] and direction in DIAGONALS) or
-                    (target_piece.get_type() in [ROOK, QUEEN]
-                     and direction in HORIZONTALS + VERTICALS)):
+            if found_self:
+                if target_piece.colour != self.colour and target_piece.type in SLIDERS[direction]:
                     return (row, col)
-                break
-            row += found_row_iter
-            col += found_col_iter
+                return (None, None)
+
+            found_self = True
 
         # If in line of sight of King but not protecting from anything
         return (None, None)
 
-    def discovered_check(self, move, board):
-        """
-        Determines moving piece to position dictated by move will result in a discovered check. If 
-        no discovered check results, returns None. Otherwise, returns the piece that causes the
-        discovered check. 
-
-        Args:
-            move (Tuple): Position (row, col) that piece can move to. 
-            board (Board): Instance of Board class that contains all information about the 
-                            current state of game.
-
-        Returns:
-            Piece: Returns the piece that causes discovered check, if no such piece exists returns 
-                    None.
-        """
-
-        opponent = BLACK if self.get_colour() == WHITE else WHITE
-        enemy_king = board.king[opponent]
-
-        # If move just results in piece staying in line with King, then cannot result in discovered check
-        if in_line(enemy_king.get_pos(), self.get_pos(), move) or in_line(
-                enemy_king.get_pos(), move, self.get_pos()):
-            return None
-
-        increment = get_direction_vector(enemy_king.get_pos(), self.get_pos())
-        if increment == (None, None):
-            return None
-
-        # Checks if enemy king is in sight of piece (i.e, not just in line with King)
-        if in_sight(board, self.get_pos(),
-                    (-1 * increment[ROW], -1 * increment[COL])) != enemy_king:
-            return None
-
-        # Checks if you have a Rook, Bishp, Queen, in sight of this piece
-        piece = in_sight(board, self.get_pos(), increment)
-        if piece is not None:
-            if piece.get_colour() == self.get_colour():
-                if increment in HORIZONTALS + VERTICALS and piece.get_type() in [ROOK, QUEEN]:
-                    return piece
-                if increment in DIAGONALS and piece.get_type() in [BISHOP, QUEEN]:
-                    return piece
-
-        return None
-
     def filter_moves_to_protect_king(self, moves, board):
         """
         Given a set of possible moves, filter out moves that would leave your King exposed in the 
@@ -404,9 +435,8 @@ class Piece:
         movement_vector = get_direction_vector(board.king[self.get_colour()].get_pos(),
                                                self.get_pos())
         negative_movement_vector = (-1 * movement_vector[ROW], -1 * movement_vector[COL])
-        positions_in_line_with_king = self.moves_in_line(
-            board, [movement_vector, negative_movement_vector])
-        return list_intersection(moves, positions_in_line_with_king)
+        in_line_with_king = positions_mask(self.moves_in_line(board, [movement_vector, negative_movement_vector]))
+        return [move for move in moves if SQUARE_MASKS[move] & in_line_with_king]
 
     def filter_moves_to_stop_check(self, moves, board):
         """
@@ -420,23 +450,17 @@ class Piece:
         Returns:
             List: List of moves with filter applied.
         """
-        filtered_moves = []
-
         # In double check, pieces can't stop chess by capturing or blocking, has to be from movement from King
         if len(board.check[self.get_colour()]['pieces_causing_check']) > 1:
             return []
 
+        # Check is stopped by capturing piece causing check, or by blocking it, note cannot block a
+        # check caused by a Knight
         opposing_piece = board.check[self.get_colour()]['pieces_causing_check'][0]
-        for move in moves:
-            # Capture piece that is causing check
-            if move == opposing_piece.get_pos():
-                filtered_moves.append(move)
-            # Block piece, note cannot block a check caused by a Knight
-            elif opposing_piece.get_type() != KNIGHT:
-                is_in_line = in_line(opposing_piece.get_pos(), board.king[self.get_colour()].get_pos(), move)
-                if is_in_line:
-                    filtered_moves.append(move)
-        return filtered_moves
+        stops_check = SQUARE_MASKS[opposing_piece.get_pos()]
+        if opposing_piece.get_type() != KNIGHT:
+            stops_check |= BETWEEN.get((board.king[self.get_colour()].get_pos(), opposing_piece.get_pos()), 0)
+        return [move for move in moves if SQUARE_MASKS[move] & stops_check]
 
 
 class Pawn(Piece):
@@ -445,11 +469,17 @@ class Pawn(Piece):
         self.__direction = DOWN if colour == WHITE else UP
         self.__has_moved = False
     
-    def set_has_moved(self):
+    def set_has_moved(self, has_moved=True):
+        """
+        Records whether Pawn has moved, defaults to True.
+        """
+        self.__has_moved = has_moved
+
+    def has_moved(self):
         """
-        Records that Pawn has moved
+        Returns whether Pawn has moved.
         """
-        self.__has_moved = True
+        return self.__has_moved
 
     @cache_moves
     def available_moves(self, board):
@@ -472,8 +502,9 @@ class Pawn(Piece):
             if board.get_piece(next_row, col) is None:
                 moves.append((next_row, col))
 
-            # Moving pawn 2 places forward if nothing in front of it and has not yet moved
-            if board.get_piece(next_row, col) is None and board.get_piece(next_row + self.__direction, col) is None and not self.__has_moved:
+            # Moving pawn 2 places forward if nothing in front of it and has not yet moved (checked
+            # first, as a pawn that has moved may be next to edge of grid)
+            if not self.__has_moved and board.get_piece(next_row, col) is None and board.get_piece(next_row + self.__direction, col) is None:
                 moves.append((next_row + self.__direction, col))
 
             # Moving pawn diagonally forward left if there is an enemy piece there
@@ -708,65 +739,74 @@ class King(Piece):
         """
 
 
-        row = self.pos[ROW]
-        col = self.pos[COL]
         opponent = BLACK if self.colour == WHITE else WHITE
 
-        moves = [(row + row_iter, col + col_iter) for row_iter, col_iter in ALL_DIRECTIONS]
-        
-        # Filter out moves that are out of bounds
-        moves = list(filter(lambda pos: in_bounds(pos), moves))
+        # Positions next to King that are in bounds
+        moves = list(KING_TARGETS[self.pos])
         
         # Filter out moves that attack your own pieces
         _ = lambda pos: board.get_piece(*pos) is None or board.get_piece(*pos).colour == opponent
         moves = list(filter(_, moves))
 
-        # Removing King from list of opposing pieces (King is first piece in list)
-        opposing_pieces = board.get_pieces(opponent)
-        opposing_pieces = opposing_pieces[1:]
-
-        for piece in opposing_pieces:
-            if len(moves) == 0:
-                return moves
-            
-            opposing_moves = piece.attacking_moves(board)
-            moves = list(filter(lambda pos: pos not in opposing_moves, moves))
+        # Filter out moves to positions attacked by opponent, King is ignored when looking for
+        # attackers as King cannot block an attack on a position it is moving away along
+        moves = [pos for pos in moves if len(board.attackers_of(pos, opponent, ignore=(self,))) == 0]
 
         return moves
 
 
 class Board:
-    def __init__(self):
-
-        # Create 8 x 8 Grid
-        self.grid = [[None for x in range(8)] for y in range(8)]
+    def __init__(self, pieces=None, turn=0, halfmove_clock=0):
+        """
+        Args:
+            pieces (List, optional): Pieces to place on board, which must include exactly one King
+                                        of each colour, defaults to the starting position.
+            turn (int, optional): Number of turns already played, even if it is White's turn,
+                                    defaults to 0.
+            halfmove_clock (int, optional): Number of turns since the last capture or Pawn move,
+                                                defaults to 0.
 
-        # Pawns
-        self.grid[1] = [Pawn((1, x), WHITE) for x in range(8)]
-        self.grid[6] = [Pawn((6, x), BLACK) for x in range(8)]
+        Raises:
+            ValueError: Each player doesn't have exactly one King, pieces share a position, or the
+                        player who has just moved is in check.
+        """
 
-        # Remaining Pieces
-        pieces = [Rook, Knight, Bishop, Queen, King, Bishop, Knight, Rook]
-        self.grid[0] = [piece((0, index), WHITE) for index, piece in enumerate(pieces)]
-        self.grid[7] = [piece((7, index), BLACK) for index, piece in enumerate(pieces)]
+        if pieces is None:
+            back_row = [Rook, Knight, Bishop, Queen, King, Bishop, Knight, Rook]
+            pieces = [piece((0, index), WHITE) for index, piece in enumerate(back_row)] + \
+                     [Pawn((1, x), WHITE) for x in range(8)] + \
+                     [Pawn((6, x), BLACK) for x in range(8)] + \
+                     [piece((7, index), BLACK) for index, piece in enumerate(back_row)]
 
-        # Each player's King piece
-        self.king = {WHITE: self.grid[0][4], BLACK: self.grid[7][4]}
+        # Create 8 x 8 Grid
+        self.grid = [[None for x in range(8)] for y in range(8)]
 
-        # List of Each player's pieces, sorted by value
+        # Each player's King piece, and list of each player's pieces, sorted by value
+        self.king = {}
         self.pieces = {WHITE: [], BLACK: []}
-        for row in self.grid[0:2]:
-            for piece in row:
-                self.pieces[WHITE].append(piece)
-        self.pieces[WHITE].sort(key=lambda piece: VALUES[piece.get_type()], reverse=True)
-
-        for row in self.grid[6:8]:
-            for piece in row:
-                self.pieces[BLACK].append(piece)
-        self.pieces[BLACK].sort(key=lambda piece: VALUES[piece.get_type()], reverse=True)
+        for piece in pieces:
+            row, col = piece.get_pos()
+            if self.grid[row][col] is not None:
+                raise ValueError(f"More than one piece at {piece.get_pos()}")
+            self.grid[row][col] = piece
+            self.pieces[piece.get_colour()].append(piece)
+
+            if piece.get_type() == KING:
+                if piece.get_colour() in self.king:
+                    raise ValueError(f"{piece.get_colour()} has more than one King")
+                self.king[piece.get_colour()] = piece
+
+            # Pawns only move forwards, so any Pawn away from its starting row has moved
+            if piece.get_type() == PAWN and row != (1 if piece.get_colour() == WHITE else 6):
+                piece.set_has_moved()
+
+        for colour in [WHITE, BLACK]:
+            if colour not in self.king:
+                raise ValueError(f"{colour} has no King")
+            self.pieces[colour].sort(key=lambda piece: VALUES[piece.get_type()], reverse=True)
 
         # Current turn of Game
-        self.turn = 0
+        self.turn = turn
 
         # Information about whether each player is in check
         self.check = {
@@ -780,12 +820,48 @@ class Board:
             }
         }
 
-        # Winner of game, defaults to None
+        # Winner of game (BLACK/WHITE), STALEMATE or DRAW once game is over, defaults to None
         self.winner = None
 
         # Piece that was moved in previous turn
         self.previously_moved_piece = None
 
+        # Identifies current position, a new id is used for every position reached by moving a piece
+        # and the previous id is restored when a move is undone
+        self.position_id = 0
+        self.positions_created = 1
+
+        # Information needed to undo each move that has been made, most recent move last
+        self.history = []
+
+        # Turns since the last capture or Pawn move, and hashes of positions before each move. As
+        # captures and Pawn moves can't be undone, positions before the last of them can't repeat
+        self.halfmove_clock = halfmove_clock
+        self.hash_history = []
+
+        # Zobrist hash of position, updated as pieces move
+        self.hash = 0
+        for piece in self.pieces[WHITE] + self.pieces[BLACK]:
+            self.hash ^= ZOBRIST_KEYS[piece.get_colour()][piece.get_type()][piece.get_pos()]
+
+        # Material and piece-square score, updated as pieces move
+        self.evaluation = Evaluation(self.pieces[WHITE] + self.pieces[BLACK])
+
+        player = self.whose_turn()
+        opponent = BLACK if player == WHITE else WHITE
+        if player == BLACK:
+            self.hash ^= ZOBRIST_BLACK_TO_MOVE
+
+        # Positions other than the starting position may begin in check, or with the game over
+        if len(self.attackers_of(self.king[opponent].get_pos(), player)) > 0:
+            raise ValueError(f"{opponent} is in check but it is {player}'s turn")
+        self.check[player]['pieces_causing_check'] = self.attackers_of(self.king[player].get_pos(), opponent)
+        self.check[player]['in_check'] = len(self.check[player]['pieces_causing_check']) > 0
+        if self.no_available_moves(player):
+            self.winner = opponent if self.is_in_check(player) else STALEMATE
+        elif self.draw_claim() is not None:
+            self.winner = DRAW
+
     def __str__(self):
         grid_str = "  abcdefgh\n  --------\n"
         for index, row in enumerate(self.grid):
@@ -816,7 +892,7 @@ class Board:
         pieces = self.pieces[colour]
         return [f"{piece.get_type()} {piece.get_pos()}" for piece in pieces]
 
-    def move_piece(self, curr_row, curr_col, new_row, new_col):
+    def move_piece(self, curr_row, curr_col, new_row, new_col, validate=True):
         """
         Moves piece at (curr_row, curr_col) to (new_row, new_col).
 
@@ -825,6 +901,9 @@ class Board:
             curr_col (int): col co-ordinate in grid.
             new_row (int): row co-ordinate in grid.
             new_col (int): col co-ordinate in grid.
+            validate (bool, optional): If False, move is assumed to have already been checked
+                                        against the moves available (e.g from legal_moves), and
+                                        the piece's available moves are not generated.
 
         Raises:
             ValueError: Either (curr_row, curr_col) or (new_row, new_col) points to position 
@@ -850,8 +929,7 @@ class Board:
         if piece.get_colour() != player:
             raise ValueError("Cannot move an opponents piece")
 
-        available_moves = piece.available_moves(self)
-        if (new_row, new_col) not in available_moves:
+        if validate and not piece.available_moves_mask(self) & SQUARE_MASKS[(new_row, new_col)]:
             raise ValueError("Move not valid")
 
         target_piece = self.grid[new_row][new_col]
@@ -859,52 +937,176 @@ class Board:
         if target_piece == self.king[opponent]:
             raise ValueError("Cannot capture opponent's King")
 
+        # Record state that is changed by move, so move can be undone
+        self.history.append({
+            'piece': piece,
+            'start_pos': (curr_row, curr_col),
+            'end_pos': (new_row, new_col),
+            'captured_piece': target_piece,
+            'captured_index': None if target_piece is None else self.pieces[opponent].index(target_piece),
+            'has_moved': piece.has_moved() if piece.get_type() == PAWN else None,
+            'check': {colour: {'in_check': self.check[colour]['in_check'],
+                               'pieces_causing_check': list(self.check[colour]['pieces_causing_check'])}
+                      for colour in [WHITE, BLACK]},
+            'winner': self.winner,
+            'previously_moved_piece': self.previously_moved_piece,
+            'position_id': self.position_id,
+            'halfmove_clock': self.halfmove_clock,
+            'evaluation': self.evaluation.save()
+        })
+        self.hash_history.append(self.hash)
+
         # Capture opposing target_piece
         if target_piece is not None:
             self.pieces[opponent].remove(target_piece)
-
-        # Check if moving piece will cause a discovered check
-        discovered_check_piece = piece.discovered_check((new_row, new_col), self)
-        if discovered_check_piece is not None:
-            self.check[opponent]['pieces_causing_check'].append(discovered_check_piece)
-            self.check[opponent]['in_check'] = True
+            self.evaluation.remove_piece(target_piece, (new_row, new_col))
+            self.hash ^= ZOBRIST_KEYS[opponent][target_piece.get_type()][(new_row, new_col)]
 
         # Move piece, update turn count
         piece.set_pos((new_row, new_col))
         self.grid[curr_row][curr_col] = None
         self.grid[new_row][new_col] = piece
+        self.evaluation.move_piece(piece, (curr_row, curr_col), (new_row, new_col))
+        piece_keys = ZOBRIST_KEYS[player][piece.get_type()]
+        self.hash ^= piece_keys[(curr_row, curr_col)] ^ piece_keys[(new_row, new_col)] ^ ZOBRIST_BLACK_TO_MOVE
         self.turn += 1
+        self.position_id = self.positions_created
+        self.positions_created += 1
 
         if piece.get_type() == PAWN:
             piece.set_has_moved()
+            self.halfmove_clock = 0
+        elif target_piece is not None:
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
 
-        # Take your King out of check by either moving king, capturing piece or blocking
-        if piece.get_type() == KING and self.check[player]['in_check']:
-            self.check[player]['pieces_causing_check'].clear()
-            self.check[player]['in_check'] = False
-        elif target_piece in self.check[player]['pieces_causing_check']:
-            self.check[player]['pieces_causing_check'].remove(target_piece)
-            self.check[player]['in_check'] = len(self.check[player]['pieces_causing_check']) > 1
-        elif self.check[player]['in_check']:
-            for checking_piece in self.check[player]['pieces_causing_check']:
-                if in_line(self.king[player].get_pos(), checking_piece.get_pos(), piece.get_pos()):
-                    self.check[player]['pieces_causing_check'].remove(checking_piece)
-            self.check[player]['in_check'] = len(self.check[player]['pieces_causing_check']) > 1
-
-        # Place Oppossing King in Check, note a King can't place an opposing King in Check
-        if piece.get_type() != KING:
-            new_available_moves = piece.available_moves(self)
-            if self.king[opponent].get_pos() in new_available_moves:
-                self.check[opponent]['in_check'] = True
-                self.check[opponent]['pieces_causing_check'].append(piece)
+        # Player's King cannot be in check after a valid move
+        self.check[player]['pieces_causing_check'] = []
+        self.check[player]['in_check'] = False
+
+        # Find pieces placing opposing King in check, which covers both checks from the moved piece
+        # and discovered checks
+        self.check[opponent]['pieces_causing_check'] = self.attackers_of(self.king[opponent].get_pos(), player)
+        self.check[opponent]['in_check'] = len(self.check[opponent]['pieces_causing_check']) > 0
 
         # If opponent now has no possible moves they are either in checkmate (if they are in check)
         # or the game has ended in stalemate
         if self.no_available_moves(opponent):
             self.winner = player if self.is_in_check(opponent) else STALEMATE
+        elif self.draw_claim() is not None:
+            self.winner = DRAW
         
         self.previously_moved_piece = piece
 
+    def repetitions(self):
+        """
+        Counts how many times the current position has occurred before, scanning back only as far
+        as the last capture or Pawn move.
+
+        Returns:
+            int: Number of earlier occurrences of position.
+        """
+        hashes = self.hash_history
+        # Positions with the same player to move are an even number of turns back
+        return hashes[max(len(hashes) - self.halfmove_clock, 0):][-2::-2].count(self.hash)
+
+    def draw_claim(self):
+        """
+        Finds rule that game can be drawn by in current position.
+
+        Returns:
+            string literal: THREEFOLD_REPETITION if position has occurred three times, FIFTY_MOVE_RULE
+                            if fifty moves by each player have passed without a capture or Pawn
+                            move, otherwise None.
+        """
+        if self.halfmove_clock >= FIFTY_MOVE_PLIES:
+            return FIFTY_MOVE_RULE
+        if self.halfmove_clock >= 4 and self.repetitions() >= 2:
+            return THREEFOLD_REPETITION
+        return None
+
+    def attackers_of(self, pos, colour, ignore=()):
+        """
+        Finds all of colour's pieces that attack position pos, regardless of what is at pos. Scans
+        outward from pos along precomputed rays for Bishops/Rooks/Queens and checks the few 
+        positions a Knight/King/Pawn could attack pos from, rather than generating the moves of
+        every piece.
+
+        Args:
+            pos (Tuple): Position (row, col) in grid.
+            colour (string literal): Player BLACK/WHITE whose attacking pieces are found.
+            ignore (Tuple, optional): Pieces to treat as if they were not on the board, e.g a King
+                                        moving away from an attacking piece, defaults to ().
+
+        Returns:
+            List: List of colour's pieces attacking pos.
+        """
+        grid = self.grid
+        attackers = []
+
+        for direction, ray in RAYS[pos].items():
+            for row, col in ray:
+                piece = grid[row][col]
+                if piece is None or piece in ignore:
+                    continue
+                if piece.colour == colour and piece.type in SLIDERS[direction]:
+                    attackers.append(piece)
+                break
+
+        for targets, piece_type in [(KNIGHT_TARGETS, KNIGHT), (KING_TARGETS, KING), (PAWN_ATTACKERS[colour], PAWN)]:
+            for row, col in targets[pos]:
+                piece = grid[row][col]
+                if piece is not None and piece.colour == colour and piece.type == piece_type and piece not in ignore:
+                    attackers.append(piece)
+
+        return attackers
+
+    def undo_move(self):
+        """
+        Undoes the most recent move made with move_piece, restoring board to the state it was in
+        before the move.
+
+        Raises:
+            ValueError: No moves have been made.
+        """
+        if len(self.history) == 0:
+            raise ValueError("No moves to undo")
+
+        record = self.history.pop()
+        piece = record['piece']
+        start_pos, end_pos = record['start_pos'], record['end_pos']
+        captured_piece = record['captured_piece']
+
+        # Move piece back, returning captured piece to its place in list of pieces
+        piece.set_pos(start_pos)
+        self.grid[start_pos[ROW]][start_pos[COL]] = piece
+        self.grid[end_pos[ROW]][end_pos[COL]] = captured_piece
+        if captured_piece is not None:
+            self.pieces[captured_piece.get_colour()].insert(record['captured_index'], captured_piece)
+
+        if piece.get_type() == PAWN:
+            piece.set_has_moved(record['has_moved'])
+
+        self.turn -= 1
+        self.check = record['check']
+        self.winner = record['winner']
+        self.previously_moved_piece = record['previously_moved_piece']
+        self.position_id = record['position_id']
+        self.hash = self.hash_history.pop()
+        self.halfmove_clock = record['halfmove_clock']
+        self.evaluation.restore(record['evaluation'])
+
+    def evaluate(self):
+        """
+        Returns material and piece-square score of the current position, which is kept up to date
+        as pieces move so costs O(1).
+
+        Returns:
+            int: Score in centipawns from the point of view of the player whose turn it is.
+        """
+        return self.evaluation.score(self.whose_turn())
+
     def get_piece(self, row, col):
         """
         Returns the piece in grid at position (row, col).
@@ -960,6 +1162,48 @@ class Board:
 
         return True
     
+    def legal_moves(self):
+        """
+        Finds every move that the player whose turn it is can make.
+
+        Returns:
+            List: List of moves (start_pos, end_pos), where each pos is of form (row, col).
+        """
+        player = self.whose_turn()
+        opponent = BLACK if player == WHITE else WHITE
+        opposing_king = self.king[opponent]
+        moves = []
+        for piece in self.pieces[player]:
+            start_pos = piece.get_pos()
+            for end_pos in piece.available_moves(self):
+                if self.grid[end_pos[ROW]][end_pos[COL]] is not opposing_king:
+                    moves.append((start_pos, end_pos))
+        return moves
+
+    def legal_moves_packed(self):
+        """
+        Finds every move that the player whose turn it is can make, packed into 16 bits.
+
+        Returns:
+            array: array('H') of moves packed by pack_move, with CAPTURE_FLAG set for captures and
+                    PAWN_FLAG set for Pawn moves.
+        """
+        player = self.whose_turn()
+        opponent = BLACK if player == WHITE else WHITE
+        opposing_king = self.king[opponent]
+        grid = self.grid
+        moves = array('H')
+        for piece in self.pieces[player]:
+            start_row, start_col = piece.get_pos()
+            start = (start_row * BOARD_SIZE + start_col) << 6 | (PAWN_FLAG if piece.type == PAWN else 0)
+            for end_row, end_col in piece.available_moves(self):
+                target_piece = grid[end_row][end_col]
+                if target_piece is None:
+                    moves.append(start | end_row * BOARD_SIZE + end_col)
+                elif target_piece is not opposing_king:
+                    moves.append(start | CAPTURE_FLAG | end_row * BOARD_SIZE + end_col)
+        return moves
+
     def get_checking_pieces_pos(self, colour):
         """
         Returns the positions of all pieces causing check for colour's King
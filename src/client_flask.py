@@ -1,9 +1,12 @@
 import requests
+from notation import board_to_fen
 
 class ChessFlaskClient:
 
-    def __init__(self, host, board):
-        player_resp = requests.put(f"{host}/player/new")
+    def __init__(self, host, board, game='default'):
+        # Every request names the game, so several games can be played on one server
+        self.params = {'game': game}
+        player_resp = requests.put(f"{host}/player/new", params=self.params)
         if player_resp.status_code == 404:
             raise ValueError("Server not found")
         elif player_resp.status_code != 200:
@@ -16,24 +19,40 @@ class ChessFlaskClient:
         self.board = board
     
     def publish_move(self, start_pos, end_pos):
-        requests.post(f"{self.address}/move", json= {
+        move_resp = requests.post(f"{self.address}/move", params=self.params, json= {
             'player': self.player,
             'move': [start_pos, end_pos]
         })
+        if move_resp.status_code == 409:
+            # Server rejected move, which has already been played on board, so board is brought
+            # back in line with server's board
+            self.resync(move_resp.json()['state'])
+
+    def resync(self, state=None):
+        if state is None:
+            state = requests.get(f"{self.address}/game/state", params=self.params).json()
+        # Usually only the rejected move needs undoing, otherwise game is replayed from the start
+        if self.board.turn == state['ply'] + 1:
+            self.board.undo_move()
+        if self.board.turn != state['ply'] or board_to_fen(self.board) != state['fen']:
+            while self.board.history:
+                self.board.undo_move()
+            for start_pos, end_pos in state['moves']:
+                self.board.move_piece(*start_pos, *end_pos)
     
     def publish_quit(self):
-        requests.delete(f"{self.address}/game/reset")
+        requests.delete(f"{self.address}/game/reset", params=self.params)
 
     def is_active(self):
         if self.board.whose_turn() != self.player:
             # To improve performance only updates when is other persons turn
-            self.game_active = requests.get(f"{self.address}/game/active").json()
+            self.game_active = requests.get(f"{self.address}/game/active", params=self.params).json()
         if self.game_active:
             self.game_started = True
         return self.game_active
     
     def is_active_force_check(self):
-        self.game_active = requests.get(f"{self.address}/game/active").json()
+        self.game_active = requests.get(f"{self.address}/game/active", params=self.params).json()
         if self.game_active:
             self.game_started = True
         return self.game_active
@@ -41,13 +60,17 @@ class ChessFlaskClient:
     def is_waiting(self):
         waiting = False
         if self.board.whose_turn() != self.player:
-            most_recent_move = requests.get(f"{self.address}/move").json()
+            most_recent_move = requests.get(f"{self.address}/move", params=self.params).json()
             if most_recent_move['player'] == self.player:
                 waiting = True
             else:
                 waiting = False
                 start_pos, end_pos = most_recent_move['move'][0], most_recent_move['move'][1]
-                self.board.move_piece(*start_pos, *end_pos)
+                try:
+                    self.board.move_piece(*start_pos, *end_pos)
+                except ValueError:
+                    # Board is out of step with server's board
+                    self.resync()
         return waiting
     
     def opponent_has_quit(self):
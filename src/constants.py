@@ -0,0 +1,17 @@
+# Constants shared by the game logic in chess and modules it depends on. Kept free of imports so
+# that chess can import those modules at module level, chess re-exports everything defined here
+
+ROW = 0
+COL = 1
+
+BLACK = "Black"
+WHITE = "White"
+
+PAWN = "P"
+KNIGHT = "N"
+BISHOP = "B"
+ROOK = "R"
+QUEEN = "Q"
+KING = "K"
+
+VALUES = {PAWN: 1, KNIGHT: 3, BISHOP: 3, ROOK: 5, QUEEN: 9, KING: 1000}
@@ -0,0 +1,216 @@
+# Static evaluation of positions using material and piece-square tables, tapered between middlegame
+# and endgame by how much material is left on the board. Board keeps an Evaluation up to date as
+# pieces move, so reading the score of a position is O(1).
+
+from constants import WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, VALUES, ROW, COL
+
+# Weight of each piece towards game phase, phase is MAX_PHASE with all pieces on board and 0 once
+# only Kings and Pawns remain
+PHASE_WEIGHTS = {PAWN: 0, KNIGHT: 1, BISHOP: 1, ROOK: 2, QUEEN: 4, KING: 0}
+MAX_PHASE = 24
+
+# Kings are on the board for the whole game, so are not counted as material
+MATERIAL = {piece_type: 0 if piece_type == KING else 100 * value for piece_type, value in VALUES.items()}
+
+# Piece-square tables in centipawns, written from the point of view of the player who owns the piece
+# with the opponent's back row at the top, so the last line of each table is the player's own back row
+MIDDLEGAME_TABLES = {
+    PAWN: [
+        [0, 0, 0, 0, 0, 0, 0, 0],
+        [50, 50, 50, 50, 50, 50, 50, 50],
+        [10, 10, 20, 30, 30, 20, 10, 10],
+        [5, 5, 10, 25, 25, 10, 5, 5],
+        [0, 0, 0, 20, 20, 0, 0, 0],
+        [5, -5, -10, 0, 0, -10, -5, 5],
+        [5, 10, 10, -20, -20, 10, 10, 5],
+        [0, 0, 0, 0, 0, 0, 0, 0]
+    ],
+    KNIGHT: [
+        [-50, -40, -30, -30, -30, -30, -40, -50],
+        [-40, -20, 0, 0, 0, 0, -20, -40],
+        [-30, 0, 10, 15, 15, 10, 0, -30],
+        [-30, 5, 15, 20, 20, 15, 5, -30],
+        [-30, 0, 15, 20, 20, 15, 0, -30],
+        [-30, 5, 10, 15, 15, 10, 5, -30],
+        [-40, -20, 0, 5, 5, 0, -20, -40],
+        [-50, -40, -30, -30, -30, -30, -40, -50]
+    ],
+    BISHOP: [
+        [-20, -10, -10, -10, -10, -10, -10, -20],
+        [-10, 0, 0, 0, 0, 0, 0, -10],
+        [-10, 0, 5, 10, 10, 5, 0, -10],
+        [-10, 5, 5, 10, 10, 5, 5, -10],
+        [-10, 0, 10, 10, 10, 10, 0, -10],
+        [-10, 10, 10, 10, 10, 10, 10, -10],
+        [-10, 5, 0, 0, 0, 0, 5, -10],
+        [-20, -10, -10, -10, -10, -10, -10, -20]
+    ],
+    ROOK: [
+        [0, 0, 0, 0, 0, 0, 0, 0],
+        [5, 10, 10, 10, 10, 10, 10, 5],
+        [-5, 0, 0, 0, 0, 0, 0, -5],
+        [-5, 0, 0, 0, 0, 0, 0, -5],
+        [-5, 0, 0, 0, 0, 0, 0, -5],
+        [-5, 0, 0, 0, 0, 0, 0, -5],
+        [-5, 0, 0, 0, 0, 0, 0, -5],
+        [0, 0, 0, 5, 5, 0, 0, 0]
+    ],
+    QUEEN: [
+        [-20, -10, -10, -5, -5, -10, -10, -20],
+        [-10, 0, 0, 0, 0, 0, 0, -10],
+        [-10, 0, 5, 5, 5, 5, 0, -10],
+        [-5, 0, 5, 5, 5, 5, 0, -5],
+        [0, 0, 5, 5, 5, 5, 0, -5],
+        [-10, 5, 5, 5, 5, 5, 0, -10],
+        [-10, 0, 5, 0, 0, 0, 0, -10],
+        [-20, -10, -10, -5, -5, -10, -10, -20]
+    ],
+    KING: [
+        [-30, -40, -40, -50, -50, -40, -40, -30],
+        [-30, -40, -40, -50, -50, -40, -40, -30],
+        [-30, -40, -40, -50, -50, -40, -40, -30],
+        [-30, -40, -40, -50, -50, -40, -40, -30],
+        [-20, -30, -30, -40, -40, -30, -30, -20],
+        [-10, -20, -20, -20, -20, -20, -20, -10],
+        [20, 20, 0, 0, 0, 0, 20, 20],
+        [20, 30, 10, 0, 0, 10, 30, 20]
+    ]
+}
+
+ENDGAME_TABLES = dict(MIDDLEGAME_TABLES)
+ENDGAME_TABLES[PAWN] = [
+    [0, 0, 0, 0, 0, 0, 0, 0],
+    [80, 80, 80, 80, 80, 80, 80, 80],
+    [50, 50, 50, 50, 50, 50, 50, 50],
+    [30, 30, 30, 30, 30, 30, 30, 30],
+    [20, 20, 20, 20, 20, 20, 20, 20],
+    [10, 10, 10, 10, 10, 10, 10, 10],
+    [10, 10, 10, 10, 10, 10, 10, 10],
+    [0, 0, 0, 0, 0, 0, 0, 0]
+]
+ENDGAME_TABLES[KING] = [
+    [-50, -40, -30, -20, -20, -30, -40, -50],
+    [-30, -20, -10, 0, 0, -10, -20, -30],
+    [-30, -10, 20, 30, 30, 20, -10, -30],
+    [-30, -10, 30, 40, 40, 30, -10, -30],
+    [-30, -10, 30, 40, 40, 30, -10, -30],
+    [-30, -10, 20, 30, 30, 20, -10, -30],
+    [-30, -30, 0, 0, 0, 0, -30, -30],
+    [-50, -30, -30, -30, -30, -30, -30, -50]
+]
+
+
+def build_square_scores():
+    """
+    Combines material and piece-square tables into the (middlegame, endgame) score of every piece
+    on every square of the grid. Scores are from White's point of view, so Black's are negative.
+
+    Returns:
+        Dict: Nested dict indexed by [colour][piece type][row][col] of Tuples (middlegame, endgame).
+    """
+    square_scores = {WHITE: {}, BLACK: {}}
+    for piece_type in MIDDLEGAME_TABLES:
+        for colour in [WHITE, BLACK]:
+            sign = 1 if colour == WHITE else -1
+            grid = []
+            for row in range(8):
+                # White's back row is row 0 and Black's is row 7, which is the last line of each table
+                table_row = 7 - row if colour == WHITE else row
+                grid.append([(sign * (MATERIAL[piece_type] + MIDDLEGAME_TABLES[piece_type][table_row][col]),
+                              sign * (MATERIAL[piece_type] + ENDGAME_TABLES[piece_type][table_row][col]))
+                             for col in range(8)])
+            square_scores[colour][piece_type] = grid
+    return square_scores
+
+
+SQUARE_SCORES = build_square_scores()
+
+
+def taper(middlegame, endgame, phase):
+    """
+    Interpolates between middlegame and endgame scores by game phase.
+
+    Args:
+        middlegame (int): Middlegame score.
+        endgame (int): Endgame score.
+        phase (int): Game phase, capped at MAX_PHASE.
+
+    Returns:
+        int: Tapered score.
+    """
+    phase = min(phase, MAX_PHASE)
+    return (middlegame * phase + endgame * (MAX_PHASE - phase)) // MAX_PHASE
+
+
+def evaluate(board):
+    """
+    Evaluates position from scratch by scanning every piece on board. Gives the same result as
+    board.evaluate(), which is updated incrementally instead.
+
+    Args:
+        board (Board): Instance of Board class that contains all information about the current
+                        state of game.
+
+    Returns:
+        int: Score in centipawns from the point of view of the player whose turn it is.
+    """
+    middlegame = endgame = phase = 0
+    for colour in [WHITE, BLACK]:
+        for piece in board.get_pieces(colour):
+            pos = piece.get_pos()
+            score = SQUARE_SCORES[colour][piece.get_type()][pos[ROW]][pos[COL]]
+            middlegame += score[0]
+            endgame += score[1]
+            phase += PHASE_WEIGHTS[piece.get_type()]
+
+    score = taper(middlegame, endgame, phase)
+    return score if board.whose_turn() == WHITE else -score
+
+
+class Evaluation:
+    """
+    Material and piece-square score of a Board, updated incrementally as pieces move or are
+    captured. Scores are kept from White's point of view.
+    """
+
+    def __init__(self, pieces):
+        self.middlegame = 0
+        self.endgame = 0
+        self.phase = 0
+        for piece in pieces:
+            self.add_piece(piece, piece.get_pos())
+
+    def add_piece(self, piece, pos):
+        score = SQUARE_SCORES[piece.get_colour()][piece.get_type()][pos[ROW]][pos[COL]]
+        self.middlegame += score[0]
+        self.endgame += score[1]
+        self.phase += PHASE_WEIGHTS[piece.get_type()]
+
+    def remove_piece(self, piece, pos):
+        score = SQUARE_SCORES[piece.get_colour()][piece.get_type()][pos[ROW]][pos[COL]]
+        self.middlegame -= score[0]
+        self.endgame -= score[1]
+        self.phase -= PHASE_WEIGHTS[piece.get_type()]
+
+    def move_piece(self, piece, start_pos, end_pos):
+        scores = SQUARE_SCORES[piece.get_colour()][piece.get_type()]
+        start_score = scores[start_pos[ROW]][start_pos[COL]]
+        end_score = scores[end_pos[ROW]][end_pos[COL]]
+        self.middlegame += end_score[0] - start_score[0]
+        self.endgame += end_score[1] - start_score[1]
+
+    def save(self):
+        """
+        Returns state of evaluation, so it can be restored when a move is undone.
+        """
+        return (self.middlegame, self.endgame, self.phase)
+
+    def restore(self, state):
+        self.middlegame, self.endgame, self.phase = state
+
+    def score(self, colour):
+        """
+        Returns tapered score in centipawns from the point of view of colour.
+        """
+        score = taper(self.middlegame, self.endgame, self.phase)
+        return score if colour == WHITE else -score
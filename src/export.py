@@ -0,0 +1,327 @@
+# Training data export: replays game archives, samples positions and writes them with their labels to
+# sharded .npy files, which training readers memory map for zero copy random access (see Dataset).
+# Encoding positions and writing them to disk overlap, as full buffers are written by a separate
+# thread while the next buffer is filled.
+# Requires NumPy: pip3 install numpy
+# Export from PGN, move-list or tournament JSONL archives:
+#   python3 src/export.py games.pgn [more.pgn ...] -o dataset [--sample-rate 0.25] [--skip-plies 8]
+
+import argparse
+import json
+import os
+import queue
+import random
+import struct
+import threading
+import numpy as np
+from chess import Board, WHITE, BLACK, KING, STALEMATE, DRAW, VALUES, pack_move
+from batch import PLANES, board_bitboards
+from notation import RESULTS, parse_move, read_games_with_results
+
+# Each sampled position is one fixed width record:
+#   planes   - bitboard of each piece type and colour in batch.PLANES order (see batch.to_planes)
+#   move     - move played from position, packed as start * 64 + end (see chess.unpack_move)
+#   result   - result of game for White: 1 win, 0 draw, -1 loss
+#   turn     - player to move, 0 for White and 1 for Black
+#   material - White's material minus Black's, in VALUES units
+#   ply      - number of moves played before position
+#   game     - index of game in export, so datasets can be split by game
+RECORD_DTYPE = np.dtype([('planes', '<u8', (len(PLANES),)), ('move', '<u2'), ('result', 'i1'), ('turn', 'u1'),
+                         ('material', '<i2'), ('ply', '<u2'), ('game', '<u4')])
+
+RESULT_LABELS = {'1-0': 1, '1/2-1/2': 0, '0-1': -1}
+
+# Default number of records in each shard file, and in each buffer handed to the writer thread
+SHARD_SIZE = 1 << 20
+CHUNK_SIZE = 1 << 14
+
+INDEX_FILE = 'index.json'
+NPY_MAGIC = b'\x93NUMPY\x01\x00'
+
+
+def read_archive(path):
+    """
+    Reads games from a PGN or move-list archive, or a JSONL file written by tournament.py.
+
+    Yields:
+        Tuple: Move texts of game, and its result (one of RESULTS) or None if it is not given.
+    """
+    with open(path) as file:
+        if path.endswith('.jsonl'):
+            for line in file:
+                if line.strip():
+                    game = json.loads(line)
+                    yield game['moves'], game.get('result')
+        else:
+            yield from read_games_with_results(file)
+
+
+def material(board):
+    return sum((VALUES[piece.get_type()] if colour == WHITE else -VALUES[piece.get_type()])
+               for colour in [WHITE, BLACK] for piece in board.pieces[colour] if piece.get_type() != KING)
+
+
+def game_positions(moves, result, rng, sample_rate=1.0, skip_plies=0):
+    """
+    Replays a game, sampling the positions moves were played from. A game is only followed up to
+    the first move Board can't play (e.g castling).
+
+    Args:
+        moves (List): Move texts of game in UCI notation or SAN.
+        result (string): One of RESULTS, or None to take result from a game that ends in checkmate
+                            or stalemate.
+        rng (random.Random): Chooses sampled positions.
+        sample_rate (float, optional): Chance of each position being sampled.
+        skip_plies (int, optional): Positions before this many moves are never sampled.
+
+    Returns:
+        Tuple: Result of game (one of RESULTS, or None if not known), and (bitboards, move, result,
+                turn, material, ply) of each sampled position, an empty List if result is not known.
+    """
+    board = Board()
+    sampled = []
+    for ply, text in enumerate(moves):
+        try:
+            move = parse_move(board, text)
+        except ValueError:
+            break
+        if ply >= skip_plies and rng.random() < sample_rate:
+            sampled.append([board_bitboards(board), pack_move(move), None,
+                            0 if board.whose_turn() == WHITE else 1, material(board), ply])
+        board.move_piece(*move[0], *move[1])
+        if board.winner is not None:
+            break
+
+    if result is None and board.winner is not None:
+        result = '1/2-1/2' if board.winner in [STALEMATE, DRAW] else '1-0' if board.winner == WHITE else '0-1'
+    if result not in RESULTS:
+        return None, []
+    for position in sampled:
+        position[2] = RESULT_LABELS[result]
+    return result, [tuple(position) for position in sampled]
+
+
+def header_length(dtype, count):
+    # Version 1.0 .npy headers are padded so data starts at a multiple of 64 bytes
+    return (len(NPY_MAGIC) + 2 + len(npy_header_text(dtype, count)) + 1 + 63) // 64 * 64
+
+
+def npy_header_text(dtype, count):
+    return repr({'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': False, 'shape': (count,)})
+
+
+def write_npy_header(file, dtype, count, length):
+    """
+    Writes .npy header of a 1 dimensional array padded to length bytes, so the header of a shard
+    can be rewritten with its final count once its records have been written.
+    """
+    text = npy_header_text(dtype, count)
+    text = text.ljust(length - len(NPY_MAGIC) - 2 - 1) + '\n'
+    file.write(NPY_MAGIC + struct.pack('<H', len(text)) + text.encode('latin1'))
+
+
+class ShardWriter:
+    """
+    Writes records to shard files in directory from a background thread. Records are added to one
+    of two buffers, and a full buffer is handed to the writer thread while the other is filled, so
+    append only waits when disk is slower than encoding.
+    """
+
+    def __init__(self, directory, shard_size=SHARD_SIZE, chunk_size=CHUNK_SIZE):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.shard_size = shard_size
+        self.header_length = header_length(RECORD_DTYPE, shard_size)
+        self.shards = []
+        self.games = 0
+
+        self.free = queue.Queue()
+        self.full = queue.Queue()
+        for _ in range(2):
+            self.free.put(np.empty(chunk_size, dtype=RECORD_DTYPE))
+        self.buffer = self.free.get()
+        self.filled = 0
+
+        # Shard currently being written by writer thread, and error raised by writer thread
+        self.file = None
+        self.count = 0
+        self.error = None
+        self.thread = threading.Thread(target=self.write_chunks, daemon=True)
+        self.thread.start()
+
+    def append(self, record):
+        """
+        Args:
+            record (Tuple): Values of RECORD_DTYPE fields.
+        """
+        self.buffer[self.filled] = record
+        self.filled += 1
+        if self.filled == len(self.buffer):
+            self.flush()
+
+    def flush(self):
+        if self.error is not None:
+            raise self.error
+        if self.filled > 0:
+            self.full.put((self.buffer, self.filled))
+            self.buffer = self.free.get()
+            self.filled = 0
+
+    def write_chunks(self):
+        while True:
+            item = self.full.get()
+            if item is None:
+                return
+            buffer, filled = item
+            try:
+                # Nothing more is written once writing has failed, as shard being written is incomplete
+                if self.error is None:
+                    self.write_chunk(buffer, filled)
+            except Exception as error:
+                self.error = error
+            finally:
+                # Buffer is always returned, otherwise flush and close would wait for it forever
+                self.free.put(buffer)
+
+    def write_chunk(self, buffer, filled):
+        start = 0
+        while start < filled:
+            if self.file is None:
+                path = os.path.join(self.directory, f"shard-{len(self.shards):05d}.npy")
+                self.file = open(path, 'wb')
+                write_npy_header(self.file, RECORD_DTYPE, 0, self.header_length)
+                self.count = 0
+            end = min(filled, start + self.shard_size - self.count)
+            buffer[start:end].tofile(self.file)
+            self.count += end - start
+            start = end
+            if self.count == self.shard_size:
+                self.finish_shard()
+
+    def finish_shard(self):
+        self.file.seek(0)
+        write_npy_header(self.file, RECORD_DTYPE, self.count, self.header_length)
+        self.file.close()
+        self.shards.append({'file': os.path.basename(self.file.name), 'count': self.count})
+        self.file = None
+
+    def close(self):
+        """
+        Writes remaining records and the index of shards.
+
+        Returns:
+            int: Number of records written.
+        """
+        self.flush()
+        self.full.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+        if self.file is not None:
+            self.finish_shard()
+
+        index = {'dtype': np.lib.format.dtype_to_descr(RECORD_DTYPE), 'planes': [list(plane) for plane in PLANES],
+                 'count': sum(shard['count'] for shard in self.shards), 'games': self.games, 'shards': self.shards}
+        # Written to temporary file first, so readers never load a partially written index
+        temporary_path = os.path.join(self.directory, INDEX_FILE + '.tmp')
+        with open(temporary_path, 'w') as file:
+            json.dump(index, file, indent=1)
+        os.replace(temporary_path, os.path.join(self.directory, INDEX_FILE))
+        return index['count']
+
+
+def export(games, directory, sample_rate=1.0, skip_plies=0, seed=0, shard_size=SHARD_SIZE):
+    """
+    Samples positions of games and writes them to a dataset in directory.
+
+    Args:
+        games (Iterable): (moves, result) of each game, as yielded by read_archive.
+        directory (string): Directory of dataset, created if it doesn't exist.
+
+    Returns:
+        Tuple: Number of positions written, games used and games skipped as their result is unknown.
+    """
+    rng = random.Random(seed)
+    writer = ShardWriter(directory, shard_size)
+    skipped = 0
+    for moves, result in games:
+        result, positions = game_positions(moves, result, rng, sample_rate, skip_plies)
+        if result is None:
+            skipped += 1
+            continue
+        for position in positions:
+            writer.append(position + (writer.games,))
+        writer.games += 1
+    return writer.close(), writer.games, skipped
+
+
+class Dataset:
+    """
+    Read only view of an exported dataset. Shards are memory mapped, so records are read from disk
+    as they are accessed and nothing is loaded up front, whatever the size of the dataset.
+    """
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, INDEX_FILE)) as file:
+            self.index = json.load(file)
+        self.shards = [np.load(os.path.join(directory, shard['file']), mmap_mode='r')
+                       for shard in self.index['shards'] if shard['count'] > 0]
+        # Index of first record of each shard, and one past the last record
+        self.offsets = np.cumsum([0] + [len(shard) for shard in self.shards])
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def __getitem__(self, index):
+        """
+        Returns:
+            np.void: Record at index, a view into the mapped shard.
+        """
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f"Record {index} out of range")
+        shard = int(np.searchsorted(self.offsets, index, side='right')) - 1
+        return self.shards[shard][index - self.offsets[shard]]
+
+    def batch(self, indices):
+        """
+        Gathers records at indices, e.g a random minibatch.
+
+        Args:
+            indices (np.ndarray): Indices of records.
+
+        Returns:
+            np.ndarray: Records in order of indices, of RECORD_DTYPE.
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        records = np.empty(len(indices), dtype=RECORD_DTYPE)
+        shards = np.searchsorted(self.offsets, indices, side='right') - 1
+        for shard in np.unique(shards):
+            selected = shards == shard
+            records[selected] = self.shards[shard][indices[selected] - self.offsets[shard]]
+        return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exports positions of games as training data")
+    parser.add_argument('archives', nargs='+', help="PGN, move-list or tournament JSONL archives")
+    parser.add_argument('-o', '--output', default='dataset')
+    parser.add_argument('--sample-rate', type=float, default=1.0)
+    parser.add_argument('--skip-plies', type=int, default=0)
+    parser.add_argument('--shard-size', type=int, default=SHARD_SIZE)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    def games():
+        for archive in args.archives:
+            yield from read_archive(archive)
+
+    positions, games_used, skipped = export(games(), args.output, args.sample_rate, args.skip_plies, args.seed,
+                                            args.shard_size)
+    print(f"Wrote {positions} positions from {games_used} games to {args.output} "
+          f"({skipped} games skipped with no result)")
+
+
+if __name__ == '__main__':
+    main()
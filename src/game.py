@@ -1,28 +1,16 @@
 import os
 import sys
 os.environ['SDL_AUDIODRIVER'] = 'dsp'
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
 import pygame
 import pygame.freetype
-from chess import KING, QUEEN, BISHOP, ROOK, KNIGHT, PAWN, BLACK, STALEMATE, WHITE, Board, ROW, COL, in_bounds
+from chess import KING, QUEEN, BISHOP, ROOK, KNIGHT, PAWN, BLACK, STALEMATE, DRAW, WHITE, Board, ROW, COL, in_bounds
 
 MODE_DEFAULT = "--default"
 MODE_FLASK = "--flask"
 MODE_MQTT = "--mqtt"
 MQTT_HIGH_LATENCY = "--highlatency"
-
-if len(sys.argv) == 1 or (len(sys.argv) == 2 and sys.argv[1] == MODE_DEFAULT):
-    MODE = MODE_DEFAULT
-elif len(sys.argv) == 3 and sys.argv[1] == MODE_FLASK:
-    MODE = MODE_FLASK
-elif len(sys.argv) >= 3 and sys.argv[1] == MODE_MQTT:
-    MODE = MODE_MQTT
-else:
-    raise ValueError("Invalid command line args")
-
-if MODE == MODE_MQTT:
-    from client_mqtt import ChessMqttClient
-elif MODE == MODE_FLASK:
-    from client_flask import ChessFlaskClient
+FLASK_DEFAULT_GAME = "default"
 
 # Colours (r, g, b)
 BLACK_TEXT = (0, 0, 0)
@@ -31,19 +19,25 @@ WHITE_COLOUR = (255, 255, 224)
 MOVE_COLOUR = (0, 0, 150)
 CHECK_COLOUR = (150, 0, 0)
 PREVIOUS_MOVE_COLOUR = (149, 0, 255)
+HINT_COLOUR = (0, 150, 0)
+THREAT_COLOUR = (255, 140, 0)
+EVALUATION_WHITE = (255, 255, 255)
+EVALUATION_BLACK = (60, 60, 60)
 
-# GUI Size Constants
-BOARD_SIZE = 1000 # Must be divisible by 8 to display correctly, as needs to be evenly divided into 8 x 8 grid
-SQUARE_SIZE = BOARD_SIZE // 8
-DISPLAY_DIMENSIONS = (BOARD_SIZE, BOARD_SIZE + SQUARE_SIZE)
-FONT_SIZE = SQUARE_SIZE // 2
+BACKGROUND_COLOUR = (255, 255, 255)
+TRANSPARENT = (0, 0, 0, 0)
+
+# GUI Size Constants, window is 8 squares wide and 9 squares high (board plus status bar)
+DEFAULT_SQUARE_SIZE = 125
+MIN_SQUARE_SIZE = 16
+SCREEN_FILL = 0.9 # Fraction of screen height initial window is allowed to take up
+EVALUATION_RANGE = 10 # Advantage in pawns at which evaluation bar is full
 
 SPRITES_FILE = "src/img/sprites.png"
+BOOK_FILE = "book.bin" # Opening book used for hints if present, built with src/book.py
+TABLEBASE_DIRECTORY = "tablebases" # Endgame tablebases used for hints if present, built with src/tablebase.py
 FPS = 7
 
-# initialize all imported pygame modules
-pygame.init()
-
 SPRITES_CORDS = {
     WHITE : {
         KING: {'location': (21, 23), 'dimensions': (170, 170)},
@@ -72,6 +66,30 @@ def resource_path(relative_path):
         base_path = os.path.abspath(".")
     return os.path.join(base_path, relative_path)
 
+def parse_args(args):
+    """
+    Parses command line args (excluding program name) into the mode game should be played in.
+
+    Args:
+        args (List): Command line args, e.g ["--flask", "http://127.0.0.1:5000", "game1"].
+
+    Raises:
+        ValueError: Args don't match any mode.
+
+    Returns:
+        Tuple: (mode, host, qos, game), host is None in default mode, qos is only used in MQTT mode
+                and game (name of game on server) is only used in Flask mode.
+    """
+    if len(args) == 0 or (len(args) == 1 and args[0] == MODE_DEFAULT):
+        return MODE_DEFAULT, None, 0, None
+    elif len(args) in [2, 3] and args[0] == MODE_FLASK:
+        return MODE_FLASK, args[1], 0, args[2] if len(args) == 3 else FLASK_DEFAULT_GAME
+    elif len(args) >= 2 and args[0] == MODE_MQTT:
+        qos = 2 if len(args) == 3 and args[2] == MQTT_HIGH_LATENCY else 0
+        return MODE_MQTT, args[1], qos, None
+    else:
+        raise ValueError("Invalid command line args")
+
 class Quit(Exception):
     pass
 
@@ -79,13 +97,17 @@ class SpriteSheet(object):
     """ Class used to grab images out of a sprite sheet. """
 
     def __init__(self):
-        # Load the sprite sheet.
-        self.sprite_sheet = pygame.image.load(resource_path(SPRITES_FILE))
+        # Load the sprite sheet, must be called after display mode has been set for convert_alpha
+        self.sprite_sheet = pygame.image.load(resource_path(SPRITES_FILE)).convert_alpha()
+
+        # Piece sprites cut and scaled for current square size, rebuilt by resize()
+        self.square_size = None
+        self.sprites = {WHITE: {}, BLACK: {}}
 
-    def get_image(self, x, y, width, height):
+    def get_image(self, x, y, width, height, size):
         """ Grab a single image out of a larger spritesheet
-            Pass in the x, y location of the sprite
-            and the width and height of the sprite. """
+            Pass in the x, y location of the sprite, the width and
+            height of the sprite and the size it should be scaled to. """
         # Create a new blank image
         image = pygame.Surface([width, height], pygame.SRCALPHA)
         
@@ -93,89 +115,236 @@ class SpriteSheet(object):
         image.blit(self.sprite_sheet, (0, 0), (x, y, width, height))
         
         # Scale image to size of square
-        image = pygame.transform.smoothscale(image, (SQUARE_SIZE, SQUARE_SIZE))
+        image = pygame.transform.smoothscale(image, (size, size))
         
-        # Return the image
-        return image
+        # Return the image, converted to display format so blits don't convert every frame
+        return image.convert_alpha()
+
+    def resize(self, square_size):
+        """ Cut and scale every piece sprite to fit a square of square_size. Sprites
+            are only rebuilt if square_size differs from the cached size. """
+        if square_size == self.square_size:
+            return
+
+        for colour, piece_sprites in SPRITES_CORDS.items():
+            for piece_type, sprite in piece_sprites.items():
+                self.sprites[colour][piece_type] = self.get_image(*sprite['location'], *sprite['dimensions'], square_size)
+        self.square_size = square_size
+
+    def get_sprite(self, colour, piece_type):
+        """ Returns the cached, pre-scaled sprite for a piece. """
+        return self.sprites[colour][piece_type]
 
 class Gui():
 
     def __init__(self):
-        self.win = pygame.display.set_mode(DISPLAY_DIMENSIONS)
+        # Only initialise the pygame modules that are used, rather than all of them with pygame.init()
+        pygame.display.init()
+        pygame.freetype.init()
+
+        # Shrink initial window to fit on small screens
+        screen_height = pygame.display.Info().current_h
+        square_size = DEFAULT_SQUARE_SIZE
+        if screen_height > 0:
+            square_size = max(min(square_size, int(screen_height * SCREEN_FILL) // 9), MIN_SQUARE_SIZE)
+
+        self.win = pygame.display.set_mode((square_size * 8, square_size * 9), pygame.RESIZABLE)
         pygame.display.set_caption("Chess")
         self.sprites = SpriteSheet()
-        self.font = pygame.freetype.SysFont('Sans', FONT_SIZE)
-
-    def drawBoard(self, board, moves=[]):
-        # Clear display
-        self.win.fill((255, 255, 255))
-        
-        # Create Checkered Grid
+        self.pending_size = None
+        self.resize(*self.win.get_size())
+
+    def resize(self, width, height):
+        """ Lays out board for a window of width x height and rebuilds the cached layers. """
+        self.win = pygame.display.get_surface()
+        self.square_size = max(min(width // 8, height // 9), MIN_SQUARE_SIZE)
+        self.board_size = self.square_size * 8
+        self.origin = (max((width - self.board_size) // 2, 0), max((height - self.board_size - self.square_size) // 2, 0))
+        self.sprites.resize(self.square_size)
+        self.font = pygame.freetype.SysFont('Sans', self.square_size // 2)
+
+        # Checkered grid, only depends on square size so is drawn once per resize
+        self.background = pygame.Surface((self.board_size, self.board_size)).convert()
         for col in range(8):
             for row in range(8):
-                if (row, col) in moves:
-                    colour = MOVE_COLOUR
-                elif (row, col) in board.get_checking_pieces_pos(board.whose_turn()):
-                    colour = CHECK_COLOUR
-                elif (row, col) == board.get_previous_move_pos():
-                    colour = PREVIOUS_MOVE_COLOUR
-                elif (col + row) % 2 == 0:
-                    colour = BLACK_COLOUR
-                else:
-                    colour = WHITE_COLOUR
-                pygame.draw.rect(self.win, colour, (col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
-        
-        # Diplay Pieces
-        for piece in board.get_pieces(WHITE) + board.get_pieces(BLACK):
-            colour = piece.get_colour()
-            piece_type = piece.get_type()
-            pos = piece.get_pos()
-            row, col = pos[ROW], pos[COL]
-            self.win.blit(self.sprites.get_image(*SPRITES_CORDS[colour][piece_type]['location'], *SPRITES_CORDS[colour][piece_type]['dimensions']), (col * SQUARE_SIZE, row * SQUARE_SIZE))
-        
-        # Update display
-        pygame.display.update()
+                colour = BLACK_COLOUR if (col + row) % 2 == 0 else WHITE_COLOUR
+                pygame.draw.rect(self.background, colour, self.square_rect(row, col))
+
+        # Highlighted squares and pieces, squares of these are redrawn as board changes
+        self.highlights = pygame.Surface((self.board_size, self.board_size), pygame.SRCALPHA).convert_alpha()
+        self.highlights.fill(TRANSPARENT)
+        self.pieces = pygame.Surface((self.board_size, self.board_size), pygame.SRCALPHA).convert_alpha()
+        self.pieces.fill(TRANSPARENT)
+
+        # Contents of each square of layers as last drawn
+        self.drawn_highlights = {}
+        self.drawn_pieces = {}
+        self.invalidate()
+
+    def request_resize(self, width, height):
+        """ Records new window size, layers are rebuilt once on next draw however many resizes occur. """
+        self.pending_size = (width, height)
+
+    def invalidate(self):
+        """ Forget what has been drawn to window, so that next draw repaints the whole window. """
+        self.repaint_all = True
+        self.drawn_text = None
+
+    def square_rect(self, row, col):
+        """ Returns rect of square (row, col) relative to top left of board. """
+        return pygame.Rect(col * self.square_size, row * self.square_size, self.square_size, self.square_size)
+
+    def pos_to_square(self, pos):
+        """ Converts pixel position in window to (row, col) of square, which may be out of bounds. """
+        return ((pos[1] - self.origin[1]) // self.square_size, (pos[0] - self.origin[0]) // self.square_size)
+
+    def drawBoard(self, board, moves=[], hints=[], threats=[]):
+        if self.pending_size is not None:
+            self.resize(*self.pending_size)
+            self.pending_size = None
+
+        # Work out what should be in each layer for squares that aren't empty
+        highlights = {}
+        previous_move_pos = board.get_previous_move_pos()
+        if previous_move_pos is not None:
+            highlights[previous_move_pos] = PREVIOUS_MOVE_COLOUR
+        for pos in threats:
+            highlights[pos] = THREAT_COLOUR
+        for pos in hints:
+            highlights[pos] = HINT_COLOUR
+        for pos in board.get_checking_pieces_pos(board.whose_turn()):
+            highlights[pos] = CHECK_COLOUR
+        for pos in moves:
+            highlights[pos] = MOVE_COLOUR
+        pieces = {piece.get_pos(): (piece.get_colour(), piece.get_type()) for piece in board.get_pieces(WHITE) + board.get_pieces(BLACK)}
+
+        # Redraw only squares of layers whose contents have changed
+        dirty_squares = set()
+        for pos in set(highlights) | set(self.drawn_highlights):
+            colour = highlights.get(pos)
+            if self.drawn_highlights.get(pos) != colour:
+                self.highlights.fill(TRANSPARENT if colour is None else colour, self.square_rect(*pos))
+                dirty_squares.add(pos)
+        for pos in set(pieces) | set(self.drawn_pieces):
+            sprite = pieces.get(pos)
+            if self.drawn_pieces.get(pos) != sprite:
+                square_rect = self.square_rect(*pos)
+                self.pieces.fill(TRANSPARENT, square_rect)
+                if sprite is not None:
+                    self.pieces.blit(self.sprites.get_sprite(*sprite), square_rect)
+                dirty_squares.add(pos)
+        self.drawn_highlights = highlights
+        self.drawn_pieces = pieces
+
+        # Composite changed squares of layers onto window
+        if self.repaint_all:
+            self.win.fill(BACKGROUND_COLOUR)
+            dirty_rects = [self.win.get_rect()]
+            squares_rects = [pygame.Rect(0, 0, self.board_size, self.board_size)]
+            self.repaint_all = False
+        else:
+            squares_rects = [self.square_rect(*pos) for pos in dirty_squares]
+            dirty_rects = [square_rect.move(self.origin) for square_rect in squares_rects]
+
+        for square_rect in squares_rects:
+            window_pos = square_rect.move(self.origin).topleft
+            self.win.blit(self.background, window_pos, square_rect)
+            self.win.blit(self.highlights, window_pos, square_rect)
+            self.win.blit(self.pieces, window_pos, square_rect)
+
+        # Update changed squares of display
+        if dirty_rects:
+            pygame.display.update(dirty_rects)
         
-    def drawText(self, text_str):
+    def drawText(self, text_str, evaluation=None):
+        if (text_str, evaluation) == self.drawn_text:
+            return
+
+        # Clear status bar below board
+        status_rect = pygame.Rect(0, self.origin[1] + self.board_size, self.win.get_width(), self.square_size)
+        self.win.fill(BACKGROUND_COLOUR, status_rect)
+
+        # Evaluation bar along top of status bar, White's share grows with White's advantage
+        if evaluation is not None:
+            bar_rect = pygame.Rect(self.origin[0], status_rect.top, self.board_size, max(self.square_size // 8, 1))
+            advantage = max(min(evaluation / EVALUATION_RANGE, 1), -1)
+            white_width = int(bar_rect.width * (1 + advantage) / 2)
+            self.win.fill(EVALUATION_BLACK, bar_rect)
+            self.win.fill(EVALUATION_WHITE, (bar_rect.left, bar_rect.top, white_width, bar_rect.height))
+
         text_rect = self.font.get_rect(text_str)
-        text_rect.center = (self.win.get_rect().midbottom[0], self.win.get_rect().midbottom[1] - text_rect.height)
+        text_rect.center = status_rect.center
         self.font.render_to(self.win, text_rect.topleft, text_str, BLACK_TEXT)
+        self.drawn_text = (text_str, evaluation)
 
-        # Update display
-        pygame.display.update()
+        # Update status bar of display
+        pygame.display.update(status_rect)
 
 class Game():
 
-    def __init__(self):
+    def __init__(self, mode=MODE_DEFAULT, host=None, qos=0, game=None):
         self.gui = Gui()
         self.board = Board()
         self.clock = pygame.time.Clock()
         self.server_config = None
+        self.mode = mode
         self.mqtt = None
         self.flask = None
 
-        if MODE == MODE_FLASK:
-            self.flask = ChessFlaskClient(sys.argv[2], self.board)
-        elif MODE == MODE_MQTT:
-            qos = 0
-            if len(sys.argv) == 4 and sys.argv[3] == MQTT_HIGH_LATENCY:
-                qos = 2
-            self.mqtt = ChessMqttClient(sys.argv[2], self.board, qos)
+        # Analysis of current position is done on worker thread, results arrive as ANALYSIS_EVENTs.
+        # Search, book and tablebase are imported here rather than with game, and book and tablebase
+        # only if their files exist
+        from analysis import AnalysisService
+        self.book = None
+        book_path = resource_path(BOOK_FILE)
+        if os.path.exists(book_path):
+            from book import OpeningBook
+            self.book = OpeningBook(book_path)
+        self.tablebase = None
+        tablebase_path = resource_path(TABLEBASE_DIRECTORY)
+        if os.path.isdir(tablebase_path):
+            from tablebase import Tablebase
+            self.tablebase = Tablebase(tablebase_path)
+        self.analysis = AnalysisService(book=self.book, tablebase=self.tablebase)
+        self.analysis.start()
+        self.analysis_result = None
+        self.analysed_hash = None
+        self.show_hints = False
+
+        # Network clients are imported here so their dependencies are only loaded when needed
+        if self.mode == MODE_FLASK:
+            from client_flask import ChessFlaskClient
+            self.flask = ChessFlaskClient(host, self.board, game)
+        elif self.mode == MODE_MQTT:
+            from client_mqtt import ChessMqttClient
+            self.mqtt = ChessMqttClient(host, self.board, qos)
             self.mqtt.start()
         else:
             self.server_config = None
 
 
     def displayMove(self, moves):
-        self.gui.drawBoard(self.board, moves=moves)
+        result = self.current_analysis()
+        hints, threats, evaluation, book = [], [], None, False
+        if result is not None:
+            evaluation = result['evaluation']
+            if self.show_hints:
+                hints = [] if result['best_move'] is None else list(result['best_move'])
+                threats = result['threats']
+                book = result['book']
+        self.gui.drawBoard(self.board, moves=moves, hints=hints, threats=threats)
 
         if self.board.winner is None:
             text_str = f"Player {self.board.whose_turn()}"
+            if book:
+                text_str += " (book move)"
         elif self.board.winner == STALEMATE:
             text_str = "Stalemate!!!"
+        elif self.board.winner == DRAW:
+            text_str = f"Draw by {self.board.draw_claim().lower()}"
         else:
             text_str = f"Player {self.board.winner} has won!"
-        self.gui.drawText(text_str)
+        self.gui.drawText(text_str, evaluation=evaluation)
     
     def displayWaiting(self):
         self.gui.drawBoard(self.board)
@@ -187,28 +356,62 @@ class Game():
     
     def is_active(self):
         active = True
-        if MODE == MODE_FLASK:
+        if self.mode == MODE_FLASK:
             active = self.flask.is_active()
-        elif MODE == MODE_MQTT:
+        elif self.mode == MODE_MQTT:
             active = self.mqtt.is_active()
         
         return active
     
     def is_waiting(self):
         waiting = False
-        if MODE == MODE_FLASK:
+        if self.mode == MODE_FLASK:
             waiting = self.flask.is_waiting()
-        if MODE == MODE_MQTT:
+        if self.mode == MODE_MQTT:
             waiting = self.mqtt.is_waiting()
 
         return waiting
 
+    def analysePosition(self):
+        # Submit position for analysis whenever it changes, which cancels analysis of old position
+        if self.analysed_hash != self.board.hash:
+            self.analysis_result = None
+            self.analysis.submit(self.board)
+            self.analysed_hash = self.board.hash
+
+    def current_analysis(self):
+        # Analysis result, if it has arrived and is for the current position
+        if self.analysis_result is not None and self.analysis_result['hash'] == self.board.hash:
+            return self.analysis_result
+        return None
+
+    def handleAnalysisEvent(self, event):
+        if event.type == self.analysis.event_type and self.analysis.is_current(event.generation):
+            self.analysis_result = event.result
+
+        # Toggle best move and threat hints
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_h:
+            self.show_hints = not self.show_hints
+
+    def handleWindowEvent(self, event):
+        # Quit Game
+        if event.type == pygame.QUIT:
+            raise Quit
+
+        # Window has been uncovered, so whole window needs repainting
+        if event.type == pygame.VIDEOEXPOSE:
+            self.gui.invalidate()
+
+        # Window has been resized, layers are rebuilt before next draw
+        if event.type == pygame.VIDEORESIZE:
+            self.gui.request_resize(event.w, event.h)
+
     def playPrologue(self):
-        self.displayWaiting()
         while True:
-            if MODE == MODE_FLASK and self.flask.is_active_force_check():
+            self.displayWaiting()
+            if self.mode == MODE_FLASK and self.flask.is_active_force_check():
                 break
-            elif MODE == MODE_MQTT and self.mqtt.is_active():
+            elif self.mode == MODE_MQTT and self.mqtt.is_active():
                 break
             
             self.clock.tick(FPS)
@@ -216,10 +419,7 @@ class Game():
             # Get all events
             ev = pygame.event.get()
             for event in ev:
-
-                # Quit Game
-                if event.type == pygame.QUIT:
-                    raise Quit
+                self.handleWindowEvent(event)
 
     def playMain(self):
         selected_piece = None
@@ -228,14 +428,13 @@ class Game():
             self.clock.tick(FPS)
 
             waiting = self.is_waiting()
+            self.analysePosition()
     
             # Get all events
             ev = pygame.event.get()
             for event in ev:
-
-                # Quit Game
-                if event.type == pygame.QUIT:
-                    raise Quit
+                self.handleWindowEvent(event)
+                self.handleAnalysisEvent(event)
 
                 if not waiting:
                 # Click on piece 
@@ -250,7 +449,7 @@ class Game():
                 self.displayMove(moves)
 
     def doMove(self, pos, selected_piece, moves):
-        square_coords = (pos[1] // SQUARE_SIZE, pos[0] // SQUARE_SIZE)
+        square_coords = self.gui.pos_to_square(pos)
         if in_bounds(square_coords):
             
             # Deselect piece
@@ -262,10 +461,10 @@ class Game():
             elif selected_piece is not None and square_coords in moves:
                 start_pos, end_pos = selected_piece.get_pos(), square_coords
                 self.board.move_piece(*start_pos, *end_pos)
-                if MODE == MODE_FLASK:
+                if self.mode == MODE_FLASK:
                     self.displayWaiting() # Added redraw before publish to avoid latency waiting for http response
                     self.flask.publish_move(start_pos, end_pos)
-                elif MODE == MODE_MQTT:
+                elif self.mode == MODE_MQTT:
                     self.mqtt.publish_move(start_pos, end_pos)
 
                 selected_piece = None
@@ -275,7 +474,12 @@ class Game():
             else:
                 selected_piece = self.board.get_piece(square_coords[ROW], square_coords[COL])
                 if selected_piece is not None and selected_piece.get_colour() == self.board.whose_turn():
-                    moves = selected_piece.available_moves(self.board)
+                    # Use moves from background analysis if ready, rather than computing them here
+                    result = self.current_analysis()
+                    if result is not None:
+                        moves = result['moves'][square_coords]
+                    else:
+                        moves = selected_piece.available_moves(self.board)
                     print(moves)
                 else:
                     moves = []
@@ -284,39 +488,43 @@ class Game():
 
 
     def playEpilogue(self):
-        if (MODE == MODE_MQTT and self.mqtt.opponent_has_quit()) or (MODE == MODE_FLASK and self.flask.opponent_has_quit()):
-            self.displayForfeit()
+        forfeited = (self.mode == MODE_MQTT and self.mqtt.opponent_has_quit()) or (self.mode == MODE_FLASK and self.flask.opponent_has_quit())
 
         run = True
         while run:
+            # Redrawing is cheap as only changed squares are repainted
+            if forfeited:
+                self.displayForfeit()
+            else:
+                self.displayMove([])
+
             self.clock.tick(FPS)
 
             # Get all events
             ev = pygame.event.get()
             for event in ev:
-
-                # Quit Game
-                if event.type == pygame.QUIT:
-                    raise Quit
+                self.handleWindowEvent(event)
 
     def play(self):
         
         try:
-            if MODE in [MODE_FLASK, MODE_MQTT]:
+            if self.mode in [MODE_FLASK, MODE_MQTT]:
                 self.playPrologue()
             self.playMain()
             self.playEpilogue()
         except (Quit, KeyboardInterrupt):
             print("Goodbye")        
+
+        self.analysis.stop()
         
-        if MODE == MODE_FLASK:
+        if self.mode == MODE_FLASK:
             self.flask.publish_quit()
-        elif MODE == MODE_MQTT:
+        elif self.mode == MODE_MQTT:
             self.mqtt.publish_quit()
 
 
 if __name__ == '__main__':
-    g = Game()
+    g = Game(*parse_args(sys.argv[1:]))
     g.play()
 
 
@@ -0,0 +1,287 @@
+# Opt in instrumentation of move generation in chess.py, to find where time goes in real games.
+# Nothing in chess.py refers to this module: enable() replaces Board and Piece methods with wrappers
+# that count calls and time spent, and disable() puts the original methods back, so instrumentation
+# costs nothing while it is off.
+# Profile a search from the starting position (or a FEN) and write pstats and flamegraph files:
+#   python3 src/instrumentation.py [--fen FEN] [--depth N] [--output profile]
+
+import argparse
+import cProfile
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+import chess
+
+# Methods wrapped by enable(), as (class, method name). Methods are wrapped on every class that
+# defines its own version, so e.g each piece type's available_moves is counted separately
+PIECE_CLASSES = [chess.Pawn, chess.Knight, chess.Bishop, chess.Rook, chess.Queen, chess.King]
+METHODS = ([(cls, 'available_moves') for cls in PIECE_CLASSES] +
+           [(cls, 'attacking_moves') for cls in PIECE_CLASSES if 'attacking_moves' in cls.__dict__] +
+           [(chess.Piece, 'protecting_king'), (chess.Piece, 'moves_in_line'), (chess.Piece, 'available_moves_mask'),
+            (chess.Piece, 'filter_moves_to_protect_king'), (chess.Piece, 'filter_moves_to_stop_check'),
+            (chess.Board, 'move_piece'), (chess.Board, 'undo_move'), (chess.Board, 'no_available_moves'),
+            (chess.Board, 'legal_moves'), (chess.Board, 'legal_moves_packed'), (chess.Board, 'attackers_of')])
+
+# Module level functions of chess.py that are wrapped, these are looked up as globals by chess.py
+FUNCTIONS = ['in_bounds', 'get_direction_vector', 'positions_mask']
+
+# Time between stack samples taken by StackSampler, in seconds
+SAMPLE_INTERVAL = 0.001
+
+# Statistics of each wrapped function: name -> [calls, total ns, max ns]. Counts are updated without
+# a lock, so may be slightly low if several threads use boards at once
+stats = {}
+cache = {'hits': 0, 'misses': 0}
+
+# Original methods replaced by enable(), as (owner, name, original)
+originals = []
+
+
+def timed(name, function):
+    record = stats.setdefault(name, [0, 0, 0])
+    perf_counter_ns = time.perf_counter_ns
+
+    def wrapper(*args, **kwargs):
+        start = perf_counter_ns()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            elapsed = perf_counter_ns() - start
+            record[0] += 1
+            record[1] += elapsed
+            if elapsed > record[2]:
+                record[2] = elapsed
+
+    wrapper.__name__ = function.__name__
+    wrapper.__doc__ = function.__doc__
+    wrapper.__wrapped__ = function
+    return wrapper
+
+
+def counted_cache(function):
+    """
+    Wraps available_moves (already wrapped by chess.cache_moves) to count hits and misses of the
+    moves cache, using the same test cache_moves uses.
+    """
+    def wrapper(self, board, *args, **kwargs):
+        if len(kwargs) == 0:
+            if self.available_moves_cache['position'] == board.position_id:
+                cache['hits'] += 1
+            else:
+                cache['misses'] += 1
+        return function(self, board, *args, **kwargs)
+
+    wrapper.__name__ = function.__name__
+    wrapper.__doc__ = function.__doc__
+    wrapper.__wrapped__ = function
+    return wrapper
+
+
+def is_enabled():
+    return len(originals) > 0
+
+
+def enable():
+    """
+    Starts counting calls and time spent in move generation. Does nothing if already enabled.
+    """
+    if is_enabled():
+        return
+    for cls, name in METHODS:
+        original = cls.__dict__[name]
+        wrapped = timed(f"{cls.__name__}.{name}", original)
+        if name == 'available_moves':
+            wrapped = counted_cache(wrapped)
+        originals.append((cls, name, original))
+        setattr(cls, name, wrapped)
+    for name in FUNCTIONS:
+        original = getattr(chess, name)
+        originals.append((chess, name, original))
+        setattr(chess, name, timed(name, original))
+
+
+def disable():
+    """
+    Puts back the original methods, statistics are kept until reset.
+    """
+    while len(originals) > 0:
+        owner, name, original = originals.pop()
+        setattr(owner, name, original)
+
+
+def reset():
+    stats.clear()
+    cache['hits'] = 0
+    cache['misses'] = 0
+    # Wrappers of enabled instrumentation hold their own record, so are re-created
+    if is_enabled():
+        disable()
+        enable()
+
+
+@contextmanager
+def instrumented():
+    """
+    Context manager that enables instrumentation for the duration of a with block, e.g
+        with instrumented():
+            search.search(depth=4)
+        print(snapshot())
+    """
+    was_enabled = is_enabled()
+    enable()
+    try:
+        yield
+    finally:
+        if not was_enabled:
+            disable()
+
+
+def snapshot():
+    """
+    Copies current statistics.
+
+    Returns:
+        Dict: 'functions', mapping name of each function called to Dict of 'calls', 'total' (total
+                time in seconds, including functions it calls), 'mean' and 'max' (seconds per call),
+                and 'cache', with 'hits', 'misses' and 'hit_rate' of available_moves' cache.
+    """
+    functions = {}
+    for name, (calls, total, maximum) in stats.items():
+        if calls > 0:
+            functions[name] = {'calls': calls, 'total': total / 1e9, 'mean': total / calls / 1e9,
+                               'max': maximum / 1e9}
+    lookups = cache['hits'] + cache['misses']
+    return {'functions': functions,
+            'cache': {'hits': cache['hits'], 'misses': cache['misses'],
+                      'hit_rate': cache['hits'] / lookups if lookups > 0 else 0.0}}
+
+
+def format_snapshot(snapshot):
+    """
+    Formats snapshot as a table, functions with the most total time first.
+    """
+    lines = [f"{'function':<40}{'calls':>12}{'total s':>12}{'mean us':>12}{'max us':>12}"]
+    for name, record in sorted(snapshot['functions'].items(), key=lambda item: -item[1]['total']):
+        lines.append(f"{name:<40}{record['calls']:>12}{record['total']:>12.3f}{record['mean'] * 1e6:>12.2f}"
+                     f"{record['max'] * 1e6:>12.1f}")
+    moves = snapshot['functions'].get('Board.move_piece', {}).get('calls', 0)
+    if moves > 0 and 'in_bounds' in snapshot['functions']:
+        lines.append(f"in_bounds calls per move_piece: {snapshot['functions']['in_bounds']['calls'] / moves:.1f}")
+    cache_stats = snapshot['cache']
+    lines.append(f"available_moves cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+                 f"hit rate {cache_stats['hit_rate']:.1%}")
+    return '\n'.join(lines)
+
+
+def profile(function, *args, **kwargs):
+    """
+    Runs function under cProfile.
+
+    Returns:
+        Tuple: Value returned by function, and cProfile.Profile. Save with profile.dump_stats(path)
+                to view in pstats, snakeviz, etc.
+    """
+    profiler = cProfile.Profile()
+    value = profiler.runcall(function, *args, **kwargs)
+    return value, profiler
+
+
+def frame_stack(frame):
+    """
+    Names the functions on the stack ending at frame, outermost first, as module:function.
+    """
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        module = code.co_filename.replace('\\', '/').rsplit('/', 1)[-1].rsplit('.', 1)[0]
+        names.append(f"{module}:{code.co_name}")
+        frame = frame.f_back
+    return names[::-1]
+
+
+class StackSampler:
+    """
+    Samples the stack of a thread at a regular interval from a background thread. Unlike cProfile,
+    which only records callers one level up, samples record whole stacks, so can be drawn as a
+    flamegraph. Costs nothing in the sampled thread other than holding the GIL while sampling.
+
+    e.g
+        with StackSampler() as sampler:
+            search.search(depth=4)
+        sampler.write_folded('search.folded')  # flamegraph.pl search.folded > search.svg
+    """
+
+    def __init__(self, thread_id=None, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.samples = Counter()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.samples[';'.join(frame_stack(frame))] += 1
+
+    def folded(self):
+        """
+        Returns:
+            List: Lines of collapsed stacks ("outer;inner count"), the input format of flamegraph.pl,
+                    speedscope, inferno, etc.
+        """
+        return [f"{stack} {count}" for stack, count in self.samples.most_common()]
+
+    def write_folded(self, path):
+        with open(path, 'w') as file:
+            for line in self.folded():
+                file.write(line + '\n')
+
+
+def main():
+    from notation import STARTING_FEN, board_from_fen
+    from search import Search
+
+    parser = argparse.ArgumentParser(description="Instruments and profiles a search")
+    parser.add_argument('--fen', default=STARTING_FEN)
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--output', default='profile', help="Writes OUTPUT.prof (pstats) and OUTPUT.folded")
+    args = parser.parse_args()
+
+    # Each is a separate search, so neither instrumentation wrappers nor cProfile's overhead distort
+    # the others
+    with instrumented():
+        Search(board_from_fen(args.fen)).search(depth=args.depth)
+    print(format_snapshot(snapshot()))
+
+    _, profiler = profile(Search(board_from_fen(args.fen)).search, depth=args.depth)
+    profiler.dump_stats(args.output + '.prof')
+
+    with StackSampler() as sampler:
+        Search(board_from_fen(args.fen)).search(depth=args.depth)
+    sampler.write_folded(args.output + '.folded')
+    print(f"Wrote {args.output}.prof and {args.output}.folded")
+
+
+if __name__ == '__main__':
+    main()
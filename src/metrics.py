@@ -0,0 +1,195 @@
+# Metrics of the Flask server, exposed in Prometheus' text format. Counters and histograms are
+# updated in place under a lock of their own, so threads serving requests only wait for each other
+# when updating the same metric, and gauges are worked out when metrics are read.
+
+import re
+import threading
+from bisect import bisect_left
+
+# Upper bounds of latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+SAMPLE_NAME = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*')
+
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    Count that only goes up, e.g of requests served.
+
+    Args:
+        name (string): Name of metric.
+        description (string): Description of metric.
+        labels (Tuple, optional): Names of labels counts are kept separately for.
+    """
+    kind = 'counter'
+
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def total(self):
+        with self.lock:
+            return sum(self.values.values())
+
+    def samples(self):
+        with self.lock:
+            values = list(self.values.items())
+        return [(self.name, format_labels(self.labels, label_values), value) for label_values, value in values]
+
+
+class Histogram:
+    """
+    Distribution of observed values, e.g request latencies, counted in buckets.
+
+    Args:
+        name (string): Name of metric.
+        description (string): Description of metric.
+        labels (Tuple, optional): Names of labels distributions are kept separately for.
+        buckets (Tuple, optional): Upper bounds of buckets, in increasing order.
+    """
+    kind = 'histogram'
+
+    def __init__(self, name, description, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = tuple(buckets) + (float('inf'),)
+        # For each label values, count of each bucket (not cumulative), then sum of values
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            counts = self.values.get(label_values)
+            if counts is None:
+                counts = self.values[label_values] = [0] * len(self.buckets) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def samples(self):
+        with self.lock:
+            values = [(label_values, list(counts)) for label_values, counts in self.values.items()]
+        samples = []
+        for label_values, counts in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = format_labels(self.labels, label_values, [('le', format_value(bound))])
+                samples.append((f"{self.name}_bucket", labels, cumulative))
+            labels = format_labels(self.labels, label_values)
+            samples.append((f"{self.name}_sum", labels, counts[-1]))
+            samples.append((f"{self.name}_count", labels, cumulative))
+        return samples
+
+
+class Gauge:
+    """
+    Value read when metrics are collected, e.g number of games being played.
+
+    Args:
+        name (string): Name of metric.
+        description (string): Description of metric.
+        function (function): Returns value of gauge.
+        kind (string, optional): Type reported, counter if function returns a count kept elsewhere.
+    """
+
+    def __init__(self, name, description, function, kind='gauge'):
+        self.name = name
+        self.description = description
+        self.function = function
+        self.kind = kind
+
+    def samples(self):
+        return [(self.name, '', self.function())]
+
+
+class Registry:
+    """
+    Metrics exposed together.
+    """
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def expose(self):
+        """
+        Formats metrics in Prometheus' text format.
+
+        Returns:
+            string: Metrics.
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+def merge_expositions(expositions, label):
+    """
+    Merges metrics of several processes (e.g the sharded server's workers) into one exposition,
+    with each process' samples labelled with its index.
+
+    Args:
+        expositions (List): Metrics of each process in Prometheus' text format.
+        label (string): Name of label holding index of process.
+
+    Returns:
+        string: Merged metrics.
+    """
+    # Samples of each metric must be together, under a single HELP and TYPE
+    families = {}
+    family = None
+    for index, exposition in enumerate(expositions):
+        for line in exposition.splitlines():
+            if line.startswith('# '):
+                parts = line.split(' ', 3)
+                if len(parts) >= 3 and parts[1] in ['HELP', 'TYPE']:
+                    family = families.setdefault(parts[2], {'HELP': None, 'TYPE': None, 'samples': []})
+                    if family[parts[1]] is None:
+                        family[parts[1]] = line
+                continue
+            if not line.strip() or family is None:
+                continue
+            name = SAMPLE_NAME.match(line)
+            if name is None:
+                continue
+            rest = line[name.end():]
+            if rest.startswith('{'):
+                family['samples'].append(f'{name.group()}{{{label}="{index}",{rest[1:]}')
+            else:
+                family['samples'].append(f'{name.group()}{{{label}="{index}"}}{rest}')
+
+    lines = []
+    for family in families.values():
+        lines.extend(line for line in [family['HELP'], family['TYPE']] if line is not None)
+        lines.extend(family['samples'])
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,276 @@
+# Conversion between Board positions/moves and chess notation: square names (e4), UCI moves (e2e4),
+# Standard Algebraic Notation (Nf3, exd5) and FEN positions, plus reading games from PGN or
+# move-list archives. Board has no castling, en passant or promotion, so moves using them cannot
+# be read and FEN castling and en passant fields are ignored.
+
+import re
+from chess import WHITE, BLACK, KING, QUEEN, BISHOP, ROOK, KNIGHT, PAWN, ROW, COL, Board, King, Queen, Bishop, \
+    Rook, Knight, Pawn, in_bounds
+
+FILES = 'abcdefgh'
+
+SAN_PIECES = {'K': KING, 'Q': QUEEN, 'B': BISHOP, 'R': ROOK, 'N': KNIGHT}
+
+STARTING_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w - - 0 1'
+FEN_PIECES = {'K': King, 'Q': Queen, 'B': Bishop, 'R': Rook, 'N': Knight, 'P': Pawn}
+
+SAN_PATTERN = re.compile(r'^([KQBRN])?([a-h])?([1-8])?(x)?([a-h][1-8])(=[QBRN])?$')
+UCI_PATTERN = re.compile(r'^[a-h][1-8][a-h][1-8][qbrn]?$')
+
+# Parts of PGN that are not moves: tag pairs, comments, variations, move numbers, annotations and results
+PGN_TAG = re.compile(r'^\s*\[.*\]\s*$')
+PGN_IGNORED = re.compile(r'\{[^}]*\}|;[^\n]*|\$\d+|\d+\.(\.\.)?|1-0|0-1|1/2-1/2|\*')
+PGN_VARIATION = re.compile(r'\([^()]*\)')
+MOVE_NUMBER = re.compile(r'\d+\.')
+
+# Game results, from the Result tag of PGN or the result at the end of movetext or a move list
+RESULTS = ['1-0', '0-1', '1/2-1/2']
+PGN_RESULT_TAG = re.compile(r'^\s*\[Result\s+"([^"]*)"\]')
+RESULT_TOKEN = re.compile(r'(?:^|\s)(1-0|0-1|1/2-1/2)\s*$')
+
+
+class UnsupportedMove(ValueError):
+    """ Move uses a rule Board does not have (castling, promotion). """
+    pass
+
+
+def square_name(pos):
+    """
+    Converts position (row, col) into square name, e.g (3, 4) is e4.
+    """
+    return FILES[pos[COL]] + str(pos[ROW] + 1)
+
+
+def parse_square(name):
+    """
+    Converts square name into position (row, col).
+
+    Raises:
+        ValueError: Name is not a square.
+    """
+    if len(name) != 2 or name[0] not in FILES or not name[1].isdigit():
+        raise ValueError(f"{name} is not a square")
+    pos = (int(name[1]) - 1, FILES.index(name[0]))
+    if not in_bounds(pos):
+        raise ValueError(f"{name} is not a square")
+    return pos
+
+
+def move_to_uci(move):
+    """
+    Converts move (start_pos, end_pos) into UCI notation, e.g ((1, 4), (3, 4)) is e2e4.
+    """
+    return square_name(move[0]) + square_name(move[1])
+
+
+def board_from_fen(fen):
+    """
+    Creates Board with position described by FEN, e.g STARTING_FEN. Castling rights and en passant
+    square are ignored, the halfmove clock sets Board.halfmove_clock and the move number sets Board.turn.
+
+    Args:
+        fen (string): Position in Forsyth-Edwards Notation, only the piece placement and side to
+                        move fields are required.
+
+    Raises:
+        ValueError: FEN is not valid, or position is not one Board can hold.
+
+    Returns:
+        Board: Board with position set up.
+    """
+    fields = fen.split()
+    if len(fields) < 2 or fields[1] not in ['w', 'b']:
+        raise ValueError(f"{fen} is not a FEN position")
+
+    rows = fields[0].split('/')
+    if len(rows) != 8:
+        raise ValueError(f"{fen} does not have 8 ranks")
+
+    pieces = []
+    for rank, text in enumerate(rows):
+        row = 7 - rank
+        col = 0
+        for char in text:
+            if char.isdigit():
+                col += int(char)
+            elif char.upper() in FEN_PIECES and col < 8:
+                colour = WHITE if char.isupper() else BLACK
+                pieces.append(FEN_PIECES[char.upper()]((row, col), colour))
+                col += 1
+            else:
+                raise ValueError(f"{text} is not a valid FEN rank")
+        if col != 8:
+            raise ValueError(f"{text} is not a valid FEN rank")
+
+    move_number = int(fields[5]) if len(fields) > 5 and fields[5].isdigit() else 1
+    turn = 2 * (max(move_number, 1) - 1) + (1 if fields[1] == 'b' else 0)
+    halfmove_clock = int(fields[4]) if len(fields) > 4 and fields[4].isdigit() else 0
+    return Board(pieces, turn, halfmove_clock)
+
+
+def board_to_fen(board):
+    """
+    Describes position on board in Forsyth-Edwards Notation, without castling rights or en passant.
+    """
+    ranks = []
+    for row in range(7, -1, -1):
+        text = ''
+        empty = 0
+        for col in range(8):
+            piece = board.get_piece(row, col)
+            if piece is None:
+                empty += 1
+                continue
+            if empty > 0:
+                text += str(empty)
+                empty = 0
+            letter = piece.get_type()
+            text += letter if piece.get_colour() == WHITE else letter.lower()
+        if empty > 0:
+            text += str(empty)
+        ranks.append(text)
+
+    turn = 'w' if board.whose_turn() == WHITE else 'b'
+    return f"{'/'.join(ranks)} {turn} - - {board.halfmove_clock} {board.turn // 2 + 1}"
+
+
+def parse_uci(text):
+    """
+    Converts move in UCI notation into (start_pos, end_pos), the move is not checked to be legal.
+
+    Raises:
+        UnsupportedMove: Move is a promotion.
+        ValueError: Text is not a UCI move.
+    """
+    if not UCI_PATTERN.match(text):
+        raise ValueError(f"{text} is not a UCI move")
+    if len(text) == 5:
+        raise UnsupportedMove(f"{text} is a promotion")
+    return parse_square(text[0:2]), parse_square(text[2:4])
+
+
+def parse_san(board, text):
+    """
+    Finds the legal move described by text in Standard Algebraic Notation, e.g Nf3, exd5, Rae1+.
+
+    Args:
+        board (Board): Instance of Board class, move is for player whose turn it is.
+        text (string): Move in SAN, check/mate marks and annotations (!, ?) are ignored.
+
+    Raises:
+        UnsupportedMove: Move is castling or a promotion.
+        ValueError: Text is not SAN, or describes no legal move or more than one.
+
+    Returns:
+        Tuple: Move (start_pos, end_pos).
+    """
+    text = text.rstrip('+#!?')
+    if text.startswith('O-O') or text.startswith('0-0'):
+        raise UnsupportedMove(f"{text} is castling")
+
+    match = SAN_PATTERN.match(text)
+    if match is None:
+        raise ValueError(f"{text} is not a SAN move")
+    piece_letter, from_file, from_rank, _, to_square, promotion = match.groups()
+    if promotion is not None:
+        raise UnsupportedMove(f"{text} is a promotion")
+
+    piece_type = SAN_PIECES[piece_letter] if piece_letter is not None else PAWN
+    end_pos = parse_square(to_square)
+
+    candidates = []
+    for start_pos, move_end in board.legal_moves():
+        if move_end != end_pos or board.get_piece(*start_pos).get_type() != piece_type:
+            continue
+        if from_file is not None and FILES[start_pos[COL]] != from_file:
+            continue
+        if from_rank is not None and str(start_pos[ROW] + 1) != from_rank:
+            continue
+        candidates.append((start_pos, move_end))
+
+    if len(candidates) != 1:
+        raise ValueError(f"{text} is {'ambiguous' if candidates else 'not a legal move'}")
+    return candidates[0]
+
+
+def parse_move(board, text):
+    """
+    Finds the legal move described by text in either UCI notation or SAN.
+
+    Raises:
+        UnsupportedMove: Move uses castling or promotion.
+        ValueError: Text does not describe a legal move.
+
+    Returns:
+        Tuple: Move (start_pos, end_pos).
+    """
+    if UCI_PATTERN.match(text):
+        move = parse_uci(text)
+        if move not in board.legal_moves():
+            raise ValueError(f"{text} is not a legal move")
+        return move
+    return parse_san(board, text)
+
+
+def read_games(lines):
+    """
+    Reads games from a PGN archive, or a move-list archive with one game of space separated moves
+    (UCI or SAN) per line. Games in PGN are separated by their tag pairs or by blank lines, a line
+    starting a game is taken to be PGN movetext if it has move numbers.
+
+    Args:
+        lines (Iterable): Lines of archive, e.g an open file.
+
+    Yields:
+        List: Move texts of each game, without move numbers, comments, variations or results.
+    """
+    for moves, _ in read_games_with_results(lines):
+        yield moves
+
+
+def read_games_with_results(lines):
+    """
+    Reads games as read_games does, along with their results.
+
+    Args:
+        lines (Iterable): Lines of archive, e.g an open file.
+
+    Yields:
+        Tuple: Move texts of game, and its result (one of RESULTS) or None if it is not given.
+    """
+    text = []
+    result = None
+    for line in lines:
+        line = line.strip()
+        if PGN_TAG.match(line) or len(line) == 0:
+            if len(text) > 0:
+                yield split_moves(' '.join(text)), text_result(text, result)
+                text = []
+                result = None
+            tag = PGN_RESULT_TAG.match(line)
+            if tag is not None and tag.group(1) in RESULTS:
+                result = tag.group(1)
+            continue
+        if len(text) == 0 and not MOVE_NUMBER.search(line):
+            yield split_moves(line), text_result([line], result)
+            result = None
+            continue
+        text.append(line)
+    if len(text) > 0:
+        yield split_moves(' '.join(text)), text_result(text, result)
+
+
+def text_result(text, tag_result):
+    # A result given at the end of the moves takes precedence over the Result tag
+    match = RESULT_TOKEN.search(text[-1])
+    return match.group(1) if match is not None else tag_result
+
+
+def split_moves(text):
+    # Nested variations are removed from the inside out
+    while True:
+        stripped = PGN_VARIATION.sub(' ', text)
+        if stripped == text:
+            break
+        text = stripped
+    return PGN_IGNORED.sub(' ', text).split()
@@ -0,0 +1,138 @@
+# Move ordering for search. Alpha-beta only prunes once a good enough move has been searched, so
+# trying the moves most likely to cause a cutoff first shrinks the searched tree.
+
+from chess import WHITE, BLACK, VALUES, square_index
+
+MAX_PLY = 128
+KILLER_SLOTS = 2
+
+# Moves are sorted by score, each kind of move is given a base score that places it above the next
+HASH_MOVE_SCORE = 1 << 30
+CAPTURE_SCORE = 1 << 20
+KILLER_SCORE = 1 << 19
+
+# History scores are halved once any reaches this, so old results fade out
+HISTORY_LIMIT = 1 << 16
+
+
+def mvv_lva(board, move):
+    """
+    Most Valuable Victim - Least Valuable Attacker score of a capture, i.e prefers capturing the most
+    valuable piece, and of those, capturing with the least valuable piece.
+
+    Args:
+        board (Board): Instance of Board class that contains all information about the current
+                        state of game.
+        move (Tuple): Capture (start_pos, end_pos).
+
+    Returns:
+        int: Score of capture, higher scores should be tried first.
+    """
+    start_pos, end_pos = move
+    victim = board.get_piece(*end_pos)
+    attacker = board.get_piece(*start_pos)
+    return 16 * VALUES[victim.get_type()] - min(VALUES[attacker.get_type()], 15)
+
+
+class MoveOrderer:
+    """
+    Orders moves by hash move first, then captures by MVV-LVA, then killer moves (quiet moves that
+    caused a cutoff at the same ply), then remaining quiet moves by history score (how often and
+    how deep the move has caused a cutoff anywhere in the tree).
+    """
+
+    def __init__(self):
+        self.killers = [[None] * KILLER_SLOTS for _ in range(MAX_PLY)]
+        self.history = {colour: [[0] * 64 for _ in range(64)] for colour in [WHITE, BLACK]}
+
+        # Statistics of how often first move searched caused the cutoff
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+
+    def order(self, board, moves, hash_move=None, ply=0):
+        """
+        Sorts moves so that those most likely to cause a cutoff come first.
+
+        Args:
+            board (Board): Instance of Board class that contains all information about the
+                            current state of game.
+            moves (List): Moves (start_pos, end_pos) of player whose turn it is.
+            hash_move (Tuple, optional): Best move found for position in transposition table.
+            ply (int, optional): Distance from root of search.
+
+        Returns:
+            List: Moves in order they should be searched.
+        """
+        killers = self.killers[ply] if ply < MAX_PLY else []
+        history = self.history[board.whose_turn()]
+
+        def score(move):
+            if move == hash_move:
+                return HASH_MOVE_SCORE
+            if board.get_piece(*move[1]) is not None:
+                return CAPTURE_SCORE + mvv_lva(board, move)
+            if move in killers:
+                return KILLER_SCORE - killers.index(move)
+            return history[square_index(move[0])][square_index(move[1])]
+
+        return sorted(moves, key=score, reverse=True)
+
+    def is_quiet(self, board, move):
+        return board.get_piece(*move[1]) is None
+
+    def record_cutoff(self, board, move, ply, depth, move_number):
+        """
+        Records that move caused a beta cutoff. Must be called while move is not made on board, as
+        destination of move is inspected to tell if it was a capture.
+
+        Args:
+            board (Board): Board before move is made.
+            move (Tuple): Move (start_pos, end_pos) that caused cutoff.
+            ply (int): Distance from root of search.
+            depth (int): Remaining depth of search at node.
+            move_number (int): Index of move in ordered list of moves, 0 for first move.
+        """
+        self.cutoffs += 1
+        if move_number == 0:
+            self.first_move_cutoffs += 1
+
+        if not self.is_quiet(board, move):
+            return
+
+        if ply < MAX_PLY and move not in self.killers[ply]:
+            self.killers[ply] = [move] + self.killers[ply][:KILLER_SLOTS - 1]
+
+        history = self.history[board.whose_turn()]
+        start, end = square_index(move[0]), square_index(move[1])
+        history[start][end] += depth * depth
+        if history[start][end] >= HISTORY_LIMIT:
+            self.age()
+
+    def age(self):
+        """
+        Halves every history score, so moves that were good in earlier searches count for less.
+        """
+        for history in self.history.values():
+            for row in history:
+                for index in range(64):
+                    row[index] >>= 1
+
+    def new_search(self):
+        """
+        Prepares for a new search from a different root, killers are cleared as they are only
+        relevant to positions at the same ply, and history is aged.
+        """
+        self.killers = [[None] * KILLER_SLOTS for _ in range(MAX_PLY)]
+        self.age()
+
+    def first_move_cutoff_rate(self):
+        """
+        Fraction of cutoffs that were caused by the first move searched at a node, the closer this
+        is to 1 the better moves are being ordered.
+
+        Returns:
+            float: Rate between 0 and 1, or None if there have been no cutoffs.
+        """
+        if self.cutoffs == 0:
+            return None
+        return self.first_move_cutoffs / self.cutoffs
@@ -0,0 +1,209 @@
+# Parallel search over several processes (Lazy SMP). Each worker process runs an ordinary Search
+# of the same position, and they help each other only through a transposition table in shared
+# memory, so a worker often finds positions already searched by another. Processes are used
+# because the GIL only lets one thread run Python code at a time. Worker processes are started by
+# the first search and kept for the following ones, which only send them the position to search.
+
+import multiprocessing
+import queue
+import time
+from search import Search, MAX_DEPTH
+from transposition import SharedTranspositionTable, DEFAULT_SIZE
+
+# Time to wait for workers to report after they have been stopped, in seconds
+WORKER_TIMEOUT = 5.0
+# Time between checks that workers are still alive while waiting for results, in seconds
+POLL_INTERVAL = 0.1
+
+
+class WorkerSearch(Search):
+    """ Search that is also stopped when stop_event is set by another process. """
+
+    def __init__(self, board, table, stop_event, tablebase=None):
+        super().__init__(board, table=table, tablebase=tablebase)
+        self.stop_event = stop_event
+
+    def check_limits(self):
+        super().check_limits()
+        if self.stop_event.is_set():
+            self.stopped = True
+
+
+def search_worker(table, worker, stop_event, jobs, results, tablebase=None):
+    """
+    Runs a worker process, searching each job (job, board, depth, movetime) taken from jobs until
+    None is taken. Puts (job, 'info', result) on results after each depth if this is the main worker
+    (worker 0), and (job, 'done', result) once finished.
+
+    Args:
+        table (SharedTranspositionTable): Table shared by all workers.
+        worker (int): Number of worker, 0 for the main worker.
+        stop_event (multiprocessing.Event): Set when workers should stop.
+        jobs (multiprocessing.Queue): Queue jobs are taken from, each board is the worker's own copy
+                                        and movetime is the maximum time in seconds or None.
+        results (multiprocessing.Queue): Queue results are put on.
+        tablebase (Tablebase, optional): Endgame tablebase to score positions with.
+    """
+    for job, board, depth, movetime in iter(jobs.get, None):
+        search = WorkerSearch(board, table, stop_event, tablebase)
+
+        def info(result):
+            results.put((job, 'info', result))
+
+        # Every other helper starts a depth ahead, so workers are spread over neighbouring depths
+        # rather than all searching the same tree in step
+        result = search.search(depth=depth, movetime=movetime, info=info if worker == 0 else None,
+                               start_depth=1 + worker % 2)
+        result['worker'] = worker
+        results.put((job, 'done', result))
+    table.close()
+
+
+class ParallelSearch:
+    """
+    Searches for the best move of the player whose turn it is on board using several worker
+    processes. Board is not modified, and can be replaced between searches (e.g with the position
+    after the next move) to search it with the same workers. The workers and shared table are kept
+    between searches, and close() must be called once the ParallelSearch is no longer needed to
+    stop the workers and free the table.
+    """
+
+    def __init__(self, board, workers=None, table_size=DEFAULT_SIZE, table=None, book=None, tablebase=None):
+        self.board = board
+        self.book = book
+        self.tablebase = tablebase
+        self.workers = workers if workers is not None else multiprocessing.cpu_count()
+        self.owns_table = table is None
+        self.table = table if table is not None else SharedTranspositionTable(table_size)
+        self.context = multiprocessing.get_context()
+        self.stop_event = self.context.Event()
+
+        # Worker processes with a queue of jobs each, started by first search
+        self.processes = []
+        self.jobs = []
+        self.results = None
+        self.job = 0
+
+    def stop(self):
+        """
+        Stops search as soon as possible, can be called from another thread.
+        """
+        self.stop_event.set()
+
+    def close(self):
+        self.stop_workers()
+        if self.owns_table:
+            self.table.unlink()
+
+    def start_workers(self):
+        self.jobs = [self.context.Queue() for _ in range(self.workers)]
+        self.results = self.context.Queue()
+        self.processes = [self.context.Process(target=search_worker, daemon=True,
+                                               args=(self.table, worker, self.stop_event, self.jobs[worker],
+                                                     self.results, self.tablebase))
+                          for worker in range(self.workers)]
+        for process in self.processes:
+            process.start()
+
+    def stop_workers(self):
+        for jobs in self.jobs:
+            jobs.put(None)
+        for process in self.processes:
+            process.join(WORKER_TIMEOUT)
+            if process.is_alive():
+                process.terminate()
+        self.processes = []
+        self.jobs = []
+
+    def search(self, depth=MAX_DEPTH, movetime=None, info=None):
+        """
+        Searches with every worker until the main worker reaches depth, movetime has passed, a
+        forced mate is found or stop() is called, then stops the helpers. If the main worker dies,
+        the helpers are stopped too and the best result reported so far is returned.
+
+        Args:
+            depth (int, optional): Maximum depth to search to, defaults to MAX_DEPTH.
+            movetime (float, optional): Maximum time in seconds to search for.
+            info (function, optional): Called with main worker's result after each depth is completed.
+
+        Returns:
+            Dict: Result of the worker that completed the greatest depth (the main worker if tied),
+                    as returned by Search.search, with 'nodes' searched by all workers and 'workers'.
+        """
+        start = time.perf_counter()
+        # Book is checked before starting any workers, which then needn't open it
+        book_move = self.book.get_move(self.board) if self.book is not None else None
+        if book_move is not None and self.board.winner is None:
+            return {'move': book_move, 'score': self.board.evaluate(), 'depth': 0, 'nodes': 0,
+                    'time': time.perf_counter() - start, 'pv': [book_move], 'first_move_cutoff_rate': None,
+                    'book': True, 'workers': self.workers}
+
+        # Workers that have died (e.g were killed) are replaced by starting them all again
+        if len(self.processes) == 0 or not all(process.is_alive() for process in self.processes):
+            self.stop_workers()
+            self.start_workers()
+
+        self.stop_event.clear()
+        self.job += 1
+        for jobs in self.jobs:
+            jobs.put((self.job, self.board, depth, movetime))
+
+        finished = {}
+        latest_info = None
+        stopped_at = None
+        try:
+            while len(finished) < self.workers:
+                # Workers only stop by themselves if they reach their limits, so once they have been
+                # told to stop they are only waited for up to WORKER_TIMEOUT
+                if self.stop_event.is_set():
+                    stopped_at = stopped_at if stopped_at is not None else time.perf_counter()
+                    if time.perf_counter() - stopped_at > WORKER_TIMEOUT:
+                        break
+
+                try:
+                    job, kind, result = self.results.get(timeout=POLL_INTERVAL)
+                except queue.Empty:
+                    # A worker that has died (e.g run out of memory) will never report, without the
+                    # main worker the helpers are stopped, and the results so far are used once no
+                    # worker is left that could report
+                    if 0 not in finished and not self.processes[0].is_alive():
+                        self.stop_event.set()
+                    if not any(process.is_alive() for worker, process in enumerate(self.processes)
+                               if worker not in finished):
+                        break
+                    continue
+
+                # Results of an earlier search that was abandoned
+                if job != self.job:
+                    continue
+                if kind == 'info':
+                    latest_info = result
+                    if info is not None:
+                        info(result)
+                    continue
+
+                finished[result['worker']] = result
+                # Helpers are only there to help the main worker, once it finishes so do they
+                if result['worker'] == 0:
+                    self.stop_event.set()
+        finally:
+            self.stop_event.set()
+            # Every worker must be waiting for a job before the next search, workers that haven't
+            # finished in time are stopped and started again by the next search
+            if len(finished) < self.workers:
+                self.stop_workers()
+
+        # Last depth the main worker completed stands in for it if it didn't finish
+        if 0 not in finished and latest_info is not None:
+            finished[0] = dict(latest_info, worker=0)
+        finished = list(finished.values())
+
+        if len(finished) == 0:
+            return {'move': None, 'score': 0, 'depth': 0, 'nodes': 0, 'time': time.perf_counter() - start,
+                    'pv': [], 'first_move_cutoff_rate': None, 'book': False, 'workers': self.workers}
+
+        best = max(finished, key=lambda result: (result['move'] is not None, result['depth'], result['worker'] == 0))
+        best = dict(best)
+        best.update(nodes=sum(result['nodes'] for result in finished), time=time.perf_counter() - start,
+                    workers=self.workers)
+        return best
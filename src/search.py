@@ -0,0 +1,342 @@
+# Alpha-beta search over Board. Uses iterative deepening, a transposition table and move ordering,
+# making and undoing moves on the board being searched. Once depth runs out, a quiescence search
+# carries on through captures so positions are never evaluated part way through an exchange.
+
+import time
+from chess import WHITE, BLACK, STALEMATE, DRAW
+from ordering import MoveOrderer, MAX_PLY, mvv_lva
+from see import see
+from tablebase import MAX_PIECES, WIN, LOSS
+from transposition import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
+
+MAX_DEPTH = 64
+INFINITY = 1000000
+
+# Score of being checkmated at root, mates further from root score less so shorter mates are preferred
+MATE_SCORE = 100000
+MATE_BOUND = MATE_SCORE - 1000
+
+# Number of nodes searched between checking time and node limits
+CHECK_INTERVAL = 256
+
+
+class SearchStopped(Exception):
+    pass
+
+
+def is_mate_score(score):
+    return abs(score) >= MATE_BOUND
+
+
+def score_to_table(score, ply):
+    """
+    Converts mate scores from distance to root into distance to this position before storing them
+    in transposition table, as the same position can be reached at different plies.
+    """
+    if score >= MATE_BOUND:
+        return score + ply
+    if score <= -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def score_from_table(score, ply):
+    if score >= MATE_BOUND:
+        return score - ply
+    if score <= -MATE_BOUND:
+        return score + ply
+    return score
+
+
+class Search:
+    """
+    Searches for the best move of the player whose turn it is on board. The board is modified while
+    searching, but is returned to its original state when search finishes or is stopped. If an
+    OpeningBook is given, positions in it are not searched and the book move is played instead.
+    If a Tablebase is given, positions with few enough pieces are scored from it instead of searched.
+    """
+
+    def __init__(self, board, table=None, orderer=None, quiescence=True, book=None, tablebase=None):
+        self.board = board
+        self.use_quiescence = quiescence
+        self.book = book
+        self.tablebase = tablebase
+        self.table = table if table is not None else TranspositionTable()
+        self.orderer = orderer if orderer is not None else MoveOrderer()
+        self.stopped = False
+        self.nodes = 0
+        self.deadline = None
+        self.node_limit = None
+        self.root_best = None
+
+    def stop(self):
+        """
+        Stops search as soon as possible, can be called from another thread.
+        """
+        self.stopped = True
+
+    def search(self, depth=MAX_DEPTH, movetime=None, nodes=None, info=None, start_depth=1):
+        """
+        Searches with iterative deepening until depth is reached, movetime has passed, nodes have
+        been searched, a forced mate is found or stop() is called.
+
+        Args:
+            depth (int, optional): Maximum depth to search to, defaults to MAX_DEPTH.
+            movetime (float, optional): Maximum time in seconds to search for.
+            nodes (int, optional): Maximum number of nodes to search.
+            info (function, optional): Called with result after each depth is completed.
+            start_depth (int, optional): First depth searched, defaults to 1.
+
+        Returns:
+            Dict: 'move' best move (start_pos, end_pos) or None if there are no moves, 'score' in
+                    centipawns for player whose turn it is, 'depth' completed, 'nodes' searched,
+                    'time' taken in seconds, 'pv' principal variation, 'first_move_cutoff_rate' and
+                    'book' (whether move is from opening book, in which case score is static).
+        """
+        start = time.perf_counter()
+        self.stopped = False
+        self.nodes = 0
+        self.deadline = None if movetime is None else start + movetime
+        self.node_limit = nodes
+        self.orderer.new_search()
+
+        result = {'move': None, 'score': 0, 'depth': 0, 'nodes': 0, 'time': 0, 'pv': [],
+                  'first_move_cutoff_rate': None, 'book': False}
+        moves = self.board.legal_moves()
+        if self.board.winner is not None or len(moves) == 0:
+            return result
+
+        book_move = self.book.get_move(self.board) if self.book is not None else None
+        if book_move is not None:
+            result.update(move=book_move, score=self.board.evaluate(), pv=[book_move], book=True,
+                          time=time.perf_counter() - start)
+            return result
+
+        # Fallback in case search is stopped before first depth is completed
+        result['move'] = self.orderer.order(self.board, moves)[0]
+
+        for current_depth in range(max(start_depth, 1), min(depth, MAX_DEPTH) + 1):
+            self.root_best = None
+            try:
+                score = self.negamax(current_depth, -INFINITY, INFINITY, 0)
+                move = self.root_best[1]
+            except SearchStopped:
+                # Root moves are searched best first, so a move that has beaten the first move
+                # during an unfinished depth is better than the previous depth's best move
+                if self.root_best is not None and self.root_best[1] != result['move']:
+                    result['move'], result['score'] = self.root_best[1], self.root_best[0]
+                    result['pv'] = [result['move']]
+                break
+
+            result.update(move=move, score=score, depth=current_depth, pv=self.principal_variation(current_depth))
+            result.update(nodes=self.nodes, time=time.perf_counter() - start,
+                          first_move_cutoff_rate=self.orderer.first_move_cutoff_rate())
+            if info is not None:
+                info(dict(result))
+
+            if is_mate_score(score) or self.stopped:
+                break
+
+        result.update(nodes=self.nodes, time=time.perf_counter() - start,
+                      first_move_cutoff_rate=self.orderer.first_move_cutoff_rate())
+        return result
+
+    def check_limits(self):
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            self.stopped = True
+        if self.node_limit is not None and self.nodes >= self.node_limit:
+            self.stopped = True
+
+    def evaluate_leaf(self, alpha, beta, ply):
+        if self.use_quiescence:
+            return self.quiescence(alpha, beta, ply)
+        return self.board.evaluate()
+
+    def quiescence(self, alpha, beta, ply):
+        """
+        Searches captures (or every move, if in check) until position is quiet. Player whose turn it
+        is can instead "stand pat" and take the evaluation of the position, unless they are in check.
+        Captures that lose material according to static exchange evaluation are not searched.
+
+        Args:
+            alpha (int): Score player whose turn it is is already guaranteed.
+            beta (int): Score opponent is already guaranteed.
+            ply (int): Distance from root of search.
+
+        Raises:
+            SearchStopped: Search has been stopped, board is left as it was at this node.
+
+        Returns:
+            int: Score of position for player whose turn it is.
+        """
+        board = self.board
+        self.nodes += 1
+        if self.nodes % CHECK_INTERVAL == 0:
+            self.check_limits()
+        if self.stopped:
+            raise SearchStopped
+
+        if board.winner is not None:
+            return 0 if board.winner in [STALEMATE, DRAW] else -(MATE_SCORE - ply)
+
+        if ply >= MAX_PLY:
+            return board.evaluate()
+
+        if board.is_in_check(board.whose_turn()):
+            # Every move is an evasion, so all are searched and there is no standing pat
+            best_score = -INFINITY
+            moves = self.orderer.order(board, board.legal_moves(), ply=ply)
+        else:
+            best_score = board.evaluate()
+            if best_score >= beta:
+                return best_score
+            alpha = max(alpha, best_score)
+            captures = [move for move in board.legal_moves()
+                        if board.get_piece(*move[1]) is not None and see(board, move) >= 0]
+            moves = sorted(captures, key=lambda move: mvv_lva(board, move), reverse=True)
+
+        for move in moves:
+            board.move_piece(*move[0], *move[1])
+            try:
+                score = -self.quiescence(-beta, -alpha, ply + 1)
+            finally:
+                board.undo_move()
+
+            if score > best_score:
+                best_score = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+
+        return best_score
+
+    def negamax(self, depth, alpha, beta, ply):
+        """
+        Searches position on board to depth.
+
+        Args:
+            depth (int): Remaining depth to search.
+            alpha (int): Score player whose turn it is is already guaranteed.
+            beta (int): Score opponent is already guaranteed, searching stops once this is reached.
+            ply (int): Distance from root of search.
+
+        Raises:
+            SearchStopped: Search has been stopped, board is left as it was at this node.
+
+        Returns:
+            int: Score of position for player whose turn it is.
+        """
+        board = self.board
+        self.nodes += 1
+        if self.nodes % CHECK_INTERVAL == 0:
+            self.check_limits()
+        if self.stopped:
+            raise SearchStopped
+
+        # Previous move ended game, winner can only be the player who made it
+        if board.winner is not None:
+            return 0 if board.winner in [STALEMATE, DRAW] else -(MATE_SCORE - ply)
+
+        # A position repeated since the root, or from before it, is scored as a draw, as the player
+        # who repeated it could carry on repeating it
+        if ply > 0 and board.halfmove_clock >= 4 and board.repetitions() > 0:
+            return 0
+
+        # Root is always searched, so a move is found even when the position is in the tablebase
+        if ply > 0 and self.tablebase is not None:
+            score = self.probe_tablebase(ply)
+            if score is not None:
+                return score
+
+        if depth <= 0:
+            return self.evaluate_leaf(alpha, beta, ply)
+
+        original_alpha = alpha
+        hash_move = None
+        entry = self.table.probe(board.hash)
+        if entry is not None:
+            entry_depth, entry_score, bound, hash_move = entry
+            entry_score = score_from_table(entry_score, ply)
+            if entry_depth >= depth and ply > 0:
+                if bound == EXACT:
+                    return entry_score
+                if bound == LOWER_BOUND and entry_score >= beta:
+                    return entry_score
+                if bound == UPPER_BOUND and entry_score <= alpha:
+                    return entry_score
+
+        best_score = -INFINITY
+        best_move = None
+        moves = self.orderer.order(board, board.legal_moves(), hash_move, ply)
+        for move_number, move in enumerate(moves):
+            board.move_piece(*move[0], *move[1])
+            try:
+                score = -self.negamax(depth - 1, -beta, -alpha, ply + 1)
+            finally:
+                board.undo_move()
+
+            if score > best_score:
+                best_score, best_move = score, move
+                if score > alpha:
+                    alpha = score
+                    if ply == 0:
+                        self.root_best = (score, move)
+                    if alpha >= beta:
+                        self.orderer.record_cutoff(board, move, ply, depth, move_number)
+                        break
+
+        if best_score <= original_alpha:
+            bound = UPPER_BOUND
+        elif best_score >= beta:
+            bound = LOWER_BOUND
+        else:
+            bound = EXACT
+        self.table.store(board.hash, depth, score_to_table(best_score, ply), bound, best_move)
+
+        return best_score
+
+    def probe_tablebase(self, ply):
+        """
+        Scores position from tablebase, mates are scored by their distance from root like mates
+        found by search.
+
+        Returns:
+            int: Score of position for player whose turn it is, or None if it is not in tablebase.
+        """
+        board = self.board
+        if len(board.get_pieces(WHITE)) + len(board.get_pieces(BLACK)) > MAX_PIECES:
+            return None
+        entry = self.tablebase.probe(board)
+        if entry is None:
+            return None
+        result, plies = entry
+        if result == WIN:
+            return MATE_SCORE - (ply + plies)
+        if result == LOSS:
+            return -(MATE_SCORE - (ply + plies))
+        return 0
+
+    def principal_variation(self, max_length):
+        """
+        Follows best moves stored in transposition table from current position.
+
+        Args:
+            max_length (int): Maximum number of moves to follow.
+
+        Returns:
+            List: Moves (start_pos, end_pos) expected to be played.
+        """
+        pv = []
+        seen = set()
+        while len(pv) < max_length and self.board.winner is None and self.board.hash not in seen:
+            seen.add(self.board.hash)
+            entry = self.table.probe(self.board.hash)
+            if entry is None or entry[3] is None or entry[3] not in self.board.legal_moves():
+                break
+            pv.append(entry[3])
+            self.board.move_piece(*entry[3][0], *entry[3][1])
+
+        for _ in pv:
+            self.board.undo_move()
+        return pv
@@ -0,0 +1,55 @@
+# Static exchange evaluation, which works out the material won or lost by a capture once every
+# piece attacking the target square has had the chance to recapture, without making any moves.
+
+from chess import WHITE, BLACK, KING, VALUES
+
+
+def see(board, move):
+    """
+    Static exchange evaluation of move. Each side recaptures on the target square with its least
+    valuable attacker, and either side can stop capturing whenever continuing would lose material.
+    Pieces behind an attacker on the same line join in once the attacker has captured. Pinned
+    pieces are treated as free to capture.
+
+    Args:
+        board (Board): Instance of Board class that contains all information about the current
+                        state of game.
+        move (Tuple): Move (start_pos, end_pos) for player whose turn it is, need not be a capture.
+
+    Returns:
+        int: Material (in units of VALUES) player gains from the exchange, negative if they lose
+                material.
+    """
+    start_pos, end_pos = move
+    piece = board.get_piece(*start_pos)
+    target_piece = board.get_piece(*end_pos)
+
+    # gains[i] is the material won by the side making capture i, if the exchange stopped after it
+    gains = [0 if target_piece is None else VALUES[target_piece.get_type()]]
+    used = [piece]
+    piece_on_square = piece
+    side = BLACK if piece.get_colour() == WHITE else WHITE
+
+    while True:
+        attackers = board.attackers_of(end_pos, side, ignore=tuple(used))
+        if len(attackers) == 0:
+            break
+
+        attacker = min(attackers, key=lambda attacker: VALUES[attacker.get_type()])
+
+        # King can only recapture if the square is no longer defended
+        if attacker.get_type() == KING:
+            other_side = BLACK if side == WHITE else WHITE
+            if len(board.attackers_of(end_pos, other_side, ignore=tuple(used))) > 0:
+                break
+
+        gains.append(VALUES[piece_on_square.get_type()] - gains[-1])
+        used.append(attacker)
+        piece_on_square = attacker
+        side = BLACK if side == WHITE else WHITE
+
+    # Work back from the end of the exchange, each side only captures if it doesn't lose out
+    for index in range(len(gains) - 1, 0, -1):
+        gains[index - 1] = -max(-gains[index - 1], gains[index])
+
+    return gains[0]
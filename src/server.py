@@ -0,0 +1,318 @@
+# Sharded deployment of the Flask server (app.py), to use more than one core. Runs several worker
+# processes, each serving the games whose names hash to it with a database of its own, behind a
+# router that forwards each request to the worker owning its game. Requests for a game are always
+# handled by the same process, so processes share no locks or database files.
+# Run from root of repository: python3 src/server.py [--workers K] [--routers R] [--port 5000]
+# Games in progress are only recovered if the server is restarted with the same number of workers.
+# /metrics is answered by the router with the metrics of every worker, labelled by worker.
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import zlib
+from urllib.parse import parse_qs, urlsplit
+from metrics import merge_expositions
+from storage import DEFAULT_DATABASE
+
+DEFAULT_GAME = 'default'
+DEFAULT_PORT = 5000
+
+# Longest request or response head accepted, in bytes
+MAX_HEAD = 64 * 1024
+
+# Size of pieces response bodies are relayed in, in bytes
+RELAY_CHUNK = 64 * 1024
+
+# Time processes are given to exit once the server is stopped, in seconds
+SHUTDOWN_TIMEOUT = 5
+
+
+def shard_of(game, shards):
+    """
+    Chooses worker owning game. Uses crc32 rather than hash(), which differs between processes.
+
+    Args:
+        game (string): Name of game.
+        shards (int): Number of workers.
+
+    Returns:
+        int: Index of worker.
+    """
+    return zlib.crc32(game.encode()) % shards
+
+
+def shard_storage(storage, index):
+    """
+    Path of worker's database, e.g games.db -> games-0.db, or none if storage is turned off.
+    """
+    if storage.lower() in ['', 'none']:
+        return storage
+    root, extension = os.path.splitext(storage)
+    return f"{root}-{index}{extension}"
+
+
+def run_worker(index, storage, ports):
+    """
+    Runs a worker process, serving app on a local port that is reported through ports.
+    """
+    # Set before app is imported, as app opens its storage when imported
+    os.environ['CHESS_STORAGE'] = shard_storage(storage, index)
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    from app import APP
+
+    # HTTP/1.1 lets the router keep its connections to workers open between requests
+    class KeepAliveRequestHandler(WSGIRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server('127.0.0.1', 0, APP, threaded=True, request_handler=KeepAliveRequestHandler)
+    ports.put((index, server.server_port))
+    # Workers are stopped with SIGTERM, which exits through atexit so app closes its storage cleanly
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    server.serve_forever()
+
+
+class HttpError(Exception):
+    pass
+
+
+async def read_head(reader):
+    """
+    Reads head (start line and headers) of an HTTP message.
+
+    Returns:
+        Tuple: Raw head bytes, start line, and Dict of headers with lower case names, or None if
+                connection closed before a message started.
+    """
+    try:
+        head = await reader.readuntil(b'\r\n\r\n')
+    except asyncio.IncompleteReadError as error:
+        if len(error.partial) == 0:
+            return None
+        raise HttpError("Connection closed in message head")
+    except asyncio.LimitOverrunError:
+        raise HttpError("Message head too large")
+
+    lines = head[:-4].decode('latin1').split('\r\n')
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+    return head, lines[0], headers
+
+
+async def relay_body(reader, writer, headers, has_body=True):
+    """
+    Relays body of an HTTP message from reader to writer, as it arrives so streamed responses
+    reach clients without delay.
+
+    Returns:
+        bool: True if connection can be reused, False if body ended by connection closing.
+    """
+    if not has_body:
+        return True
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        while True:
+            size_line = await reader.readuntil(b'\r\n')
+            writer.write(size_line)
+            size = int(size_line.split(b';')[0], 16)
+            if size == 0:
+                # Trailers end with a blank line
+                while True:
+                    line = await reader.readuntil(b'\r\n')
+                    writer.write(line)
+                    if line == b'\r\n':
+                        break
+                await writer.drain()
+                return True
+            writer.write(await reader.readexactly(size + 2))
+            await writer.drain()
+    if 'content-length' in headers:
+        remaining = int(headers['content-length'])
+        while remaining > 0:
+            data = await reader.read(min(remaining, RELAY_CHUNK))
+            if len(data) == 0:
+                raise HttpError("Connection closed in message body")
+            writer.write(data)
+            remaining -= len(data)
+        await writer.drain()
+        return True
+    while True:
+        data = await reader.read(RELAY_CHUNK)
+        if len(data) == 0:
+            return False
+        writer.write(data)
+        await writer.drain()
+
+
+class Router:
+    """
+    Forwards each request to the worker owning the game named by its game query parameter, keeping
+    one connection to each worker per client connection.
+
+    Args:
+        ports (List): Local port of each worker, in shard order.
+    """
+
+    def __init__(self, ports):
+        self.ports = ports
+
+    async def handle(self, reader, writer):
+        upstreams = {}
+        try:
+            while True:
+                message = await read_head(reader)
+                if message is None:
+                    break
+                head, request_line, headers = message
+                method, target = request_line.split(' ', 2)[:2]
+                if 'content-length' in headers:
+                    body = await reader.readexactly(int(headers['content-length']))
+                elif headers.get('transfer-encoding', '').lower() == 'chunked':
+                    raise HttpError("Chunked requests are not supported")
+                else:
+                    body = b''
+
+                url = urlsplit(target)
+                if method == 'GET' and url.path == '/metrics':
+                    body = (await self.collect_metrics()).encode()
+                    writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n'
+                                 b'Content-Length: %d\r\n\r\n%s' % (len(body), body))
+                    await writer.drain()
+                    continue
+
+                game = parse_qs(url.query).get('game', [DEFAULT_GAME])[0]
+                shard = shard_of(game, len(self.ports))
+                keep_alive = await self.forward(upstreams, shard, head + body, method, writer)
+                if not keep_alive or headers.get('connection', '').lower() == 'close':
+                    break
+        except (HttpError, ValueError, asyncio.IncompleteReadError, ConnectionError) as error:
+            if not writer.is_closing():
+                message = str(error).encode()
+                writer.write(b'HTTP/1.1 502 Bad Gateway\r\nContent-Type: text/plain\r\n'
+                             b'Content-Length: %d\r\nConnection: close\r\n\r\n%s' % (len(message), message))
+        finally:
+            for _, upstream_writer in upstreams.values():
+                upstream_writer.close()
+            writer.close()
+
+    async def collect_metrics(self):
+        """
+        Fetches metrics of every worker, merged with each worker's samples labelled with its index.
+        """
+        async def fetch(port):
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            try:
+                writer.write(b'GET /metrics HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n\r\n')
+                response = await reader.read()
+            finally:
+                writer.close()
+            return response.partition(b'\r\n\r\n')[2].decode()
+
+        return merge_expositions(await asyncio.gather(*(fetch(port) for port in self.ports)), 'shard')
+
+    async def forward(self, upstreams, shard, request, method, writer):
+        """
+        Sends request to worker and relays its response.
+
+        Returns:
+            bool: True if client connection can be reused.
+        """
+        # A kept connection may have been closed by the worker since it was last used, in which
+        # case the request is sent again on a new connection
+        for attempt in range(2):
+            if shard not in upstreams:
+                upstreams[shard] = await asyncio.open_connection('127.0.0.1', self.ports[shard], limit=MAX_HEAD)
+            upstream_reader, upstream_writer = upstreams[shard]
+            try:
+                upstream_writer.write(request)
+                await upstream_writer.drain()
+                message = await read_head(upstream_reader)
+            except ConnectionError:
+                message = None
+            if message is not None:
+                break
+            upstream_writer.close()
+            del upstreams[shard]
+        else:
+            raise HttpError("Worker closed connection")
+
+        head, status_line, headers = message
+        writer.write(head)
+        status = int(status_line.split(' ', 2)[1])
+        has_body = method != 'HEAD' and status >= 200 and status not in [204, 304]
+        reusable = await relay_body(upstream_reader, writer, headers, has_body)
+        if not reusable or headers.get('connection', '').lower() == 'close':
+            upstream_writer.close()
+            del upstreams[shard]
+            return reusable
+        return True
+
+
+def run_router(ports, host, port, reuse_port):
+    """
+    Runs a router. Several router processes can share a port through SO_REUSEPORT, which has the
+    kernel spread connections between them.
+    """
+    async def serve():
+        server = await asyncio.start_server(Router(ports).handle, host, port, limit=MAX_HEAD, reuse_port=reuse_port)
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(serve())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs game server as several processes, sharded by game")
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--routers', type=int, default=1, help="Router processes, more than 1 needs SO_REUSEPORT")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--storage', default=os.environ.get('CHESS_STORAGE', DEFAULT_DATABASE),
+                        help="Database path, each worker uses its own file named after it, or none")
+    args = parser.parse_args()
+    if args.routers > 1 and not hasattr(socket, 'SO_REUSEPORT'):
+        parser.error("--routers above 1 needs SO_REUSEPORT, which this platform doesn't have")
+
+    # Spawned, so workers don't inherit anything imported by this process
+    context = multiprocessing.get_context('spawn')
+    port_queue = context.Queue()
+    processes = [context.Process(target=run_worker, args=(index, args.storage, port_queue), daemon=True)
+                 for index in range(args.workers)]
+    for process in processes:
+        process.start()
+    ports = [0] * args.workers
+    for _ in range(args.workers):
+        index, port = port_queue.get()
+        ports[index] = port
+
+    reuse_port = args.routers > 1
+    routers = [context.Process(target=run_router, args=(ports, args.host, args.port, reuse_port), daemon=True)
+               for _ in range(args.routers - 1)]
+    for router in routers:
+        router.start()
+    print(f"Serving on {args.host}:{args.port} with {args.workers} workers and {args.routers} routers", flush=True)
+    # Stopping server (with Ctrl+C or SIGTERM) stops workers and routers too, waiting for workers
+    # to close their databases
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        run_router(ports, args.host, args.port, reuse_port)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes + routers:
+            process.terminate()
+        for process in processes + routers:
+            process.join(SHUTDOWN_TIMEOUT)
+            if process.is_alive():
+                process.kill()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+# Fan-out of a game's moves to spectators of the Flask server as server-sent events, so spectators
+# are sent moves as they are played rather than each polling the server. Each move is encoded once
+# into the game's channel, a ring of the most recent events that every spectator reads from at its
+# own position. A spectator that falls further behind than the ring holds (e.g a slow connection)
+# skips the moves it missed and is sent a snapshot of the current position instead, so no
+# spectator holds more than the ring's worth of moves. Spectators joining a game in progress are
+# sent a snapshot of the position and the most recent moves.
+
+import threading
+from json import dumps
+from notation import board_to_fen
+
+# Most recent moves kept for each game, the furthest a spectator can fall behind before it is resynced
+TAIL_LENGTH = 256
+
+# Time after which a comment is sent to an idle spectator, so connections that have gone away are noticed
+KEEPALIVE_INTERVAL = 15
+
+
+def encode_event(event, data, event_id=None):
+    """
+    Encodes a server-sent event.
+
+    Args:
+        event (string): Event type.
+        data (Dict): Data of event, sent as JSON.
+        event_id (string, optional): Id sent back by reconnecting clients in Last-Event-ID header.
+
+    Returns:
+        bytes: Encoded event.
+    """
+    lines = f"event: {event}\n"
+    if event_id is not None:
+        lines += f"id: {event_id}\n"
+    return f"{lines}data: {dumps(data)}\n\n".encode()
+
+
+class Channel:
+    """
+    Moves of one game, read by its spectators.
+
+    Args:
+        record (string): Record id of game, used in event ids so ids from another game aren't resumed.
+        board (Board): Board of game, its position is the channel's starting snapshot.
+        tail_length (int, optional): Most recent moves kept.
+    """
+
+    def __init__(self, record, board, tail_length=TAIL_LENGTH):
+        self.record = record
+        self.tail_length = tail_length
+        self.condition = threading.Condition()
+
+        # Move event of ply p is kept in tail[p % tail_length] until tail_length more moves are played
+        self.tail = [None] * tail_length
+        self.moves = [None] * tail_length
+        self.ply = board.turn
+        self.fen = board_to_fen(board)
+        self.winner = board.winner
+        self.closed = False
+        self.spectators = 0
+
+    def publish(self, player, move, board):
+        """
+        Sends a move to spectators. Called with game's lock held, so moves are published in order.
+
+        Args:
+            player (string literal): Player BLACK/WHITE who played move.
+            move (List): Move [start_pos, end_pos] as posted by player.
+            board (Board): Board of game, with move played.
+        """
+        fen = board_to_fen(board)
+        ply = board.turn - 1
+        data = {'ply': ply, 'player': player, 'move': move, 'fen': fen, 'winner': board.winner}
+        event = encode_event('move', data, f"{self.record}:{ply}")
+        with self.condition:
+            self.tail[ply % self.tail_length] = event
+            self.moves[ply % self.tail_length] = {'ply': ply, 'player': player, 'move': move}
+            self.ply = ply + 1
+            self.fen = fen
+            self.winner = board.winner
+            self.condition.notify_all()
+
+    def close(self):
+        """
+        Ends game's stream, e.g when game is reset.
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def snapshot(self):
+        """
+        Encodes current position with most recent moves. Must be called with condition held.
+        """
+        start = max(0, self.ply - self.tail_length)
+        moves = [self.moves[ply % self.tail_length] for ply in range(start, self.ply)]
+        data = {'ply': self.ply, 'fen': self.fen, 'winner': self.winner, 'moves': moves}
+        return encode_event('snapshot', data, f"{self.record}:{self.ply - 1}")
+
+    def resume_ply(self, last_event_id):
+        """
+        Finds ply a reconnecting spectator has seen moves up to from its Last-Event-ID header.
+
+        Returns:
+            int: Ply of next move spectator needs, or None if it needs a snapshot.
+        """
+        if last_event_id is None:
+            return None
+        record, _, ply = last_event_id.partition(':')
+        if record != self.record or not ply.lstrip('-').isdigit():
+            return None
+        return int(ply) + 1
+
+    def subscribe(self, last_event_id=None, keepalive_interval=KEEPALIVE_INTERVAL):
+        """
+        Streams game to a spectator, until game is closed or spectator disconnects.
+
+        Args:
+            last_event_id (string, optional): Id of last event spectator was sent, if reconnecting.
+
+        Yields:
+            bytes: Encoded events.
+        """
+        with self.condition:
+            self.spectators += 1
+        try:
+            with self.condition:
+                cursor = self.resume_ply(last_event_id)
+                if cursor is None or not self.ply - self.tail_length <= cursor <= self.ply:
+                    cursor = self.ply
+                    pending = [self.snapshot()]
+                else:
+                    pending = []
+            while True:
+                if pending:
+                    yield b''.join(pending)
+                with self.condition:
+                    if self.ply == cursor and not self.closed:
+                        self.condition.wait(keepalive_interval)
+                    if self.ply - cursor > self.tail_length:
+                        # Moves missed are no longer kept, spectator resyncs from current position
+                        pending = [self.snapshot()]
+                    else:
+                        pending = [self.tail[ply % self.tail_length] for ply in range(cursor, self.ply)]
+                    cursor = self.ply
+                    closed = self.closed
+                if closed:
+                    pending.append(encode_event('end', {'ply': cursor}))
+                    yield b''.join(pending)
+                    return
+                if not pending:
+                    pending = [b': keepalive\n\n']
+        finally:
+            with self.condition:
+                self.spectators -= 1
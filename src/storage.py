@@ -0,0 +1,272 @@
+# Persistent storage of the Flask server's games, so games in progress survive the server restarting
+# and finished games are kept. Each game is stored under a record id of its own, as the name clients
+# know a game by is reused once the game is finished. Moves are journaled to SQLite in WAL mode by a
+# writer thread, which commits waiting moves together (group commit), so concurrent requests share
+# one commit rather than each paying for its own.
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+DEFAULT_DATABASE = 'games.db'
+
+# Most writes committed in one transaction, and how long the writer waits for more writes to join a
+# transaction once it has one, in seconds. With no wait, a transaction takes the writes queued
+# while the previous one was committing, so batches grow with load without delaying moves
+BATCH_SIZE = 64
+BATCH_INTERVAL = 0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    assigned_white INTEGER NOT NULL DEFAULT 0,
+    assigned_black INTEGER NOT NULL DEFAULT 0,
+    active INTEGER NOT NULL DEFAULT 0,
+    finished INTEGER NOT NULL DEFAULT 0,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS moves (
+    game TEXT NOT NULL,
+    ply INTEGER NOT NULL,
+    player TEXT NOT NULL,
+    start_row INTEGER NOT NULL,
+    start_col INTEGER NOT NULL,
+    end_row INTEGER NOT NULL,
+    end_col INTEGER NOT NULL,
+    time REAL NOT NULL,
+    PRIMARY KEY (game, ply)
+);
+"""
+
+# Statements are kept as constants so sqlite3's statement cache prepares each only once
+SAVE_GAME = """
+INSERT INTO games (id, name, assigned_white, assigned_black, active, updated) VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (id) DO UPDATE SET assigned_white = excluded.assigned_white, assigned_black = excluded.assigned_black,
+    active = excluded.active, updated = excluded.updated
+"""
+APPEND_MOVE = "INSERT INTO moves (game, ply, player, start_row, start_col, end_row, end_col, time) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+FINISH_GAME = "UPDATE games SET active = 0, finished = 1, updated = ? WHERE id = ?"
+SELECT_GAMES = "SELECT id, name, assigned_white, assigned_black, active FROM games WHERE finished = 0 ORDER BY updated"
+SELECT_MOVES = """
+SELECT game, player, start_row, start_col, end_row, end_col FROM moves
+WHERE game IN (SELECT id FROM games WHERE finished = 0) ORDER BY game, ply
+"""
+
+
+class StorageError(Exception):
+    pass
+
+
+class PendingWrite:
+    """ A write queued for the writer thread, done is set once it is committed or has failed. """
+    __slots__ = ['statement', 'parameters', 'done', 'error']
+
+    def __init__(self, statement, parameters):
+        self.statement = statement
+        self.parameters = parameters
+        self.done = threading.Event()
+        self.error = None
+
+
+class NullStore:
+    """
+    Storage that keeps nothing, used when persistence is turned off.
+    """
+
+    def load_games(self):
+        return {}
+
+    def save_game(self, record, name, assigned_white, assigned_black, active):
+        pass
+
+    def append_move(self, record, ply, player, move):
+        pass
+
+    def finish_game(self, record):
+        pass
+
+    def close(self):
+        pass
+
+
+class SqliteStore:
+    """
+    Journals games and their moves to a SQLite database.
+
+    Args:
+        path (string): Path of database file, created if it doesn't exist.
+        batch_size (int, optional): Most writes committed together.
+        batch_interval (float, optional): Time the writer waits for more writes to join a commit.
+        wait (bool, optional): If True, writes return once committed, so a move acknowledged to a
+                                client is never lost. If False, writes return once queued, and
+                                writes not yet committed may be lost in a crash.
+        synchronous (string, optional): SQLite synchronous setting. NORMAL only syncs to disk at
+                                            WAL checkpoints, so committed moves survive the
+                                            server crashing but not the machine losing power.
+    """
+
+    def __init__(self, path=DEFAULT_DATABASE, batch_size=BATCH_SIZE, batch_interval=BATCH_INTERVAL, wait=True,
+                 synchronous='NORMAL'):
+        self.path = path
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.wait = wait
+
+        # Connection is only used by writer thread once it has started
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute(f"PRAGMA synchronous = {synchronous}")
+        self.connection.executescript(SCHEMA)
+
+        self.writes = queue.Queue()
+        self.closed = False
+        self.thread = threading.Thread(target=self.write_batches, daemon=True)
+        self.thread.start()
+
+    def load_games(self):
+        """
+        Reads games that have not finished, e.g to recover them when the server starts.
+
+        Returns:
+            Dict: For each game name, Dict of 'record', 'assigned_white', 'assigned_black', 'active'
+                    and 'moves', a List of (player, move) in the order they were played.
+        """
+        connection = sqlite3.connect(self.path)
+        try:
+            records = {}
+            for record, name, white, black, active in connection.execute(SELECT_GAMES):
+                records[record] = {'name': name, 'record': record, 'assigned_white': bool(white),
+                                   'assigned_black': bool(black), 'active': bool(active), 'moves': []}
+            for record, player, start_row, start_col, end_row, end_col in connection.execute(SELECT_MOVES):
+                records[record]['moves'].append((player, ((start_row, start_col), (end_row, end_col))))
+        finally:
+            connection.close()
+        # Most recently updated game is kept if several unfinished games have the same name
+        return {game.pop('name'): game for game in records.values()}
+
+    def save_game(self, record, name, assigned_white, assigned_black, active):
+        """
+        Creates or updates a game.
+
+        Args:
+            record (string): Record id of game.
+            name (string): Name clients know game by.
+            assigned_white (bool): White player has joined.
+            assigned_black (bool): Black player has joined.
+            active (bool): Game has started.
+        """
+        self.write(SAVE_GAME, (record, name, int(assigned_white), int(assigned_black), int(active), time.time()))
+
+    def append_move(self, record, ply, player, move):
+        """
+        Journals a move.
+
+        Args:
+            record (string): Record id of game move was played in.
+            ply (int): Number of moves played before this one in game.
+            player (string literal): Player BLACK/WHITE who played move.
+            move (Tuple): Move (start_pos, end_pos).
+        """
+        (start_row, start_col), (end_row, end_col) = move
+        self.write(APPEND_MOVE, (record, ply, player, start_row, start_col, end_row, end_col, time.time()))
+
+    def finish_game(self, record):
+        self.write(FINISH_GAME, (time.time(), record))
+
+    def write(self, statement, parameters):
+        """
+        Queues a write for the writer thread.
+
+        Raises:
+            StorageError: Store is closed, or write failed (only if store waits for writes).
+        """
+        if self.closed:
+            raise StorageError("Store is closed")
+        pending = PendingWrite(statement, parameters)
+        self.writes.put(pending)
+        if self.wait:
+            pending.done.wait()
+            if pending.error is not None:
+                raise StorageError(pending.error)
+
+    def write_batches(self):
+        while True:
+            pending = self.writes.get()
+            if pending is None:
+                return
+
+            # Writes already queued, or arriving within batch_interval, share the first's transaction
+            batch = [pending]
+            deadline = time.perf_counter() + self.batch_interval
+            while len(batch) < self.batch_size:
+                try:
+                    remaining = deadline - time.perf_counter()
+                    pending = self.writes.get(timeout=remaining) if remaining > 0 else self.writes.get_nowait()
+                except queue.Empty:
+                    break
+                if pending is None:
+                    self.writes.put(None)
+                    break
+                batch.append(pending)
+            self.commit(batch)
+
+    def commit(self, batch):
+        try:
+            self.execute(batch)
+        except sqlite3.Error as error:
+            if len(batch) == 1:
+                batch[0].error = str(error)
+            else:
+                # One failing write shouldn't fail the others, so each is retried on its own
+                for write in batch:
+                    try:
+                        self.execute([write])
+                    except sqlite3.Error as write_error:
+                        write.error = str(write_error)
+        for write in batch:
+            write.done.set()
+
+    def execute(self, batch):
+        """
+        Executes writes in one transaction, rolling back if any fails.
+        """
+        self.connection.execute("BEGIN")
+        try:
+            # Runs of the same statement are executed together
+            start = 0
+            while start < len(batch):
+                end = start + 1
+                while end < len(batch) and batch[end].statement is batch[start].statement:
+                    end += 1
+                self.connection.executemany(batch[start].statement, [write.parameters for write in batch[start:end]])
+                start = end
+            self.connection.execute("COMMIT")
+        except sqlite3.Error:
+            self.connection.execute("ROLLBACK")
+            raise
+
+    def close(self):
+        """
+        Commits queued writes and closes database.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        self.writes.put(None)
+        self.thread.join()
+        self.connection.close()
+
+
+def open_store(path):
+    """
+    Opens storage at path, or storage that keeps nothing if path is empty or "none".
+    """
+    if path is None or path.lower() in ['', 'none']:
+        return NullStore()
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    return SqliteStore(path)
@@ -0,0 +1,683 @@
+# Endgame tablebases, which store the result of perfect play (win, draw or loss and the number of
+# plies until mate) for every position with a given set of pieces. Tables are generated by
+# retrograde analysis: starting from checkmates, results are worked backwards through the moves
+# that lead to them. Generation follows this library's rules, so there is no castling, en passant or
+# promotion (a pawn on the last row can't move), and games only end by checkmate or stalemate.
+# Generate tables: python3 src/tablebase.py [--pieces 3] [--directory tablebases] [KQvK ...]
+# 3 piece tables take seconds, 4 piece tables take a long time in pure Python.
+
+import argparse
+import itertools
+import mmap
+import os
+from chess import WHITE, BLACK, KING, QUEEN, ROOK, BISHOP, KNIGHT, PAWN, VALUES, RAYS, KNIGHT_TARGETS, \
+    KING_TARGETS, SLIDERS, HORIZONTALS, VERTICALS, DIAGONALS
+
+MAX_PIECES = 4
+DEFAULT_DIRECTORY = 'tablebases'
+FILE_EXTENSION = '.tb'
+
+# Results of a probe, from the perspective of player whose turn it is
+WIN = "Win"
+LOSS = "Loss"
+DRAW = "Draw"
+
+# Each position is stored as one byte: DRAW_VALUE, 1 to MAX_PLIES + 1 for a win in that many plies,
+# LOSS_VALUE + n for a loss in n plies (LOSS_VALUE itself is checkmated) or ILLEGAL_VALUE
+DRAW_VALUE = 0
+LOSS_VALUE = 128
+ILLEGAL_VALUE = 255
+MAX_PLIES = 126
+
+# Order of pieces other than Kings in material keys, e.g KQRvK
+PIECE_ORDER = [QUEEN, ROOK, BISHOP, KNIGHT, PAWN]
+
+COLOUR_INDEX = {WHITE: 0, BLACK: 1}
+OTHER = {WHITE: BLACK, BLACK: WHITE}
+PAWN_DIRECTION = {WHITE: 1, BLACK: -1}
+PAWN_START_ROW = {WHITE: 1, BLACK: 6}
+
+# Rows a pawn can be on, as pawns never move backwards (and are never promoted)
+PAWN_ROWS = {WHITE: range(1, 8), BLACK: range(0, 7)}
+
+
+def square(pos):
+    return pos[0] * 8 + pos[1]
+
+
+# Tables of squares 0 to 63 (row * 8 + col), built from chess's tables of positions
+KNIGHT_SQUARES = [frozenset(square(pos) for pos in KNIGHT_TARGETS[divmod(sq, 8)]) for sq in range(64)]
+KING_SQUARES = [frozenset(square(pos) for pos in KING_TARGETS[divmod(sq, 8)]) for sq in range(64)]
+SLIDER_RAYS = {piece_type: [[tuple(square(pos) for pos in RAYS[divmod(sq, 8)][direction]) for direction in directions]
+                            for sq in range(64)]
+               for piece_type, directions in [(ROOK, HORIZONTALS + VERTICALS), (BISHOP, DIAGONALS),
+                                              (QUEEN, HORIZONTALS + VERTICALS + DIAGONALS)]}
+PAWN_ATTACKS = {colour: [frozenset(square((sq // 8 + PAWN_DIRECTION[colour], sq % 8 + side)) for side in [-1, 1]
+                                   if 0 <= sq // 8 + PAWN_DIRECTION[colour] < 8 and 0 <= sq % 8 + side < 8)
+                         for sq in range(64)]
+                for colour in [WHITE, BLACK]}
+
+
+def build_lines():
+    """
+    Precomputes, for every pair of squares on the same row, column or diagonal, the slider types
+    that can move between them and the squares in between.
+
+    Returns:
+        List: Indexed by square, of dicts keyed by square of (slider types, squares in between).
+    """
+    lines = [{} for _ in range(64)]
+    for sq in range(64):
+        for direction, ray in RAYS[divmod(sq, 8)].items():
+            for distance, pos in enumerate(ray):
+                lines[sq][square(pos)] = (SLIDERS[direction], tuple(square(between) for between in ray[:distance]))
+    return lines
+
+
+LINES = build_lines()
+
+
+def build_transforms():
+    """
+    Builds the 8 symmetries of the board (rotations and reflections) as Lists mapping each square
+    to its image. Identity and reflection in the centre column come first, they are the only
+    symmetries of positions with pawns.
+    """
+    transforms = []
+    for transpose, flip_row, flip_col in [(False, False, False), (False, False, True), (False, True, False),
+                                          (False, True, True), (True, False, False), (True, False, True),
+                                          (True, True, False), (True, True, True)]:
+        transform = []
+        for sq in range(64):
+            row, col = divmod(sq, 8)
+            if transpose:
+                row, col = col, row
+            if flip_row:
+                row = 7 - row
+            if flip_col:
+                col = 7 - col
+            transform.append(row * 8 + col)
+        transforms.append(transform)
+    return transforms
+
+
+TRANSFORMS = build_transforms()
+
+# Squares White's King is moved into by symmetry, a triangle of 10 squares without pawns and half
+# the board with pawns
+PAWNLESS_REGION = [row * 8 + col for row in range(4) for col in range(4) if row <= col]
+PAWN_REGION = [row * 8 + col for row in range(8) for col in range(4)]
+
+
+def material_key(pieces):
+    """
+    Builds key of material, e.g KRvKN, from (colour, type) of each piece.
+    """
+    parts = []
+    for colour in [WHITE, BLACK]:
+        types = sorted((piece_type for piece_colour, piece_type in pieces if piece_colour == colour and piece_type != KING),
+                       key=PIECE_ORDER.index)
+        parts.append(KING + ''.join(types))
+    return 'v'.join(parts)
+
+
+def side_strength(key_part):
+    return len(key_part), sorted((VALUES[piece_type] for piece_type in key_part), reverse=True)
+
+
+def is_canonical(key):
+    """
+    Determines if tables are stored for key, which are those where White has at least as much
+    material as Black. Positions with more Black material are looked up with colours swapped.
+    """
+    white, black = key.split('v')
+    return side_strength(white) >= side_strength(black)
+
+
+class Material:
+    """
+    Layout of the table for a set of pieces. Positions are indexed by player whose turn it is, the
+    square of White's King (moved into the region by symmetry) and the squares of the other pieces.
+    Of the positions related by symmetry or by swapping identical pieces, the one with the lowest
+    index is used.
+    """
+
+    def __init__(self, key):
+        self.key = key
+        white, black = key.split('v')
+        self.pieces = [(WHITE, KING), (BLACK, KING)] + [(WHITE, piece_type) for piece_type in white[1:]] + \
+                      [(BLACK, piece_type) for piece_type in black[1:]]
+        self.has_pawns = PAWN in key
+        self.transforms = TRANSFORMS[:2] if self.has_pawns else TRANSFORMS
+        self.region = PAWN_REGION if self.has_pawns else PAWNLESS_REGION
+        self.region_index = {sq: index for index, sq in enumerate(self.region)}
+        self.positions = len(self.region) * 64 ** (len(self.pieces) - 1)
+        self.size = 2 * self.positions
+
+        # Ranges of identical pieces, whose squares are sorted so swapping them gives the same index
+        self.groups = []
+        start = 0
+        for _, group in itertools.groupby(self.pieces):
+            length = len(list(group))
+            if length > 1:
+                self.groups.append((start, start + length))
+            start += length
+
+    def index(self, turn, squares):
+        """
+        Index of position.
+
+        Args:
+            turn (string literal): Player BLACK/WHITE whose turn it is.
+            squares (List): Square of each piece, in the order of self.pieces.
+
+        Returns:
+            int: Index of position in table.
+        """
+        best = None
+        for transform in self.transforms:
+            region_index = self.region_index.get(transform[squares[0]])
+            if region_index is None:
+                continue
+            transformed = [transform[sq] for sq in squares]
+            for start, end in self.groups:
+                transformed[start:end] = sorted(transformed[start:end])
+            index = COLOUR_INDEX[turn] * len(self.region) + region_index
+            for sq in transformed[1:]:
+                index = index * 64 + sq
+            if best is None or index < best:
+                best = index
+        return best
+
+    def decode(self, index):
+        """
+        Position at index, the inverse of index() for positions stored at their own index.
+
+        Returns:
+            Tuple: Player whose turn it is and List of squares of pieces.
+        """
+        squares = [0] * len(self.pieces)
+        for piece_index in range(len(self.pieces) - 1, 0, -1):
+            index, squares[piece_index] = divmod(index, 64)
+        turn_index, region_index = divmod(index, len(self.region))
+        squares[0] = self.region[region_index]
+        return (WHITE if turn_index == 0 else BLACK), squares
+
+    def is_valid(self, turn, squares):
+        """
+        Determines if position could occur in a game: pieces are on different squares, pawns are on
+        rows they can reach, and player who has just moved is not in check.
+        """
+        if len(set(squares)) != len(squares):
+            return False
+        for (colour, piece_type), sq in zip(self.pieces, squares):
+            if piece_type == PAWN and sq // 8 not in PAWN_ROWS[colour]:
+                return False
+        opponent = OTHER[turn]
+        return not self.is_attacked(squares[COLOUR_INDEX[opponent]], turn, squares, set(squares))
+
+    def is_attacked(self, sq, colour, squares, occupied, captured=None):
+        """
+        Determines if sq is attacked by any of colour's pieces, other than the piece at index captured.
+        """
+        for piece_index, ((piece_colour, piece_type), attacker) in enumerate(zip(self.pieces, squares)):
+            if piece_colour != colour or piece_index == captured:
+                continue
+            if piece_type == KING:
+                if sq in KING_SQUARES[attacker]:
+                    return True
+            elif piece_type == KNIGHT:
+                if sq in KNIGHT_SQUARES[attacker]:
+                    return True
+            elif piece_type == PAWN:
+                if sq in PAWN_ATTACKS[colour][attacker]:
+                    return True
+            else:
+                line = LINES[attacker].get(sq)
+                if line is not None and piece_type in line[0] and not any(between in occupied for between in line[1]):
+                    return True
+        return False
+
+    def targets(self, piece_index, squares, occupied):
+        """
+        Squares piece can move to, ignoring whether it leaves its King in check.
+
+        Args:
+            piece_index (int): Index of piece in self.pieces.
+            squares (List): Square of each piece.
+            occupied (Dict): Index of piece on each occupied square.
+
+        Returns:
+            List: Squares piece can move to, including captures.
+        """
+        colour, piece_type = self.pieces[piece_index]
+        sq = squares[piece_index]
+        targets = []
+        if piece_type == PAWN:
+            row = sq // 8 + PAWN_DIRECTION[colour]
+            if 0 <= row < 8:
+                forward = sq + 8 * PAWN_DIRECTION[colour]
+                if forward not in occupied:
+                    targets.append(forward)
+                    double = forward + 8 * PAWN_DIRECTION[colour]
+                    if sq // 8 == PAWN_START_ROW[colour] and double not in occupied:
+                        targets.append(double)
+                targets.extend(target for target in PAWN_ATTACKS[colour][sq] if target in occupied)
+        elif piece_type == KING:
+            targets.extend(KING_SQUARES[sq])
+        elif piece_type == KNIGHT:
+            targets.extend(KNIGHT_SQUARES[sq])
+        else:
+            for ray in SLIDER_RAYS[piece_type][sq]:
+                for target in ray:
+                    targets.append(target)
+                    if target in occupied:
+                        break
+        return [target for target in targets if target not in occupied or self.pieces[occupied[target]][0] != colour]
+
+    def legal_moves(self, turn, squares):
+        """
+        Finds every legal move of player whose turn it is.
+
+        Returns:
+            List: Tuples (piece index, target square, index of captured piece or None).
+        """
+        occupied = {sq: piece_index for piece_index, sq in enumerate(squares)}
+        king_index = COLOUR_INDEX[turn]
+        opponent = OTHER[turn]
+        moves = []
+        for piece_index, (colour, _) in enumerate(self.pieces):
+            if colour != turn:
+                continue
+            for target in self.targets(piece_index, squares, occupied):
+                captured = occupied.get(target)
+                if captured is not None and self.pieces[captured][1] == KING:
+                    continue
+                moved = list(squares)
+                moved[piece_index] = target
+                moved_occupied = set(moved)
+                if captured is not None:
+                    moved_occupied.add(target)
+                if not self.is_attacked(moved[king_index], opponent, moved, moved_occupied, captured):
+                    moves.append((piece_index, target, captured))
+        return moves
+
+    def unmoves(self, turn, squares):
+        """
+        Finds positions that lead to this one by a move that isn't a capture, i.e undoes each move
+        the player who has just moved could have made.
+
+        Returns:
+            List: Indexes of previous positions.
+        """
+        mover = OTHER[turn]
+        occupied = {sq: piece_index for piece_index, sq in enumerate(squares)}
+        previous = []
+        for piece_index, (colour, piece_type) in enumerate(self.pieces):
+            if colour != mover:
+                continue
+            sq = squares[piece_index]
+            if piece_type == PAWN:
+                direction = PAWN_DIRECTION[colour]
+                origins = []
+                back = sq - 8 * direction
+                if sq // 8 - direction in PAWN_ROWS[colour] and back not in occupied:
+                    origins.append(back)
+                    if sq // 8 - 2 * direction == PAWN_START_ROW[colour] and back - 8 * direction not in occupied:
+                        origins.append(back - 8 * direction)
+            else:
+                # Moves of other pieces are reversible, so origins are the empty squares it could move to
+                origins = [target for target in self.targets(piece_index, squares, occupied) if target not in occupied]
+
+            for origin in origins:
+                moved = list(squares)
+                moved[piece_index] = origin
+                # Player whose turn it is now can't have been left in check by their own move
+                if not self.is_attacked(moved[COLOUR_INDEX[turn]], mover, moved, set(moved)):
+                    previous.append(self.index(mover, moved))
+        return previous
+
+
+def canonical(pieces, turn):
+    """
+    Finds table and index of position, swapping colours (and flipping board vertically) if Black has
+    more material than White.
+
+    Args:
+        pieces (List): Tuples (colour, type, square) of every piece.
+        turn (string literal): Player BLACK/WHITE whose turn it is.
+
+    Returns:
+        Tuple: Material key of table and index of position in it.
+    """
+    key = material_key([(colour, piece_type) for colour, piece_type, _ in pieces])
+    if not is_canonical(key):
+        pieces = [(OTHER[colour], piece_type, sq ^ 56) for colour, piece_type, sq in pieces]
+        turn = OTHER[turn]
+        white, black = key.split('v')
+        key = black + 'v' + white
+
+    material = get_material(key)
+    remaining = list(pieces)
+    squares = []
+    for piece in material.pieces:
+        for position, (colour, piece_type, sq) in enumerate(remaining):
+            if (colour, piece_type) == piece:
+                squares.append(sq)
+                del remaining[position]
+                break
+    return key, material.index(turn, squares)
+
+
+MATERIALS = {}
+
+
+def get_material(key):
+    if key not in MATERIALS:
+        MATERIALS[key] = Material(key)
+    return MATERIALS[key]
+
+
+def decode_value(value):
+    """
+    Converts stored byte into (result, plies) for player whose turn it is, or None if illegal.
+    """
+    if value == ILLEGAL_VALUE:
+        return None
+    if value == DRAW_VALUE:
+        return DRAW, 0
+    if value >= LOSS_VALUE:
+        return LOSS, value - LOSS_VALUE
+    return WIN, value
+
+
+def result_value(result, plies):
+    if result == WIN:
+        return plies
+    if result == LOSS:
+        return LOSS_VALUE + plies
+    return DRAW_VALUE
+
+
+def generate(key, tables):
+    """
+    Generates table for material key by retrograde analysis.
+
+    Args:
+        key (string): Canonical material key, e.g KQvK.
+        tables (Dict): Tables already generated, keyed by material key, which must include every
+                        table reachable by a capture.
+
+    Raises:
+        ValueError: A position takes more than MAX_PLIES to be mated.
+
+    Returns:
+        bytearray: Value of every position.
+    """
+    material = get_material(key)
+    values = bytearray(material.size)
+    known = bytearray(material.size)
+
+    # buckets[n] holds (index, value) of positions whose result is reached in n plies, positions are
+    # only known once their bucket is reached, as a shorter result may be found first
+    buckets = [[] for _ in range(MAX_PLIES + 2)]
+    aliases = []
+
+    def child_value(turn, squares, piece_index, target, captured):
+        """ Value of position after move for player whose turn it then is, or None if not yet known. """
+        moved = list(squares)
+        moved[piece_index] = target
+        if captured is None:
+            child = material.index(OTHER[turn], moved)
+            return values[child] if known[child] else None
+
+        pieces = [(colour, piece_type, sq) for index, ((colour, piece_type), sq) in enumerate(zip(material.pieces, moved))
+                  if index != captured]
+        if len(pieces) == 2:
+            return DRAW_VALUE
+        child_key, child = canonical(pieces, OTHER[turn])
+        return tables[child_key][child]
+
+    def resolve(turn, squares):
+        """
+        Works out result of position from the results of its moves that are known.
+
+        Returns:
+            int: Value of position, or None if not yet known.
+        """
+        best_win = None
+        longest_loss = 0
+        unknown = False
+        moves = material.legal_moves(turn, squares)
+        if len(moves) == 0:
+            in_check = material.is_attacked(squares[COLOUR_INDEX[turn]], OTHER[turn], squares, set(squares))
+            return LOSS_VALUE if in_check else DRAW_VALUE
+
+        for move in moves:
+            value = child_value(turn, squares, *move)
+            if value is None:
+                unknown = True
+                continue
+            result, plies = decode_value(value)
+            if result == LOSS:
+                best_win = plies + 1 if best_win is None else min(best_win, plies + 1)
+            elif result == WIN:
+                longest_loss = max(longest_loss, plies + 1)
+            else:
+                unknown = True
+
+        if best_win is not None:
+            return best_win
+        if unknown:
+            return None
+        return LOSS_VALUE + longest_loss
+
+    def push(index, value):
+        plies = decode_value(value)[1]
+        if plies > MAX_PLIES:
+            raise ValueError(f"{key} has positions lasting longer than {MAX_PLIES} plies")
+        buckets[plies].append((index, value))
+
+    for index in range(material.size):
+        turn, squares = material.decode(index)
+        if not material.is_valid(turn, squares):
+            values[index], known[index] = ILLEGAL_VALUE, 1
+            continue
+        if material.index(turn, squares) != index:
+            aliases.append(index)
+            continue
+
+        # Positions decided by captures or with no moves are known straight away, others are found
+        # from their moves once those are known
+        value = resolve(turn, squares)
+        if value == DRAW_VALUE:
+            known[index] = 1
+        elif value is not None:
+            push(index, value)
+
+    for plies in range(len(buckets)):
+        for index, value in buckets[plies]:
+            if known[index]:
+                continue
+            values[index], known[index] = value, 1
+            turn, squares = material.decode(index)
+            for parent in material.unmoves(turn, squares):
+                if known[parent]:
+                    continue
+                if value >= LOSS_VALUE:
+                    push(parent, plies + 1)
+                else:
+                    parent_value = resolve(*material.decode(parent))
+                    if parent_value is not None and parent_value != DRAW_VALUE:
+                        push(parent, parent_value)
+        buckets[plies] = None
+
+    # Positions that are never decided are draws, values of those stored at their own index are
+    # already DRAW_VALUE
+    for index in aliases:
+        turn, squares = material.decode(index)
+        values[index] = values[material.index(turn, squares)]
+    return values
+
+
+def all_keys(pieces):
+    """
+    Canonical material keys of every table with pieces pieces, e.g KQvK for 3 pieces.
+    """
+    keys = set()
+    for others in itertools.combinations_with_replacement(PIECE_ORDER, pieces - 2):
+        for white_count in range(len(others) + 1):
+            for white in itertools.combinations(others, white_count):
+                black = list(others)
+                for piece_type in white:
+                    black.remove(piece_type)
+                key = material_key([(WHITE, piece_type) for piece_type in white] + [(BLACK, piece_type) for piece_type in black])
+                if is_canonical(key):
+                    keys.add(key)
+    return sorted(keys, key=lambda key: (len(key), key))
+
+
+def subtable_keys(key):
+    """
+    Canonical material keys of tables reached by one capture from key, except KvK.
+    """
+    material = get_material(key)
+    keys = set()
+    for captured in range(2, len(material.pieces)):
+        remaining = [piece for index, piece in enumerate(material.pieces) if index != captured]
+        if len(remaining) > 2:
+            child_key = material_key(remaining)
+            if not is_canonical(child_key):
+                white, black = child_key.split('v')
+                child_key = black + 'v' + white
+            keys.add(child_key)
+    return keys
+
+
+class Tablebase:
+    """
+    Memory mapped tables found in a directory, opened the first time they are needed. Pickling a
+    Tablebase (e.g passing it to a worker process) opens the same directory when unpickled.
+    """
+
+    def __init__(self, directory=DEFAULT_DIRECTORY):
+        self.directory = directory
+        self.tables = {}
+
+    def __reduce__(self):
+        return Tablebase, (self.directory,)
+
+    def path(self, key):
+        return os.path.join(self.directory, key + FILE_EXTENSION)
+
+    def table(self, key):
+        if key not in self.tables:
+            table = None
+            path = self.path(key)
+            if os.path.exists(path):
+                with open(path, 'rb') as file:
+                    table = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.tables[key] = table
+        return self.tables[key]
+
+    def close(self):
+        for table in self.tables.values():
+            if table is not None:
+                table.close()
+        self.tables = {}
+
+    def probe(self, board):
+        """
+        Finds result of perfect play from position on board.
+
+        Args:
+            board (Board): Instance of Board class that contains all information about the current
+                            state of game.
+
+        Returns:
+            Tuple: (WIN/LOSS/DRAW for player whose turn it is, plies until mate or 0 for DRAW), or
+                    None if there is no table for the pieces on board.
+        """
+        pieces = [(piece.get_colour(), piece.get_type(), square(piece.get_pos()))
+                  for colour in [WHITE, BLACK] for piece in board.get_pieces(colour)]
+        if len(pieces) > MAX_PIECES:
+            return None
+        if len(pieces) == 2:
+            return DRAW, 0
+
+        key, index = canonical(pieces, board.whose_turn())
+        table = self.table(key)
+        if table is None:
+            return None
+        return decode_value(table[index])
+
+    def best_move(self, board):
+        """
+        Finds move that wins fastest, keeps a draw, or loses slowest.
+
+        Args:
+            board (Board): Instance of Board class, which is returned to its original state.
+
+        Returns:
+            Tuple: Move (start_pos, end_pos) and (result, plies) of position for player whose turn
+                    it is, or None if position is not in tablebase or game is over.
+        """
+        current = self.probe(board)
+        if current is None or board.winner is not None:
+            return None
+
+        best_move, best_rank = None, None
+        for move in board.legal_moves():
+            board.move_piece(*move[0], *move[1])
+            try:
+                child = self.probe(board)
+            finally:
+                board.undo_move()
+            if child is None:
+                continue
+
+            # Ranked so the highest rank is best, i.e opponent's quickest loss, then draw, then
+            # opponent's slowest win
+            result, plies = child
+            rank = {LOSS: (2, -plies), DRAW: (1, 0), WIN: (0, plies)}[result]
+            if best_rank is None or rank > best_rank:
+                best_move, best_rank = move, rank
+        return None if best_move is None else (best_move, current)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generates endgame tablebases")
+    parser.add_argument('keys', nargs='*', help="Material keys, e.g KQvK, defaults to every table with --pieces pieces")
+    parser.add_argument('--pieces', type=int, default=3, choices=range(3, MAX_PIECES + 1))
+    parser.add_argument('--directory', default=DEFAULT_DIRECTORY)
+    args = parser.parse_args()
+
+    os.makedirs(args.directory, exist_ok=True)
+    tablebase = Tablebase(args.directory)
+    keys = args.keys if len(args.keys) > 0 else [key for pieces in range(3, args.pieces + 1) for key in all_keys(pieces)]
+
+    def build(key):
+        if not is_canonical(key):
+            raise ValueError(f"{key} has more Black than White material, generate the colour swapped table")
+        for subtable_key in subtable_keys(key):
+            build(subtable_key)
+        if tablebase.table(key) is not None:
+            return
+        values = generate(key, {subtable_key: tablebase.table(subtable_key) for subtable_key in subtable_keys(key)})
+
+        # Written to temporary file first, so readers never map a partially written table
+        temporary_path = tablebase.path(key) + '.tmp'
+        with open(temporary_path, 'wb') as file:
+            file.write(values)
+        os.replace(temporary_path, tablebase.path(key))
+        del tablebase.tables[key]
+        longest = max((value if value < LOSS_VALUE else value - LOSS_VALUE) for value in values if value != ILLEGAL_VALUE)
+        print(f"{key}: {len(values)} positions, longest mate {longest} plies")
+
+    for key in keys:
+        build(key)
+    tablebase.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,5 @@
 import os
-from chess import Board, in_bounds, ROW, COL, STALEMATE
+from chess import Board, in_bounds, ROW, COL, STALEMATE, DRAW
 
 def clear_console():
     command = 'clear'
@@ -70,5 +70,7 @@ if __name__ == '__main__':
 
     if b.winner == STALEMATE:
         print("Stalemate!!")
+    elif b.winner == DRAW:
+        print(f"Draw by {b.draw_claim().lower()}")
     else:
         print(f"Congrats {b.winner}, you win!!!")
\ No newline at end of file
@@ -0,0 +1,425 @@
+# Engine against engine tournaments, used to measure whether a change makes the engine stronger.
+# Games are played in parallel worker processes, results are appended to a JSONL file as each game
+# finishes, and the Elo difference between the engines is estimated with error bars. A sequential
+# probability ratio test (SPRT) stops the tournament as soon as the result is statistically clear.
+# Run from root of repository, e.g to test quiescence search against no quiescence search:
+#   python3 src/tournament.py --engine new --engine old:quiescence=0 --games 1000 --tc 10+0.1
+# Engines may also be UCI programs, e.g an older checkout: --engine "old:cmd=python3 ../old/src/uci.py"
+
+import argparse
+import json
+import math
+import multiprocessing
+import random
+import shlex
+import subprocess
+import time
+from chess import WHITE, BLACK, STALEMATE, DRAW
+from notation import STARTING_FEN, board_from_fen, board_to_fen, move_to_uci, parse_move, parse_uci, read_games
+from ordering import MoveOrderer
+from search import Search
+from transposition import TranspositionTable
+
+# Games reaching this many plies are adjudicated as draws. Board ends drawn games by threefold
+# repetition and the fifty-move rule itself, so this is only a cap on the length of a game
+MAX_PLIES = 300
+
+# Number of random moves from start in generated openings
+OPENING_PLIES = 4
+
+# Fraction of remaining clock time spent on a move, and fraction of increment
+TIME_FRACTION = 1 / 30
+INCREMENT_FRACTION = 0.8
+
+# Result of game for White
+WHITE_WIN = "1-0"
+BLACK_WIN = "0-1"
+DRAWN = "1/2-1/2"
+
+
+def parse_engine(text):
+    """
+    Parses engine given as "name[:option=value,...]". Options are depth, nodes, movetime (seconds,
+    overrides time control), quiescence (0 or 1), hash (transposition table entries) and cmd (command
+    to run a UCI engine instead of the built in one, which can't contain commas).
+
+    Returns:
+        Dict: 'name' and 'options' of engine.
+    """
+    name, _, options_text = text.partition(':')
+    options = {}
+    for option in filter(None, options_text.split(',')):
+        key, _, value = option.partition('=')
+        options[key] = value if key == 'cmd' else float(value)
+    return {'name': name, 'options': options}
+
+
+def parse_time_control(text):
+    """
+    Parses time control "base+increment" in seconds, e.g 10+0.1.
+
+    Returns:
+        Tuple: Base time and increment in seconds.
+    """
+    base, _, increment = text.partition('+')
+    return float(base), float(increment or 0)
+
+
+class SearchPlayer:
+    """ Built in engine, keeping its transposition table and move ordering for a whole game. """
+
+    def __init__(self, options):
+        self.options = options
+        self.table = TranspositionTable(int(options.get('hash', 1 << 18)))
+        self.orderer = MoveOrderer()
+
+    def choose(self, board, moves, limits):
+        search = Search(board, table=self.table, orderer=self.orderer,
+                        quiescence=bool(self.options.get('quiescence', 1)))
+        return search.search(**limits)['move']
+
+    def close(self):
+        pass
+
+
+class UciPlayer:
+    """ External engine that speaks UCI, run as a subprocess for a whole game. """
+
+    def __init__(self, options):
+        self.process = subprocess.Popen(shlex.split(options['cmd']), stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        text=True, bufsize=1)
+        self.send('uci')
+        self.wait_for('uciok')
+        self.send('ucinewgame')
+        self.send('isready')
+        self.wait_for('readyok')
+
+    def send(self, line):
+        self.process.stdin.write(line + '\n')
+        self.process.stdin.flush()
+
+    def wait_for(self, prefix):
+        while True:
+            line = self.process.stdout.readline()
+            if line == '':
+                raise EOFError("UCI engine exited")
+            if line.startswith(prefix):
+                return line.strip()
+
+    def choose(self, board, moves, limits):
+        self.send(f"position fen {STARTING_FEN} moves {' '.join(moves)}" if moves else f"position fen {STARTING_FEN}")
+        go = ['go']
+        if 'depth' in limits:
+            go += ['depth', str(limits['depth'])]
+        if 'nodes' in limits:
+            go += ['nodes', str(limits['nodes'])]
+        if 'movetime' in limits:
+            go += ['movetime', str(max(int(limits['movetime'] * 1000), 1))]
+        self.send(' '.join(go))
+        text = self.wait_for('bestmove').split()[1]
+        return None if text == '0000' else parse_uci(text)
+
+    def close(self):
+        try:
+            self.send('quit')
+            self.process.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+
+
+def create_player(engine):
+    if 'cmd' in engine['options']:
+        return UciPlayer(engine['options'])
+    return SearchPlayer(engine['options'])
+
+
+def play_game(task):
+    """
+    Plays one game in a worker process.
+
+    Args:
+        task (Dict): 'index' of game, 'opening' moves in UCI notation, 'white' and 'black' engines,
+                        'white_entrant' and 'black_entrant' (indexes of engines in tournament),
+                        'time_control' (base, increment) or None, and 'max_plies'.
+
+    Returns:
+        Dict: Task with 'result' (1-0, 0-1 or 1/2-1/2), 'reason', 'plies', 'moves' in UCI notation
+                and 'time' taken in seconds. An engine that raises an error when choosing a move
+                loses the game, with the error in 'error'.
+    """
+    start = time.perf_counter()
+    board = board_from_fen(STARTING_FEN)
+    moves = []
+    for text in task['opening']:
+        move = parse_move(board, text)
+        board.move_piece(*move[0], *move[1])
+        moves.append(move_to_uci(move))
+
+    engines = {WHITE: task['white'], BLACK: task['black']}
+    players = {}
+    clocks = None
+    if task['time_control'] is not None:
+        base, increment = task['time_control']
+        clocks = {WHITE: base, BLACK: base}
+
+    result, reason, error = None, None, None
+    try:
+        for colour, engine in engines.items():
+            players[colour] = create_player(engine)
+
+        while result is None:
+            if board.winner is not None:
+                if board.winner == STALEMATE:
+                    result, reason = DRAWN, 'stalemate'
+                elif board.winner == DRAW:
+                    result, reason = DRAWN, board.draw_claim().lower()
+                else:
+                    result, reason = (WHITE_WIN if board.winner == WHITE else BLACK_WIN), 'checkmate'
+                break
+            if len(moves) >= task['max_plies']:
+                result, reason = DRAWN, 'max plies'
+                break
+
+            player = board.whose_turn()
+            options = engines[player]['options']
+            limits = {key: int(options[key]) for key in ['depth', 'nodes'] if key in options}
+            if 'movetime' in options:
+                limits['movetime'] = options['movetime']
+            elif clocks is not None:
+                limits['movetime'] = clocks[player] * TIME_FRACTION + increment * INCREMENT_FRACTION
+
+            move_start = time.perf_counter()
+            try:
+                move = players[player].choose(board, moves, limits)
+            except Exception as exception:
+                result, reason = (BLACK_WIN if player == WHITE else WHITE_WIN), 'engine error'
+                error = f"{type(exception).__name__}: {exception}"
+                break
+            if clocks is not None:
+                clocks[player] -= time.perf_counter() - move_start
+                if clocks[player] < 0:
+                    result, reason = (BLACK_WIN if player == WHITE else WHITE_WIN), 'time'
+                    break
+                clocks[player] += increment
+
+            if move is None or move not in board.legal_moves():
+                result, reason = (BLACK_WIN if player == WHITE else WHITE_WIN), 'illegal move'
+                break
+            board.move_piece(*move[0], *move[1])
+            moves.append(move_to_uci(move))
+    finally:
+        for player in players.values():
+            player.close()
+
+    game = dict(task, result=result, reason=reason, plies=len(moves), moves=moves,
+                final_fen=board_to_fen(board), time=time.perf_counter() - start)
+    if error is not None:
+        game['error'] = error
+    return game
+
+
+def play_task(task):
+    """
+    Plays game of task in a worker process, as play_game does. A game that can't be played at all
+    (e.g an engine fails to start) is returned with 'result' None and the 'error', rather than
+    raising and stopping the whole tournament.
+    """
+    try:
+        return play_game(task)
+    except Exception as exception:
+        return dict(task, result=None, reason='error', error=f"{type(exception).__name__}: {exception}")
+
+
+def random_openings(count, plies, seed):
+    """
+    Generates distinct openings of random legal moves from the starting position.
+
+    Returns:
+        List: Openings, each a List of moves in UCI notation.
+    """
+    rng = random.Random(seed)
+    openings = []
+    seen = set()
+    attempts = 0
+    while len(openings) < count and attempts < count * 100:
+        attempts += 1
+        board = board_from_fen(STARTING_FEN)
+        opening = []
+        for _ in range(plies):
+            if board.winner is not None:
+                break
+            move = rng.choice(board.legal_moves())
+            board.move_piece(*move[0], *move[1])
+            opening.append(move_to_uci(move))
+        if board.winner is None and board.hash not in seen:
+            seen.add(board.hash)
+            openings.append(opening)
+    return openings
+
+
+def archive_openings(games, plies):
+    """
+    Takes openings from the start of archived games. A game is only followed up to the first move
+    Board can't play (e.g castling), and repeated openings are left out.
+
+    Args:
+        games (Iterable): Games, each a List of move texts in UCI notation or SAN.
+        plies (int): Number of moves from start of each game to use.
+
+    Returns:
+        List: Openings, each a List of moves in UCI notation.
+    """
+    openings = []
+    seen = set()
+    for moves in games:
+        board = board_from_fen(STARTING_FEN)
+        opening = []
+        for text in moves[:plies]:
+            try:
+                move = parse_move(board, text)
+            except ValueError:
+                break
+            board.move_piece(*move[0], *move[1])
+            opening.append(move_to_uci(move))
+            if board.winner is not None:
+                break
+        if board.winner is None and board.hash not in seen:
+            seen.add(board.hash)
+            openings.append(opening)
+    return openings
+
+
+def elo_difference(score):
+    """
+    Converts expected score (between 0 and 1) into Elo difference.
+    """
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return 400 * math.log10(score / (1 - score))
+
+
+def expected_score(elo):
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def elo_estimate(wins, draws, losses):
+    """
+    Estimates Elo difference of first engine from game results, with a 95% confidence interval.
+
+    Returns:
+        Tuple: Elo difference and margin of error (Elo either side), or (0, inf) with no games.
+    """
+    games = wins + draws + losses
+    if games == 0:
+        return 0.0, math.inf
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    error = 1.96 * math.sqrt(variance / games)
+    lower, upper = elo_difference(score - error), elo_difference(score + error)
+    return elo_difference(score), (upper - lower) / 2
+
+
+def sprt(wins, draws, losses, elo0, elo1, alpha, beta):
+    """
+    Sequential probability ratio test of hypotheses that first engine is elo0 (H0) or elo1 (H1)
+    Elo stronger, using the normal approximation to the log likelihood ratio of game results.
+
+    Returns:
+        Tuple: Log likelihood ratio, its lower and upper bounds, and decision 'H0', 'H1' or None
+                if more games are needed.
+    """
+    lower_bound = math.log(beta / (1 - alpha))
+    upper_bound = math.log((1 - beta) / alpha)
+    games = wins + draws + losses
+    if games == 0:
+        return 0.0, lower_bound, upper_bound, None
+
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    if variance == 0:
+        return 0.0, lower_bound, upper_bound, None
+
+    score0, score1 = expected_score(elo0), expected_score(elo1)
+    llr = games * (score1 - score0) * (2 * score - score0 - score1) / (2 * variance)
+    decision = 'H1' if llr >= upper_bound else 'H0' if llr <= lower_bound else None
+    return llr, lower_bound, upper_bound, decision
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plays engines against each other and estimates Elo difference")
+    parser.add_argument('--engine', action='append', required=True, help="name[:option=value,...], given twice")
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--tc', help="Time control base+increment in seconds, e.g 10+0.1")
+    parser.add_argument('--openings', help="PGN or move-list archive of openings, defaults to random openings")
+    parser.add_argument('--opening-plies', type=int, default=OPENING_PLIES)
+    parser.add_argument('--max-plies', type=int, default=MAX_PLIES)
+    parser.add_argument('--output', default='tournament.jsonl')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--sprt', nargs=2, type=float, metavar=('ELO0', 'ELO1'),
+                        help="Stop once engine 1 is shown to be ELO0 or ELO1 Elo stronger than engine 2")
+    parser.add_argument('--alpha', type=float, default=0.05)
+    parser.add_argument('--beta', type=float, default=0.05)
+    args = parser.parse_args()
+
+    if len(args.engine) != 2:
+        parser.error("exactly two engines must be given")
+    engines = [parse_engine(text) for text in args.engine]
+    time_control = parse_time_control(args.tc) if args.tc is not None else None
+    if time_control is None and not all({'depth', 'nodes', 'movetime'} & set(engine['options']) for engine in engines):
+        parser.error("--tc is required unless every engine has a depth, nodes or movetime option")
+
+    # Each opening is played twice, with engines swapping colours
+    openings_needed = (args.games + 1) // 2
+    if args.openings is not None:
+        with open(args.openings) as file:
+            openings = archive_openings(read_games(file), args.opening_plies)
+    else:
+        openings = random_openings(openings_needed, args.opening_plies, args.seed)
+    if len(openings) == 0:
+        parser.error("no playable openings")
+    tasks = []
+    for index in range(args.games):
+        first_white = index % 2 == 0
+        white, black = (0, 1) if first_white else (1, 0)
+        tasks.append({'index': index, 'opening': openings[(index // 2) % len(openings)],
+                      'white': engines[white], 'black': engines[black],
+                      'white_entrant': white, 'black_entrant': black,
+                      'time_control': time_control, 'max_plies': args.max_plies})
+
+    # Results are credited by entrant rather than name, as both engines may have the same name
+    wins = draws = losses = errors = 0
+    first = engines[0]['name']
+    with open(args.output, 'a') as output, multiprocessing.Pool(args.workers) as pool:
+        for game in pool.imap_unordered(play_task, tasks):
+            # Streamed to disk as each game finishes, so results survive the tournament being stopped
+            output.write(json.dumps(game) + '\n')
+            output.flush()
+
+            first_is_white = game['white_entrant'] == 0
+            if game['result'] is None:
+                errors += 1
+                print(f"game {game['index']} not played: {game['error']}", flush=True)
+            elif game['result'] == DRAWN:
+                draws += 1
+            elif (game['result'] == WHITE_WIN) == first_is_white:
+                wins += 1
+            else:
+                losses += 1
+
+            elo, error = elo_estimate(wins, draws, losses)
+            status = f"games {wins + draws + losses}: +{wins} -{losses} ={draws}  Elo {elo:+.1f} +/- {error:.1f}"
+            if errors > 0:
+                status += f"  errors {errors}"
+            if args.sprt is not None:
+                llr, lower, upper, decision = sprt(wins, draws, losses, *args.sprt, args.alpha, args.beta)
+                status += f"  LLR {llr:.2f} [{lower:.2f}, {upper:.2f}]"
+                if decision is not None:
+                    print(status, flush=True)
+                    print(f"SPRT accepts {decision}: {first} is {args.sprt[0 if decision == 'H0' else 1]:+g} Elo")
+                    pool.terminate()
+                    return
+            print(status, flush=True)
+
+
+if __name__ == '__main__':
+    main()
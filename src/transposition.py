@@ -0,0 +1,167 @@
+# Transposition table used by search to remember results for positions it has already searched,
+# keyed by the Zobrist hash of the position (Board.hash).
+
+from chess import pack_move, unpack_move
+
+# Type of bound stored score is
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+DEFAULT_SIZE = 1 << 18
+
+# Layout of the data word of SharedTranspositionTable entries, move is 0 for None or 1 + move
+# packed by chess.pack_move
+MOVE_BITS = 13
+BOUND_SHIFT = 13
+DEPTH_SHIFT = 15
+SCORE_SHIFT = 23
+SCORE_OFFSET = 1 << 23
+OCCUPIED = 1 << 47
+WORD_MASK = (1 << 64) - 1
+
+
+class TranspositionTable:
+    """
+    Fixed number of slots, each holding the most recent entry for positions whose hash maps to that
+    slot. Entries are Tuples (hash, depth, score, bound, move).
+    """
+
+    def __init__(self, size=DEFAULT_SIZE):
+        self.size = size
+        self.slots = [None] * size
+
+    def probe(self, key):
+        """
+        Finds entry for position with hash key.
+
+        Args:
+            key (int): Zobrist hash of position.
+
+        Returns:
+            Tuple: (depth, score, bound, move) or None if position has no entry.
+        """
+        entry = self.slots[key % self.size]
+        if entry is None or entry[0] != key:
+            return None
+        return entry[1:]
+
+    def store(self, key, depth, score, bound, move):
+        """
+        Stores result of searching position with hash key. Replaces existing entry unless it is for
+        the same position searched to a greater depth.
+
+        Args:
+            key (int): Zobrist hash of position.
+            depth (int): Depth position was searched to.
+            score (int): Score of position.
+            bound (int): EXACT, LOWER_BOUND or UPPER_BOUND.
+            move (Tuple): Best move (start_pos, end_pos) found, or None.
+        """
+        index = key % self.size
+        entry = self.slots[index]
+        if entry is not None and entry[0] == key and entry[1] > depth:
+            return
+        self.slots[index] = (key, depth, score, bound, move)
+
+    def clear(self):
+        self.slots = [None] * self.size
+
+
+def pack_entry(depth, score, bound, move):
+    packed_move = 0 if move is None else 1 + pack_move(move)
+    return OCCUPIED | (score + SCORE_OFFSET) << SCORE_SHIFT | depth << DEPTH_SHIFT | bound << BOUND_SHIFT | packed_move
+
+
+def unpack_entry(data):
+    packed_move = data & ((1 << MOVE_BITS) - 1)
+    if packed_move == 0:
+        move = None
+    else:
+        move = unpack_move(packed_move - 1)
+    depth = (data >> DEPTH_SHIFT) & 0xFF
+    score = ((data >> SCORE_SHIFT) & ((1 << 24) - 1)) - SCORE_OFFSET
+    bound = (data >> BOUND_SHIFT) & 0b11
+    return depth, score, bound, move
+
+
+class SharedTranspositionTable:
+    """
+    Transposition table held in shared memory, so search processes can share results without
+    locking. Each entry is two 64 bit words, the key XORed with the data and the data itself. Entries
+    are written without locks, so a process may read an entry while another is halfway through
+    writing it, in which case the words no longer XOR to the key and the entry is treated as missing.
+
+    Tables are created by one process, which must call unlink() once done, and opened by others by
+    name. Pickling a table (e.g passing it to a worker process) opens the same table when unpickled.
+    """
+
+    def __init__(self, size=DEFAULT_SIZE, name=None):
+        # Imported here so single process search doesn't load multiprocessing
+        from multiprocessing import shared_memory, resource_tracker
+        self.size = size
+        if name is None:
+            self.memory = shared_memory.SharedMemory(create=True, size=16 * size)
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+            # Only the creator should remove the table, otherwise the resource tracker removes it
+            # once any process that opened it exits
+            resource_tracker.unregister(self.memory._name, 'shared_memory')
+        self.name = self.memory.name
+        self.words = self.memory.buf.cast('Q')
+
+    def __reduce__(self):
+        return SharedTranspositionTable, (self.size, self.name)
+
+    def probe(self, key):
+        """
+        Finds entry for position with hash key.
+
+        Args:
+            key (int): Zobrist hash of position.
+
+        Returns:
+            Tuple: (depth, score, bound, move) or None if position has no entry.
+        """
+        index = 2 * (key % self.size)
+        check, data = self.words[index], self.words[index + 1]
+        if data == 0 or check ^ data != key:
+            return None
+        return unpack_entry(data)
+
+    def store(self, key, depth, score, bound, move):
+        """
+        Stores result of searching position with hash key. Replaces existing entry unless it is for
+        the same position searched to a greater depth.
+
+        Args:
+            key (int): Zobrist hash of position.
+            depth (int): Depth position was searched to.
+            score (int): Score of position.
+            bound (int): EXACT, LOWER_BOUND or UPPER_BOUND.
+            move (Tuple): Best move (start_pos, end_pos) found, or None.
+        """
+        index = 2 * (key % self.size)
+        check, data = self.words[index], self.words[index + 1]
+        if data != 0 and check ^ data == key and (data >> DEPTH_SHIFT) & 0xFF > depth:
+            return
+        data = pack_entry(depth, score, bound, move)
+        self.words[index] = (key ^ data) & WORD_MASK
+        self.words[index + 1] = data
+
+    def clear(self):
+        self.memory.buf[:] = bytes(16 * self.size)
+
+    def close(self):
+        """
+        Closes table in this process, it can no longer be used.
+        """
+        self.words.release()
+        self.memory.close()
+
+    def unlink(self):
+        """
+        Closes table and frees its shared memory, must only be called by the process that created it.
+        """
+        self.close()
+        self.memory.unlink()
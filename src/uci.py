@@ -0,0 +1,289 @@
+# Universal Chess Interface (UCI) front end, so the engine can be driven over stdin/stdout by
+# standard chess tools (GUIs, tournament managers). Searches run on a separate thread, so commands
+# such as stop and isready are answered while searching.
+# Run from root of repository: python3 src/uci.py
+
+import sys
+import threading
+from chess import WHITE
+from book import OpeningBook
+from notation import STARTING_FEN, board_from_fen, move_to_uci, parse_move
+from ordering import MoveOrderer
+from parallel import ParallelSearch
+from search import Search, MATE_SCORE, is_mate_score
+from tablebase import Tablebase
+from transposition import TranspositionTable, SharedTranspositionTable
+
+ENGINE_NAME = "kituit chess"
+ENGINE_AUTHOR = "kituit"
+
+# Approximate memory used by each transposition table entry, in bytes. Entries of the in process
+# table are Python tuples, entries of the shared table are two 64 bit words
+ENTRY_BYTES = 160
+SHARED_ENTRY_BYTES = 16
+
+DEFAULT_HASH = 16
+MAX_HASH = 4096
+MAX_THREADS = 64
+
+# Time between repeated requests for a search to stop, in seconds
+STOP_INTERVAL = 0.05
+
+# Fraction of remaining clock time spent on a move when no movetime is given
+TIME_FRACTION = 1 / 30
+
+# Time kept back from the remaining clock time for reporting the move, and least time spent on a
+# move, in seconds
+MOVE_OVERHEAD = 0.05
+MIN_MOVETIME = 0.01
+
+
+class UciEngine:
+    """
+    Keeps the state of a UCI session: current position, options and the search in progress.
+    """
+
+    def __init__(self, output=sys.stdout):
+        self.output = output
+        self.output_lock = threading.Lock()
+        self.board = board_from_fen(STARTING_FEN)
+        self.hash_size = DEFAULT_HASH
+        self.threads = 1
+        self.book = None
+        self.tablebase = None
+        self.table = None
+        self.orderer = MoveOrderer()
+        # Parallel search is kept between searches so its worker processes are only started once
+        self.parallel = None
+        self.new_table()
+
+        # Search in progress, and thread it is running on
+        self.search = None
+        self.search_thread = None
+
+        # Set by stop, an infinite search only reports its best move once stopped
+        self.stopped = threading.Event()
+
+    def send(self, line):
+        with self.output_lock:
+            self.output.write(line + '\n')
+            self.output.flush()
+
+    def close_parallel(self):
+        # Workers must be started again to use a new table or tablebase
+        if self.parallel is not None:
+            self.parallel.close()
+            self.parallel = None
+
+    def new_table(self):
+        self.close_parallel()
+        if isinstance(self.table, SharedTranspositionTable):
+            self.table.unlink()
+        size_bytes = self.hash_size * 1024 * 1024
+        if self.threads > 1:
+            self.table = SharedTranspositionTable(max(size_bytes // SHARED_ENTRY_BYTES, 1))
+        else:
+            self.table = TranspositionTable(max(size_bytes // ENTRY_BYTES, 1))
+
+    def run(self, lines):
+        """
+        Handles commands until quit is received or lines run out.
+
+        Args:
+            lines (Iterable): Lines of input, e.g sys.stdin.
+        """
+        for line in lines:
+            if not self.handle(line.strip()):
+                break
+        self.stop()
+        self.close_parallel()
+        if isinstance(self.table, SharedTranspositionTable):
+            self.table.unlink()
+
+    def handle(self, line):
+        """
+        Handles one command, unknown commands are ignored as the protocol requires.
+
+        Returns:
+            bool: False if engine should quit, else True.
+        """
+        tokens = line.split()
+        if len(tokens) == 0:
+            return True
+        command, args = tokens[0], tokens[1:]
+
+        if command == 'quit':
+            return False
+        if command == 'uci':
+            self.send(f"id name {ENGINE_NAME}")
+            self.send(f"id author {ENGINE_AUTHOR}")
+            self.send(f"option name Hash type spin default {DEFAULT_HASH} min 1 max {MAX_HASH}")
+            self.send(f"option name Threads type spin default 1 min 1 max {MAX_THREADS}")
+            self.send("option name BookFile type string default <empty>")
+            self.send("option name TablebasePath type string default <empty>")
+            self.send("uciok")
+        elif command == 'isready':
+            self.send("readyok")
+        elif command == 'ucinewgame':
+            self.stop()
+            self.new_table()
+            self.orderer = MoveOrderer()
+        elif command == 'setoption':
+            self.stop()
+            self.set_option(args)
+        elif command == 'position':
+            self.stop()
+            self.set_position(args)
+        elif command == 'go':
+            self.stop()
+            self.go(args)
+        elif command == 'stop':
+            self.stop()
+        return True
+
+    def set_option(self, args):
+        """
+        Handles "setoption name <name> value <value>".
+        """
+        if 'name' not in args:
+            return
+        name_end = args.index('value') if 'value' in args else len(args)
+        name = ' '.join(args[args.index('name') + 1:name_end]).lower()
+        value = ' '.join(args[name_end + 1:])
+
+        try:
+            if name == 'hash':
+                self.hash_size = min(max(int(value), 1), MAX_HASH)
+                self.new_table()
+            elif name == 'threads':
+                self.threads = min(max(int(value), 1), MAX_THREADS)
+                self.new_table()
+            elif name == 'bookfile':
+                self.book = OpeningBook(value) if value not in ['', '<empty>'] else None
+            elif name == 'tablebasepath':
+                self.tablebase = Tablebase(value) if value not in ['', '<empty>'] else None
+                self.close_parallel()
+        except (ValueError, OSError) as error:
+            self.send(f"info string could not set {name}: {error}")
+
+    def set_position(self, args):
+        """
+        Handles "position [startpos | fen <fen>] [moves <move> ...]". Moves after one that is not
+        legal are ignored.
+        """
+        moves_start = args.index('moves') if 'moves' in args else len(args)
+        try:
+            if len(args) > 0 and args[0] == 'fen':
+                board = board_from_fen(' '.join(args[1:moves_start]))
+            else:
+                board = board_from_fen(STARTING_FEN)
+        except ValueError as error:
+            self.send(f"info string invalid position: {error}")
+            return
+
+        for text in args[moves_start + 1:]:
+            try:
+                move = parse_move(board, text)
+            except ValueError as error:
+                self.send(f"info string invalid move: {error}")
+                break
+            board.move_piece(*move[0], *move[1])
+        self.board = board
+
+    def search_limits(self, args):
+        """
+        Parses arguments of "go" into limits of search for player whose turn it is.
+
+        Returns:
+            Tuple: Dict of limits passed to search, and whether search is infinite.
+        """
+        limits = {}
+        values = {}
+        for index, token in enumerate(args):
+            if token in ['depth', 'nodes', 'movetime', 'wtime', 'btime', 'winc', 'binc', 'movestogo']:
+                try:
+                    values[token] = int(args[index + 1])
+                except (IndexError, ValueError):
+                    pass
+        infinite = 'infinite' in args
+
+        if 'depth' in values:
+            limits['depth'] = max(values['depth'], 1)
+        if 'movetime' in values:
+            limits['movetime'] = values['movetime'] / 1000
+        elif not infinite:
+            clock, increment = ('wtime', 'winc') if self.board.whose_turn() == WHITE else ('btime', 'binc')
+            if clock in values:
+                moves_to_go = values.get('movestogo', 1 / TIME_FRACTION)
+                movetime = (values[clock] / max(moves_to_go, 1) + values.get(increment, 0) * 0.8) / 1000
+                # Never plan to use more time than is left on the clock
+                limits['movetime'] = max(min(movetime, values[clock] / 1000 - MOVE_OVERHEAD), MIN_MOVETIME)
+
+        # Searches only support nodes on a single thread
+        if 'nodes' in values and self.threads == 1:
+            limits['nodes'] = values['nodes']
+        return limits, infinite
+
+    def go(self, args):
+        """
+        Handles "go" with depth, movetime (ms), nodes, infinite or clock times (wtime, btime, winc,
+        binc, ms), starting search on a new thread.
+        """
+        limits, infinite = self.search_limits(args)
+
+        if self.threads > 1:
+            if self.parallel is None:
+                self.parallel = ParallelSearch(self.board, workers=self.threads, table=self.table,
+                                               tablebase=self.tablebase)
+            self.parallel.board = self.board
+            self.parallel.book = self.book
+            self.search = self.parallel
+        else:
+            self.search = Search(self.board, table=self.table, orderer=self.orderer, book=self.book,
+                                 tablebase=self.tablebase)
+
+        self.stopped.clear()
+        self.search_thread = threading.Thread(target=self.think, args=(self.search, limits, infinite), daemon=True)
+        self.search_thread.start()
+
+    def think(self, search, limits, infinite):
+        """
+        Runs search on search thread, reporting each completed depth and then the best move.
+        """
+        result = search.search(info=self.send_info, **limits)
+        # Protocol requires bestmove of an infinite search to wait for stop
+        if infinite:
+            self.stopped.wait()
+        move = result['move']
+        self.send(f"bestmove {move_to_uci(move) if move is not None else '0000'}")
+
+    def send_info(self, result):
+        score = result['score']
+        if is_mate_score(score):
+            plies = MATE_SCORE - abs(score)
+            moves = (plies + 1) // 2
+            score_text = f"mate {moves if score > 0 else -moves}"
+        else:
+            score_text = f"cp {score}"
+        time_ms = int(result['time'] * 1000)
+        nps = int(result['nodes'] / result['time']) if result['time'] > 0 else 0
+        pv = ' '.join(move_to_uci(move) for move in result['pv'])
+        self.send(f"info depth {result['depth']} score {score_text} nodes {result['nodes']} nps {nps} "
+                  f"time {time_ms} pv {pv}")
+
+    def stop(self):
+        """
+        Stops search in progress, waiting for it to report its best move.
+        """
+        self.stopped.set()
+        if self.search_thread is not None:
+            # Stop is repeated, as a search that has only just started may not have seen it
+            while self.search_thread.is_alive():
+                self.search.stop()
+                self.search_thread.join(STOP_INTERVAL)
+            self.search_thread = None
+            self.search = None
+
+
+if __name__ == '__main__':
+    UciEngine().run(sys.stdin)
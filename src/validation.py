@@ -0,0 +1,59 @@
+# Cache of the legal moves of positions, used by the Flask server to check moves posted by clients.
+# The same positions come up again and again across games (openings especially), so each position's
+# legal moves are generated once and kept as a mask with a bit for each packed move (see
+# chess.pack_move), keyed by the position's hash, making checking a move a bit test.
+
+import threading
+from collections import OrderedDict
+from chess import MOVE_MASK, pack_move
+
+# Most positions kept, least recently used positions are dropped first
+CACHE_POSITIONS = 1 << 16
+
+
+class LegalMoveCache:
+    """
+    Legal moves of recently seen positions, shared by every game on the server.
+
+    Args:
+        max_positions (int, optional): Most positions kept.
+    """
+
+    def __init__(self, max_positions=CACHE_POSITIONS):
+        self.max_positions = max_positions
+        self.positions = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def legal_moves_mask(self, board):
+        """
+        Finds legal moves of position on board.
+
+        Returns:
+            int: Mask with bit pack_move(move) set for each legal move of player whose turn it is.
+        """
+        key = board.hash
+        with self.lock:
+            mask = self.positions.get(key)
+            if mask is not None:
+                self.positions.move_to_end(key)
+                self.hits += 1
+                return mask
+            self.misses += 1
+
+        # Generated outside of lock, so games don't wait for each other's positions
+        mask = 0
+        for packed in board.legal_moves_packed():
+            mask |= 1 << (packed & MOVE_MASK)
+        with self.lock:
+            self.positions[key] = mask
+            if len(self.positions) > self.max_positions:
+                self.positions.popitem(last=False)
+        return mask
+
+    def is_legal(self, board, move):
+        """
+        Checks if move (start_pos, end_pos) is legal in position on board.
+        """
+        return self.legal_moves_mask(board) >> pack_move(move) & 1 == 1
@@ -1 +1,406 @@
+import io
+import multiprocessing
+import os
+import random
+import sys
+import threading
 import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import evaluation
+from book import OpeningBook, count_moves, write_book
+from chess import Board, WHITE, BLACK, STALEMATE, DRAW, PAWN, KNIGHT, ROOK, King, Queen, Rook, Bishop, Knight, Pawn, \
+    THREEFOLD_REPETITION, FIFTY_MOVE_RULE, FIFTY_MOVE_PLIES, CAPTURE_FLAG, PAWN_FLAG, MOVE_MASK, unpack_move, square_index
+from notation import board_from_fen, board_to_fen
+from ordering import MoveOrderer, mvv_lva, KILLER_SLOTS, HISTORY_LIMIT
+from parallel import ParallelSearch
+from search import Search, INFINITY
+from see import see
+from tablebase import Tablebase, generate, WIN, LOSS, DRAW as TABLEBASE_DRAW
+from transposition import SharedTranspositionTable, EXACT, LOWER_BOUND
+from uci import UciEngine, MOVE_OVERHEAD, MIN_MOVETIME
+
+
+def play_random_game(seed, max_plies=120):
+    """
+    Plays random legal moves from the starting position, yielding board after each move.
+    """
+    rng = random.Random(seed)
+    board = Board()
+    while board.winner is None and board.turn < max_plies:
+        start_pos, end_pos = rng.choice(board.legal_moves())
+        board.move_piece(*start_pos, *end_pos)
+        yield board
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_undo_move_restores_position(seed):
+    board = Board()
+    states = []
+    for board in play_random_game(seed):
+        states.append((board.hash, board.evaluate(), sorted(board.legal_moves())))
+
+    while board.history:
+        assert (board.hash, board.evaluate(), sorted(board.legal_moves())) == states.pop()
+        board.undo_move()
+    assert board.hash == Board().hash
+    assert board.evaluate() == Board().evaluate()
+    assert sorted(board.legal_moves()) == sorted(Board().legal_moves())
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_incremental_evaluation_matches_scan(seed):
+    for board in play_random_game(seed):
+        assert board.evaluate() == evaluation.evaluate(board)
+
+
+def test_attackers_of():
+    knight, pawn, rook, bishop = Knight((2, 3), WHITE), Pawn((3, 3), WHITE), Rook((4, 7), WHITE), Bishop((1, 1), WHITE)
+    board = Board([King((0, 7), WHITE), King((7, 0), BLACK), knight, pawn, rook, bishop])
+
+    # Bishop's diagonal to (4, 4) is blocked by Pawn
+    assert set(board.attackers_of((4, 4), WHITE)) == {knight, pawn, rook}
+    assert board.attackers_of((4, 4), BLACK) == []
+    assert set(board.attackers_of((2, 2), WHITE)) == {bishop}
+
+
+def test_pinned_pieces():
+    rook, knight = Rook((2, 4), WHITE), Knight((1, 3), WHITE)
+    board = Board([King((0, 4), WHITE), rook, knight, Rook((6, 4), BLACK), Bishop((3, 1), BLACK), King((7, 0), BLACK)])
+
+    assert rook.protecting_king(board) == (6, 4)
+    assert knight.protecting_king(board) == (3, 1)
+    # Pinned Rook can only move along the pin, up to capturing the pinning Rook
+    assert sorted(rook.available_moves(board)) == [(1, 4), (3, 4), (4, 4), (5, 4), (6, 4)]
+    assert knight.available_moves(board) == []
+
+
+def test_book_build_and_lookup(tmp_path):
+    games = [['e2e4', 'e7e5']] * 3 + [['e2e4', 'c7c5'], ['d2d4', 'd7d5']]
+    path = str(tmp_path / 'book.bin')
+    assert write_book(count_moves(games), path, min_count=1) == 5
+
+    book = OpeningBook(path)
+    try:
+        board = Board()
+        assert book.moves(board.hash) == [(((1, 4), (3, 4)), 4), (((1, 3), (3, 3)), 1)]
+        assert book.get_move(board) == ((1, 4), (3, 4))
+
+        board.move_piece(1, 4, 3, 4)
+        assert book.get_move(board) == ((6, 4), (4, 4))
+        assert book.get_move(board, rng=random.Random(0)) in [((6, 4), (4, 4)), ((6, 2), (4, 2))]
+
+        board.move_piece(6, 4, 4, 4)
+        assert book.get_move(board) is None
+        # Moves that aren't legal on board are never suggested
+        assert not book.is_legal(board, ((1, 4), (2, 4)))
+    finally:
+        book.close()
+
+
+@pytest.fixture(scope='module')
+def kqvk_tablebase(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('tablebases')
+    tablebase = Tablebase(str(directory))
+    with open(tablebase.path('KQvK'), 'wb') as file:
+        file.write(generate('KQvK', {}))
+    yield tablebase
+    tablebase.close()
+
+
+def test_tablebase_probe_matches_board(kqvk_tablebase):
+    rng = random.Random(0)
+    positions = 0
+    while positions < 200:
+        white_king, queen, black_king = rng.sample([(row, col) for row in range(8) for col in range(8)], 3)
+        try:
+            board = Board([King(white_king, WHITE), Queen(queen, WHITE), King(black_king, BLACK)], turn=rng.randrange(2))
+        except ValueError:
+            continue
+        positions += 1
+
+        result, plies = kqvk_tablebase.probe(board)
+        children = []
+        for move in board.legal_moves():
+            board.move_piece(*move[0], *move[1])
+            children.append(kqvk_tablebase.probe(board))
+            board.undo_move()
+
+        if board.winner in [WHITE, BLACK]:
+            assert (result, plies) == (LOSS, 0)
+        elif board.winner == STALEMATE:
+            assert (result, plies) == (TABLEBASE_DRAW, 0)
+        elif result == WIN:
+            # Fastest win is one ply more than opponent's fastest loss
+            assert min(child_plies for child_result, child_plies in children if child_result == LOSS) + 1 == plies
+        elif result == LOSS:
+            assert all(child_result == WIN for child_result, _ in children)
+            assert max(child_plies for _, child_plies in children) + 1 == plies
+        else:
+            assert LOSS not in [child_result for child_result, _ in children]
+            assert TABLEBASE_DRAW in [child_result for child_result, _ in children]
+
+
+def test_uci_position():
+    engine = UciEngine(output=io.StringIO())
+    engine.handle('position startpos moves e2e4 e7e5 g1f3')
+    assert engine.board.turn == 3
+    assert engine.board.whose_turn() == BLACK
+    assert engine.board.get_piece(2, 5).get_type() == KNIGHT
+
+    engine.handle('position fen 4k3/8/8/8/8/8/8/4K2R w - - 0 1 moves h1h8')
+    assert engine.board.get_piece(7, 7).get_type() == ROOK
+    assert engine.board.is_in_check(BLACK)
+
+    # Moves after an illegal move are ignored
+    engine.handle('position startpos moves e2e5 e7e5')
+    assert engine.board.turn == 0
+
+
+def test_uci_go_limits():
+    engine = UciEngine(output=io.StringIO())
+    assert engine.search_limits(['depth', '3']) == ({'depth': 3}, False)
+    assert engine.search_limits(['movetime', '500']) == ({'movetime': 0.5}, False)
+    assert engine.search_limits(['nodes', '1000', 'infinite']) == ({'nodes': 1000}, True)
+
+    # Time planned from the clock is never more than is left on it
+    limits, _ = engine.search_limits(['wtime', '100', 'btime', '60000', 'winc', '2000'])
+    assert MIN_MOVETIME <= limits['movetime'] <= 0.1 - MOVE_OVERHEAD
+    limits, _ = engine.search_limits(['wtime', '5000', 'winc', '1000', 'movestogo', '1'])
+    assert limits['movetime'] <= 5 - MOVE_OVERHEAD
+    limits, _ = engine.search_limits(['wtime', '20'])
+    assert limits['movetime'] == MIN_MOVETIME
+
+
+def test_uci_go_reports_best_move():
+    output = io.StringIO()
+    engine = UciEngine(output=output)
+    engine.run(['position startpos moves e2e4', 'go depth 2', 'isready'])
+    lines = output.getvalue().splitlines()
+    assert 'readyok' in lines
+    assert lines[-1].startswith('bestmove ')
+
+
+def test_batch_cross_check():
+    batch = pytest.importorskip('batch')
+    fens = [board_to_fen(board) for seed in range(10) for board in play_random_game(seed)]
+    boards = [board_from_fen(fen) for fen in fens]
+    assert any(board.is_in_check(board.whose_turn()) for board in boards)
+    assert batch.cross_check(boards) == []
+
+
+@pytest.fixture
+def server(monkeypatch):
+    pytest.importorskip('flask')
+    # Storage is read when app is first imported
+    monkeypatch.setenv('CHESS_STORAGE', 'none')
+    import app
+    yield app
+    app.games.clear()
+
+
+def test_move_to_unknown_game_rejected(server):
+    client = server.APP.test_client()
+    response = client.post('/move?game=ghost', json={'player': WHITE, 'move': [[1, 4], [3, 4]]})
+    assert response.status_code == 404
+    assert 'ghost' not in server.games
+
+    # Only White has joined, so game hasn't started
+    client.put('/player/new?game=waiting')
+    response = client.post('/move?game=waiting', json={'player': WHITE, 'move': [[1, 4], [3, 4]]})
+    assert response.status_code == 409
+    assert response.get_json()['state']['ply'] == 0
+
+
+def test_illegal_move_rejected(server):
+    client = server.APP.test_client()
+    client.put('/player/new?game=illegal')
+    client.put('/player/new?game=illegal')
+
+    # Pawn can't move three squares
+    response = client.post('/move?game=illegal', json={'player': WHITE, 'move': [[1, 4], [4, 4]]})
+    assert response.status_code == 409
+    assert response.get_json()['state']['ply'] == 0
+
+    response = client.post('/move?game=illegal', json={'player': BLACK, 'move': [[6, 4], [4, 4]]})
+    assert response.status_code == 409
+
+    response = client.post('/move?game=illegal', json={'player': WHITE, 'move': [[1, 4], [3, 4]]})
+    assert response.status_code == 200
+    assert response.get_json()['ply'] == 1
+    assert client.get('/game/state?game=illegal').get_json()['moves'] == [[[1, 4], [3, 4]]]
+
+
+def test_threefold_repetition():
+    board = Board()
+    knight_moves = [((0, 6), (2, 5)), ((7, 6), (5, 5)), ((2, 5), (0, 6)), ((5, 5), (7, 6))]
+    for start_pos, end_pos in knight_moves * 2:
+        assert board.winner is None
+        board.move_piece(*start_pos, *end_pos)
+    # Starting position has now occurred three times
+    assert board.repetitions() == 2
+    assert board.draw_claim() == THREEFOLD_REPETITION
+    assert board.winner == DRAW
+
+    board.undo_move()
+    assert board.winner is None
+    assert board.draw_claim() is None
+
+
+def test_fifty_move_rule():
+    board = Board([King((0, 0), WHITE), Rook((0, 7), WHITE), King((7, 4), BLACK)], halfmove_clock=FIFTY_MOVE_PLIES - 2)
+    board.move_piece(0, 7, 1, 7)
+    assert board.winner is None
+    board.move_piece(7, 4, 7, 3)
+    assert board.halfmove_clock == FIFTY_MOVE_PLIES
+    assert board.draw_claim() == FIFTY_MOVE_RULE
+    assert board.winner == DRAW
+
+    # Pawn moves and captures reset the clock
+    board = Board(halfmove_clock=FIFTY_MOVE_PLIES - 2)
+    board.move_piece(1, 4, 3, 4)
+    assert board.halfmove_clock == 0
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_legal_moves_packed(seed):
+    for board in play_random_game(seed):
+        packed_moves = board.legal_moves_packed()
+        assert sorted(unpack_move(packed) for packed in packed_moves) == sorted(board.legal_moves())
+        for packed in packed_moves:
+            (start_row, start_col), (end_row, end_col) = unpack_move(packed & MOVE_MASK)
+            assert bool(packed & CAPTURE_FLAG) == (board.get_piece(end_row, end_col) is not None)
+            assert bool(packed & PAWN_FLAG) == (board.get_piece(start_row, start_col).get_type() == PAWN)
+
+
+def test_move_orderer_ranks_moves():
+    orderer = MoveOrderer()
+    # White Knight and Queen can both take Black's Rook or Pawn
+    board = Board([King((0, 4), WHITE), Knight((2, 2), WHITE), Queen((2, 3), WHITE),
+                   King((7, 4), BLACK), Rook((4, 3), BLACK), Pawn((4, 1), BLACK)])
+    moves = board.legal_moves()
+    ordered = orderer.order(board, moves)
+    # Captures first, most valuable victim then least valuable attacker
+    assert ordered[:4] == [((2, 2), (4, 3)), ((2, 3), (4, 3)), ((2, 2), (4, 1)), ((2, 3), (4, 1))]
+    assert mvv_lva(board, ((2, 2), (4, 3))) > mvv_lva(board, ((2, 3), (4, 3))) > mvv_lva(board, ((2, 2), (4, 1)))
+
+    # Hash move is tried before any capture
+    hash_move = ((0, 4), (0, 3))
+    assert orderer.order(board, moves, hash_move=hash_move)[0] == hash_move
+
+
+def test_move_orderer_records_cutoffs():
+    orderer = MoveOrderer()
+    board = Board()
+    quiet, other = ((0, 6), (2, 5)), ((1, 3), (3, 3))
+    orderer.record_cutoff(board, quiet, ply=2, depth=3, move_number=0)
+    assert orderer.killers[2][0] == quiet
+    assert orderer.history[WHITE][square_index(quiet[0])][square_index(quiet[1])] == 9
+
+    # Killers only apply at the ply they were found at, history applies anywhere
+    ordered = orderer.order(board, board.legal_moves(), ply=2)
+    assert ordered[0] == quiet
+    orderer.record_cutoff(board, other, ply=3, depth=1, move_number=2)
+    assert orderer.order(board, board.legal_moves(), ply=3)[:2] == [other, quiet]
+    assert orderer.first_move_cutoff_rate() == 0.5
+
+    # Captures aren't recorded as killers
+    board.move_piece(1, 4, 3, 4)
+    board.move_piece(6, 3, 4, 3)
+    orderer.record_cutoff(board, ((3, 4), (4, 3)), ply=4, depth=2, move_number=0)
+    assert ((3, 4), (4, 3)) not in orderer.killers[4]
+
+    # History is halved on new search or once a score reaches the limit, and killers are cleared
+    orderer.new_search()
+    assert orderer.history[WHITE][square_index(quiet[0])][square_index(quiet[1])] == 4
+    assert orderer.killers[2] == [None] * KILLER_SLOTS
+    board = Board()
+    orderer.history[WHITE][square_index(quiet[0])][square_index(quiet[1])] = HISTORY_LIMIT - 1
+    orderer.record_cutoff(board, quiet, ply=0, depth=1, move_number=0)
+    assert orderer.history[WHITE][square_index(quiet[0])][square_index(quiet[1])] == HISTORY_LIMIT // 2
+    assert orderer.history[WHITE][square_index(other[0])][square_index(other[1])] == 0
+
+
+def test_see():
+    board = Board([King((0, 7), WHITE), Queen((2, 3), WHITE), Knight((3, 2), WHITE),
+                   King((7, 7), BLACK), Pawn((4, 3), BLACK), Pawn((5, 4), BLACK), Pawn((4, 0), BLACK)])
+    # Pawn on (4, 3) is defended by the Pawn on (5, 4), Pawn on (4, 0) isn't defended
+    assert see(board, ((2, 3), (4, 3))) == 1 - 9
+    assert see(board, ((3, 2), (4, 0))) == 1
+    assert see(board, ((0, 7), (1, 7))) == 0
+
+
+def test_see_x_ray():
+    pieces = [King((0, 7), WHITE), Rook((2, 3), WHITE), King((7, 7), BLACK), Knight((5, 3), BLACK), Rook((7, 3), BLACK)]
+    # Rook loses itself for the Knight, unless the Queen behind it can recapture once it has moved
+    assert see(Board(pieces), ((2, 3), (5, 3))) == 3 - 5
+    assert see(Board(pieces + [Queen((0, 3), WHITE)]), ((2, 3), (5, 3))) == 3
+
+
+def test_see_king_recapture():
+    pieces = [King((0, 0), WHITE), Rook((2, 4), WHITE), King((7, 4), BLACK), Pawn((6, 4), BLACK)]
+    assert see(Board(pieces), ((2, 4), (6, 4))) == 1 - 5
+    # King can't recapture on a square the Bishop defends
+    assert see(Board(pieces + [Bishop((4, 2), WHITE)]), ((2, 4), (6, 4))) == 1
+
+
+def test_quiescence_searches_check_evasions():
+    # Knight checks White's King and forks the Queen, White can't stand pat on being a Queen up
+    board = Board([King((0, 4), WHITE), Queen((1, 1), WHITE), King((7, 6), BLACK), Knight((2, 3), BLACK)])
+    assert board.is_in_check(WHITE)
+    assert board.evaluate() > 0
+    position = board.hash
+
+    search = Search(board)
+    score = search.quiescence(-INFINITY, INFINITY, 0)
+    assert score < 0
+    assert search.nodes > 1
+    assert board.hash == position
+
+
+def store_entries(table, entries):
+    for key, depth, score, bound, move in entries:
+        table.store(key, depth, score, bound, move)
+
+
+def test_shared_transposition_table():
+    table = SharedTranspositionTable(1024)
+    try:
+        # Entries stored by another process can be probed by this one
+        entries = [(Board().hash, 5, -120, EXACT, ((1, 4), (3, 4))), (12345, 2, 99990, LOWER_BOUND, None)]
+        process = multiprocessing.Process(target=store_entries, args=(table, entries))
+        process.start()
+        process.join()
+        assert process.exitcode == 0
+        for key, depth, score, bound, move in entries:
+            assert table.probe(key) == (depth, score, bound, move)
+
+        # Shallower result for the same position doesn't replace a deeper one
+        table.store(12345, 1, 0, EXACT, None)
+        assert table.probe(12345) == (2, 99990, LOWER_BOUND, None)
+
+        # Entry whose words were written by different stores no longer XORs to the key
+        index = 2 * (12345 % table.size)
+        table.words[index + 1] ^= 1 << 8
+        assert table.probe(12345) is None
+        assert table.probe(12345 + table.size) is None
+    finally:
+        table.unlink()
+
+
+def test_parallel_search_survives_main_worker_dying():
+    search = ParallelSearch(Board(), workers=2, table_size=1 << 12)
+    try:
+        assert search.search(depth=2)['move'] in Board().legal_moves()
+
+        # Once the main worker dies mid search, helpers are stopped rather than waited on forever
+        threading.Timer(0.5, lambda: search.processes[0].kill()).start()
+        result = search.search(movetime=None)
+        assert result['move'] in Board().legal_moves()
+        assert all(not process.is_alive() for process in search.processes)
+
+        # Workers are started again by next search
+        assert search.search(depth=2)['move'] in Board().legal_moves()
+    finally:
+        search.close()